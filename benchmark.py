@@ -0,0 +1,241 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import orgs_deep_copy_scripy as deep_copy
+from rossum_mock_server import MockRossumServer, populate_template
+
+
+class RecordingHttpClient(deep_copy.HttpClient):
+
+    """
+    HttpClient recording the latency of every request (including its retries) under the current phase.
+    """
+
+    def __init__(self, **kwargs):
+        deep_copy.HttpClient.__init__(self, **kwargs)
+        self.phase = None
+        self.latencies = {}
+        self._latencies_lock = threading.Lock()
+
+    def request(self, method, url, token=None, idempotent=None, **kwargs):
+
+        started = time.perf_counter()
+
+        try:
+            return deep_copy.HttpClient.request(self, method, url, token=token, idempotent=idempotent, **kwargs)
+        finally:
+            with self._latencies_lock:
+                self.latencies.setdefault(self.phase, []).append(time.perf_counter() - started)
+
+
+def percentile(values, fraction):
+
+    """
+    Nearest-rank percentile.
+    :param values: Sorted list of numbers
+    :param fraction: Percentile as a fraction, e.g. 0.99
+    :return: The percentile, None for an empty list
+    """
+
+    if not values:
+        return None
+
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+@contextlib.contextmanager
+def phase(client, name, results):
+
+    """
+    Time one phase of the copy, the requests sent meanwhile are attributed to it.
+    :param client: RecordingHttpClient
+    :param name: Name of the phase
+    :param results: List the phase result is appended to
+    :return: None
+    """
+
+    client.phase = name
+    started = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        latencies = sorted(client.latencies.get(name, []))
+        results.append({"phase": name,
+                        "seconds": seconds,
+                        "requests": len(latencies),
+                        "requests_per_second": len(latencies) / seconds if seconds else 0.0,
+                        "p50_ms": (percentile(latencies, 0.5) or 0.0) * 1000,
+                        "p99_ms": (percentile(latencies, 0.99) or 0.0) * 1000})
+        client.phase = None
+
+
+def run_scenario(queues, documents, args):
+
+    """
+    Run a full copy of a synthetic template against a fresh mock server, the same steps as the copy script.
+    :param queues: Number of queues in the template
+    :param documents: Number of documents in the template
+    :param args: Parsed command line arguments
+    :return: Dict with the scenario parameters, the phase results and the server statistics
+    """
+
+    server = MockRossumServer(latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+                              throttle_rate=args.throttle_rate, retry_after=args.retry_after).start()
+    populate_template(server.store, queues=queues, documents=documents, original_size=args.original_size,
+                      distinct_originals=args.distinct_originals)
+
+    deep_copy.API_URL = server.api_url
+    deep_copy.DATA_MATCHING_URL = server.data_matching_url
+    deep_copy.HTTP_CLIENT.close()
+    client = deep_copy.HTTP_CLIENT = RecordingHttpClient(pool_size=args.pool_size, max_concurrency=args.max_requests,
+                                                         max_retries=args.max_retries)
+
+    results = []
+    started = time.perf_counter()
+
+    # The same temporary originals cache as the copy script uses by default, none with --blob_cache_size 0.
+    blob_cache = deep_copy.BlobCache(tempfile.mkdtemp(prefix="benchmark_originals_"), max_bytes=args.blob_cache_size,
+                                     persistent=False) if args.blob_cache_size else None
+
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+
+            with phase(client, "login", results):
+                master_org_token = deep_copy.login("admin", "admin")
+
+            with phase(client, "read template", results):
+                master_data_org = deep_copy.find_template_organization(master_org_token)
+                workspaces = deep_copy.get_all_workspaces(master_data_org, master_org_token)
+                queues_list = deep_copy.get_all_queues(master_data_org, master_org_token)
+                extensions = deep_copy.get_all_extensions(master_data_org, master_org_token)
+                schemas = deep_copy.get_schemas(sorted({queue["schema"] for queue in queues_list}), master_org_token)
+
+            with phase(client, "create organization", results):
+                organization = deep_copy.create_organization("create-key", "Benchmark", "Benchmark",
+                                                             "benchmark@example.com", "password")
+                organization_url = "{0}/organizations/{1}".format(deep_copy.API_URL, organization["id"])
+                new_org_token = deep_copy.login_to_specific_organization(organization_url, master_org_token)
+
+            with phase(client, "copy setup", results):
+                _, queues_mapping, _, setup_failures = deep_copy.copy_organization_setup(
+                    organization_url, new_org_token, master_org_token,
+                    workspaces_list=workspaces,
+                    queues_list=queues_list,
+                    extensions_list=extensions,
+                    user_url=organization["users"][0],
+                    max_workers=args.max_workers,
+                    schemas=schemas)
+
+            # Like in the copy script, the annotations are listed page by page while their documents are being
+            # copied, so the listing requests are part of this phase.
+            with phase(client, "copy documents", results):
+                annotations = deep_copy.select_annotations(master_data_org, master_org_token)
+                document_failures = deep_copy.create_annotations(queues_mapping, annotations, new_org_token,
+                                                                 master_org_token,
+                                                                 metadata_workers=args.metadata_workers,
+                                                                 download_workers=args.download_workers,
+                                                                 upload_workers=args.upload_workers,
+                                                                 max_pending=args.max_pending,
+                                                                 blob_cache=blob_cache)
+    finally:
+        if blob_cache is not None:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                blob_cache.close()
+            shutil.rmtree(blob_cache.directory)
+        server.stop()
+
+    total_seconds = time.perf_counter() - started
+    total_requests = sum(result["requests"] for result in results)
+
+    return {"queues": queues,
+            "documents": documents,
+            "seconds": total_seconds,
+            "requests": total_requests,
+            "requests_per_second": total_requests / total_seconds if total_seconds else 0.0,
+            "failures": len(setup_failures) + len(document_failures),
+            "phases": results,
+            "server": server.stats}
+
+
+def print_scenario(scenario):
+
+    print("{0} queues, {1} documents - {2:.1f}s, {3} requests, {4:.0f} req/s, {5} failure(s)".format(
+        scenario["queues"], scenario["documents"], scenario["seconds"], scenario["requests"],
+        scenario["requests_per_second"], scenario["failures"]))
+    print("  {0:<20} {1:>9} {2:>9} {3:>9} {4:>10} {5:>10}".format("phase", "seconds", "requests", "req/s",
+                                                                 "p50 ms", "p99 ms"))
+
+    for result in scenario["phases"]:
+        print("  {0:<20} {1:>9.2f} {2:>9} {3:>9.0f} {4:>10.1f} {5:>10.1f}".format(
+            result["phase"], result["seconds"], result["requests"], result["requests_per_second"],
+            result["p50_ms"], result["p99_ms"]))
+
+
+def get_parser():
+
+    arg_parser = argparse.ArgumentParser(description='Benchmark a full organization copy against the local Rossum '
+                                                     'API stand-in.')
+    arg_parser.add_argument('--queues', help='Comma separated numbers of template queues, one scenario each.',
+                            metavar="queues", type=str, default="10,100,1000")
+    arg_parser.add_argument('--documents', help='Number of template documents in every scenario.',
+                            metavar="documents", type=int, default=10000)
+    arg_parser.add_argument('--original_size', help='Size of every original in bytes.', metavar="original_size",
+                            type=int, default=32 * 1024)
+    arg_parser.add_argument('--distinct_originals', help='Number of distinct originals shared by the documents.',
+                            metavar="distinct_originals", type=int)
+    arg_parser.add_argument('--latency', help='Delay of every mock response in seconds.', metavar="latency",
+                            type=float, default=0.0)
+    arg_parser.add_argument('--latency_jitter', help='Maximum random delay added to the latency in seconds.',
+                            metavar="latency_jitter", type=float, default=0.0)
+    arg_parser.add_argument('--error_rate', help='Probability of the mock answering a request with 500.',
+                            metavar="error_rate", type=float, default=0.0)
+    arg_parser.add_argument('--throttle_rate', help='Probability of the mock answering a request with 429.',
+                            metavar="throttle_rate", type=float, default=0.0)
+    arg_parser.add_argument('--retry_after', help='Retry-After of the 429 responses in seconds.',
+                            metavar="retry_after", type=int, default=1)
+    arg_parser.add_argument('--pool_size', help='Maximum number of kept-alive connections per host.',
+                            metavar="pool_size", type=int, default=32)
+    arg_parser.add_argument('--max_requests', help='Maximum number of requests in flight per host.',
+                            metavar="max_requests", type=int, default=64)
+    arg_parser.add_argument('--max_retries', help='Maximum number of retries of one request.',
+                            metavar="max_retries", type=int, default=5)
+    arg_parser.add_argument('--max_workers', help='Number of objects of the setup created concurrently.',
+                            metavar="max_workers", type=int, default=8)
+    arg_parser.add_argument('--metadata_workers', help='Number of threads fetching document metadata.',
+                            metavar="metadata_workers", type=int, default=4)
+    arg_parser.add_argument('--download_workers', help='Number of threads downloading originals.',
+                            metavar="download_workers", type=int, default=8)
+    arg_parser.add_argument('--upload_workers', help='Number of threads uploading documents.',
+                            metavar="upload_workers", type=int, default=8)
+    arg_parser.add_argument('--max_pending', help='Maximum number of documents waiting between the stages.',
+                            metavar="max_pending", type=int, default=8)
+    arg_parser.add_argument('--blob_cache_size', help='Maximum size of the originals cache in bytes, 0 copies the '
+                                                      'originals without the cache.',
+                            metavar="blob_cache_size", type=int, default=10 * 1024 ** 3)
+    arg_parser.add_argument('--output', help='Append the results of every scenario to this file as JSON lines.',
+                            metavar="output", type=str)
+
+    return arg_parser
+
+
+if __name__ == "__main__":
+
+    args = get_parser().parse_args()
+
+    for queues in [int(value) for value in args.queues.split(",")]:
+
+        scenario = run_scenario(queues, args.documents, args)
+
+        print_scenario(scenario)
+
+        if args.output:
+            with open(args.output, "a") as output:
+                output.write(json.dumps(scenario) + "\n")
@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+
+import orgs_deep_copy_scripy as deep_copy
+from rossum_mock_server import MockRossumServer, populate_template
+
+
+class MockApiTestCase(unittest.TestCase):
+
+    """
+    Runs every test against a fresh MockRossumServer with a small template organization. The module globals
+    of the copy script (API URLs, HTTP client, credential cache) are pointed at the server for the test only.
+    """
+
+    server_options = {}
+    client_options = {"backoff": 0}
+
+    def setUp(self):
+
+        self.server = MockRossumServer(**self.server_options).start()
+        self.addCleanup(self.server.stop)
+
+        self.store = self.server.store
+        self.template = populate_template(self.store, queues=4, documents=12, original_size=1024)
+        self.token = self.store.issue_token(self.template["url"])
+        # The template token stays valid however short the token lifetime of the server is.
+        del self.store.token_issued_at[self.token]
+
+        self.client = deep_copy.HttpClient(**self.client_options)
+        self.addCleanup(self.client.close)
+
+        for name, value in (("API_URL", self.server.api_url),
+                            ("DATA_MATCHING_URL", self.server.data_matching_url),
+                            ("HTTP_CLIENT", self.client),
+                            ("CREDENTIALS", deep_copy.CredentialCache())):
+            patcher = mock.patch.object(deep_copy, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def requests_count(self, endpoint):
+        return self.server.stats.get(endpoint, {}).get("requests", 0)
+
+    def objects_count(self):
+        return {kind: len(objects) for kind, objects in self.store.objects.items()}
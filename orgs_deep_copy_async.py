@@ -0,0 +1,815 @@
+import asyncio
+import json
+import random
+import tempfile
+import time
+
+import aiohttp
+
+from orgs_deep_copy_scripy import (ANNOTATION_FIELDS, API_URL, DATA_MATCHING_URL, DOCUMENT_FIELDS, IDEMPOTENT_METHODS,
+                                   PAGE_SIZE, RETRY_STATUSES, SPOOL_THRESHOLD, TEMPLATE_ID, TRANSFER_CHUNK_SIZE,
+                                   get_master_data_organization, get_retry_after, reduce_annotation,
+                                   schema_content_hash)
+
+# Maximum number of requests in flight per endpoint class. Listing and downloading are cheap for the API,
+# creating objects is not, and logins are rare.
+DEFAULT_LIMITS = {"auth": 8,
+                  "read": 256,
+                  "download": 256,
+                  "write": 64,
+                  "upload": 128}
+
+# Maximum total size of the originals kept in memory while they are copied, larger ones are spooled to disk.
+DEFAULT_MAX_SPOOLED_BYTES = 256 * 1024 * 1024
+
+
+def get_endpoint_class(method, url):
+
+    """
+    Classify the request for the per-class concurrency limits.
+    :param method: HTTP method
+    :param url: Absolute URL
+    :return: One of the keys of DEFAULT_LIMITS
+    """
+
+    if "/auth/" in url:
+        return "auth"
+    if "/original/" in url:
+        return "download"
+    if "/upload/" in url or url.endswith("/import"):
+        return "upload"
+    if method == "GET":
+        return "read"
+
+    return "write"
+
+
+class AsyncRossumClient(object):
+
+    """
+    asyncio counterpart of the helpers of orgs_deep_copy_scripy.py built on aiohttp. One process keeps thousands
+    of requests in flight, limited only by the semaphore of each endpoint class and by the connection limit.
+    Failed requests are retried the same way as by the blocking HttpClient: 429 always, connection errors and
+    5xx only for idempotent requests, with exponential backoff, jitter and Retry-After.
+    """
+
+    def __init__(self, api_url=API_URL, data_matching_url=DATA_MATCHING_URL, limits=None, max_connections=None,
+                 timeout=(10, 300), max_retries=5, backoff=0.5, max_backoff=60, page_size=PAGE_SIZE,
+                 instrumentation=None, spool_threshold=SPOOL_THRESHOLD, max_spooled_bytes=DEFAULT_MAX_SPOOLED_BYTES):
+
+        """
+        :param api_url: URL of the Rossum API.
+        :param data_matching_url: URL of the Data Matching API.
+        :param limits: Dict of endpoint class -> maximum number of requests in flight, merged into DEFAULT_LIMITS.
+        :param max_connections: Maximum number of open connections, the sum of the limits by default.
+        :param timeout: (connect, read) timeout in seconds.
+        :param max_retries: Maximum number of retries of one request.
+        :param backoff: Base of the exponential backoff in seconds.
+        :param max_backoff: Maximum backoff in seconds, unless the API asks for more with Retry-After.
+        :param page_size: Number of results per page of list endpoints.
+        :param instrumentation: Instrumentation recording every request, nothing is recorded when None.
+        :param spool_threshold: Size in bytes above which a downloaded original is kept on disk.
+        :param max_spooled_bytes: Maximum total size of the originals kept in memory by create_annotations,
+        it lowers the spool threshold of every document so that max_pending documents fit into it.
+        """
+
+        self.api_url = api_url
+        self.data_matching_url = data_matching_url
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.max_connections = max_connections or sum(self.limits.values())
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.page_size = page_size
+        self.instrumentation = instrumentation
+        self.spool_threshold = spool_threshold
+        self.max_spooled_bytes = max_spooled_bytes
+        self._semaphores = {}
+        self._session = None
+
+    async def __aenter__(self):
+
+        # Semaphores and the session belong to the running event loop, so they are created here.
+        self._semaphores = {name: asyncio.Semaphore(limit) for name, limit in self.limits.items()}
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=0),
+            timeout=aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1]),
+            cookie_jar=aiohttp.DummyCookieJar())
+
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    def _retry_delay(self, attempt, response):
+
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = get_retry_after(response)
+
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return delay
+
+    async def request(self, method, url, token=None, idempotent=None, consume=None, **kwargs):
+
+        """
+        Send a request, retrying it when it fails.
+        :param method: HTTP method
+        :param url: Absolute URL
+        :param token: Authentication token used for the Authorization header.
+        :param idempotent: Whether the request can be repeated safely, decided by the method when None.
+        :param consume: Coroutine function reading the response, JSON is read by default.
+        :param kwargs: Any other arguments accepted by aiohttp.ClientSession.request. The data can also be
+        a function building the body for every attempt, for bodies such as aiohttp.FormData which can be sent once.
+        :return: Tuple (HTTP status, result of consume)
+        """
+
+        if token is not None:
+            kwargs["headers"] = dict(kwargs.get("headers") or {}, Authorization="token {0}".format(token))
+
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+
+        if consume is None:
+            consume = read_json
+
+        # aiohttp closes file bodies once they are sent, so a file is sent from a generator which can be
+        # created again for every attempt. Its size is known, so it is not sent chunked.
+        body = kwargs.get("data")
+        make_body = body if callable(body) else None
+        body_position = body.tell() if hasattr(body, "seek") and hasattr(body, "tell") else None
+
+        if body_position is not None:
+            body.seek(0, 2)
+            kwargs["headers"] = dict(kwargs.get("headers") or {}, **{"Content-Length": str(body.tell() - body_position)})
+        semaphore = self._semaphores[get_endpoint_class(method, url)]
+        attempt = 0
+        start = time.time()
+        started = time.perf_counter()
+
+        while True:
+
+            error = None
+            status = None
+            retry_after_response = None
+
+            if body_position is not None:
+                body.seek(body_position)
+                kwargs["data"] = iterate_file(body)
+            elif make_body is not None:
+                kwargs["data"] = make_body()
+
+            try:
+                async with semaphore:
+                    async with self._session.request(method, url, **kwargs) as response:
+
+                        status = response.status
+                        retry = status == 429 or (idempotent and status in RETRY_STATUSES)
+
+                        if not retry or attempt >= self.max_retries:
+                            result = await consume(response)
+                            self._record(method, url, status, None, start, started, attempt, response)
+                            return status, result
+
+                        retry_after_response = response
+                        await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+                connect_failed = isinstance(e, aiohttp.ClientConnectorError)
+
+                if attempt >= self.max_retries or not (idempotent or connect_failed):
+                    self._record(method, url, None, e, start, started, attempt, None)
+                    raise
+
+            delay = self._retry_delay(attempt, retry_after_response)
+            attempt += 1
+
+            print("Retrying {0} {1} in {2:.1f}s ({3}) - attempt {4}".format(
+                method, url, delay, error or status, attempt))
+
+            await asyncio.sleep(delay)
+
+    def _record(self, method, url, status, error, start, started, retries, response):
+
+        if self.instrumentation is None:
+            return
+
+        bytes_out = 0
+        bytes_in = 0
+
+        if response is not None:
+            bytes_out = int(response.request_info.headers.get("Content-Length") or 0)
+            bytes_in = int(response.headers.get("Content-Length") or 0)
+
+        self.instrumentation.record_request(method, url, status, error, start, time.perf_counter() - started, retries,
+                                            bytes_out=bytes_out, bytes_in=bytes_in)
+
+    async def login(self, username, password):
+
+        """
+        Login to the Rossum's API
+        :param username: Rossum username
+        :param password: Password of the user
+        :return: Auth token
+        """
+
+        status, result = await self.request("POST", "{0}/auth/login".format(self.api_url), idempotent=True,
+                                             data={"username": username, "password": password})
+
+        print_status("Logging in", status, 200)
+
+        if status != 200:
+            raise RuntimeError("Logging in failed with HTTP {0}".format(status))
+
+        return result["key"]
+
+    async def login_to_specific_organization(self, organization_url, token):
+
+        """
+        Get the auth token of another organization of the user.
+        :param organization_url: Organization where to log in
+        :param token: Token from the primary organization.
+        :return: Auth token
+        """
+
+        status, result = await self.request("POST", "{0}/auth/membership_token".format(self.api_url), token=token,
+                                             idempotent=True, data={"organization": organization_url})
+
+        print_status("Logging in to secondary organization", status, 200)
+
+        if status != 200:
+            raise RuntimeError("Logging in to secondary organization failed with HTTP {0}".format(status))
+
+        return result["key"]
+
+    async def login_to_data_matching_with_token(self, token):
+
+        """
+        Login to the Data Matching API.
+        :param token: Auth token of the Rossum API.
+        :return: Value of the session cookie, passed to the other Data Matching calls
+        """
+
+        async def read_session(response):
+            return response.cookies["session"].value if "session" in response.cookies else None
+
+        status, session = await self.request("POST", "{0}/auth/token_login".format(self.data_matching_url),
+                                              idempotent=True, consume=read_session,
+                                              headers={"Authorization": "Token {0}".format(token)})
+
+        print_status("Logging in to data matching", status, 200)
+
+        if status != 200:
+            raise RuntimeError("Logging in to data matching failed with HTTP {0}".format(status))
+
+        return session
+
+    async def get_page(self, url, token, params=None, description="Fetching results"):
+
+        """
+        Fetch one page of a list endpoint.
+        :param url: URL of the list endpoint or of one of its pages.
+        :param token: Authentication token.
+        :param params: Query parameters.
+        :param description: Description of the fetched objects printed with the page.
+        :return: Dict with the pagination and the results
+        """
+
+        status, page = await self.request("GET", url, token=token, params=params)
+
+        print_status(description, status, 200)
+
+        if status != 200:
+            raise RuntimeError("{0} failed with HTTP {1}".format(description, status))
+
+        return page
+
+    async def get_all(self, url, token, params=None, description="Fetching results"):
+
+        """
+        Get all results of a list endpoint. When the first page tells the number of pages,
+        the rest of them is fetched concurrently, otherwise the "next" links are followed.
+        :param url: URL of the list endpoint.
+        :param token: Authentication token.
+        :param params: Query parameters (filters).
+        :param description: Description of the fetched objects printed with each page.
+        :return: List of results
+        """
+
+        params = dict(params or {}, page_size=self.page_size)
+        page = await self.get_page(url, token, params, description)
+        results = list(page["results"])
+        pagination = page.get("pagination") or {}
+
+        if pagination.get("total_pages"):
+            pages = await asyncio.gather(*[self.get_page(url, token, dict(params, page=number), description)
+                                           for number in range(2, pagination["total_pages"] + 1)])
+            for next_page in pages:
+                results.extend(next_page["results"])
+            return results
+
+        while pagination.get("next"):
+            page = await self.get_page(pagination["next"], token, None, description)
+            results.extend(page["results"])
+            pagination = page.get("pagination") or {}
+
+        return results
+
+    async def get_all_organizations(self, token):
+        return await self.get_all("{0}/organizations".format(self.api_url), token,
+                                  description="Fetching organizations")
+
+    async def get_all_workspaces(self, organization_dict, token):
+        return await self.get_all("{0}/workspaces".format(self.api_url), token,
+                                  {"organization": organization_dict["id"]}, "Fetching workspaces")
+
+    async def get_all_queues(self, organization_dict, token):
+        return await self.get_all("{0}/queues".format(self.api_url), token,
+                                  {"organization": organization_dict["id"]}, "Fetching queues")
+
+    async def get_all_extensions(self, organization_dict, token):
+        return await self.get_all("{0}/hooks".format(self.api_url), token,
+                                  {"organization": organization_dict["id"]}, "Fetching extensions")
+
+    async def get_all_annotations(self, organization_dict, token, filters=None):
+        return await self.get_all("{0}/annotations".format(self.api_url), token,
+                                  dict(filters or {}, organization=organization_dict["id"]), "Fetching annotations")
+
+    async def get_objects_by_url(self, kind, urls, token, fields=None, description="Fetching results"):
+
+        """
+        Fetch many objects of one kind with concurrent id-list requests of the list endpoint, one request per
+        page_size objects, the same as get_objects_by_url of the copy script.
+        :param kind: Name of the list endpoint, e.g. "documents"
+        :param urls: URLs of the objects
+        :param token: Authentication token.
+        :param fields: Attributes of the objects to be returned, all when None. "url" is always among them.
+        :param description: Description of the fetched objects printed with each request.
+        :return: Dict of URL -> object, objects the API did not return are missing
+        """
+
+        urls = list(dict.fromkeys(url.rstrip("/") for url in urls))
+        chunks = [urls[start:start + self.page_size] for start in range(0, len(urls), self.page_size)]
+
+        def get_params(chunk):
+            params = {"id": ",".join(url.split("/")[-1] for url in chunk), "page_size": len(chunk)}
+            if fields:
+                params["fields"] = ",".join(dict.fromkeys(("url",) + tuple(fields)))
+            return params
+
+        pages = await asyncio.gather(*[self.get_page("{0}/{1}".format(self.api_url, kind), token, get_params(chunk),
+                                                     description) for chunk in chunks])
+
+        return {obj["url"].rstrip("/"): obj for page in pages for obj in page["results"]
+                if obj.get("url", "").rstrip("/") in urls}
+
+    async def get_schemas(self, schema_urls, token):
+
+        """
+        Get many schemas with batched id-list requests, schemas missing from them are fetched one by one.
+        :param schema_urls: URLs of the schemas.
+        :param token: Authentication token.
+        :return: Dict of schema URL -> schema
+        """
+
+        schema_urls = list(dict.fromkeys(schema_urls))
+        found = await self.get_objects_by_url("schemas", schema_urls, token, description="Fetching schemas")
+        missing = [url for url in schema_urls if url.rstrip("/") not in found]
+        fetched = dict(zip(missing, await asyncio.gather(*[self.get_schema(url, token) for url in missing])))
+
+        return {url: fetched.get(url) or found[url.rstrip("/")] for url in schema_urls}
+
+    async def iterate_annotations(self, organization_dict, token, filters=None):
+
+        """
+        Lazily list the annotations of an organization with their sideloaded documents, reduced to ANNOTATION_FIELDS
+        and DOCUMENT_FIELDS, fetching the documents with batched id-list requests when the API does not sideload
+        them. The next page is requested while the current one is being consumed, so at most two pages are held
+        in memory.
+        :param organization_dict: Dict representing the organization
+        :param token: Authentication token
+        :param filters: Query filters of the annotations endpoint.
+        :return: Async generator of annotations
+        """
+
+        url = "{0}/annotations".format(self.api_url)
+        next_page = asyncio.ensure_future(self.get_page(
+            url, token, dict(filters or {}, organization=organization_dict["id"], page_size=self.page_size,
+                             sideload="documents", fields=",".join(ANNOTATION_FIELDS)),
+            "Fetching annotations"))
+
+        try:
+            while next_page is not None:
+
+                page = await next_page
+                next_url = (page.get("pagination") or {}).get("next")
+                next_page = asyncio.ensure_future(self.get_page(next_url, token, None, "Fetching annotations")) \
+                    if next_url else None
+
+                if page.get("documents") is not None:
+                    documents = {document["url"].rstrip("/"): document for document in page["documents"]}
+                else:
+                    documents = await self.get_objects_by_url(
+                        "documents", [annotation["document"] for annotation in page["results"]], token,
+                        fields=DOCUMENT_FIELDS, description="Fetching documents")
+
+                for annotation in page["results"]:
+                    yield reduce_annotation(annotation,
+                                            documents.get((annotation.get("document") or "").rstrip("/")))
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
+    async def get_object(self, url, token, description):
+
+        status, result = await self.request("GET", url, token=token)
+
+        print_status(description, status, 200)
+
+        if status != 200:
+            raise RuntimeError("{0} failed with HTTP {1}".format(description, status))
+
+        return result
+
+    async def get_schema(self, schema_url, token):
+        return await self.get_object(schema_url, token, "Fetching schema")
+
+    async def get_document(self, document_url, token):
+        return await self.get_object(document_url, token, "Fetching document")
+
+    async def get_annotation_document(self, annotation, token):
+
+        # Documents sideloaded with the annotation need no request.
+        if annotation.get("s3_name") is not None:
+            return {"url": annotation["document"], "s3_name": annotation["s3_name"],
+                    "original_file_name": annotation["original_file_name"]}
+
+        return await self.get_document(annotation["document"], token)
+
+    async def get_original_document(self, document, token, spool_threshold=None):
+
+        """
+        Download original of the document into a spooled temporary file, see get_original_document of the script.
+        :param document: Dict representing the document
+        :param token: Authentication token
+        :param spool_threshold: Size in bytes above which the original is kept on disk, the client's by default.
+        :return: File object with the content of the original document, positioned at its start
+        """
+
+        async def spool(response):
+            original_file = tempfile.SpooledTemporaryFile(max_size=spool_threshold or self.spool_threshold)
+            async for chunk in response.content.iter_chunked(TRANSFER_CHUNK_SIZE):
+                original_file.write(chunk)
+            original_file.seek(0)
+            return original_file
+
+        status, original_file = await self.request("GET", "{0}/original/{1}".format(self.api_url, document["s3_name"]),
+                                                   token=token, consume=spool)
+
+        print_status("Getting original document", status, 200)
+
+        if status != 200:
+            original_file.close()
+            raise RuntimeError("Getting original document failed with HTTP {0}".format(status))
+
+        return original_file
+
+    async def create(self, kind, token, description, **kwargs):
+
+        status, result = await self.request("POST", "{0}/{1}".format(self.api_url, kind), token=token, **kwargs)
+
+        print_status(description, status, 201)
+
+        if status != 201:
+            raise RuntimeError("{0} failed with HTTP {1}: {2}".format(description, status, result))
+
+        return result
+
+    async def create_organization(self, create_key, org_name, user_fullname, user_email, user_password):
+
+        """
+        Create a fresh new organization
+        :param create_key: Create key of the given organization group provided by Rossum team
+        :param org_name: Name of the new organization
+        :param user_fullname: Full name of the admin to be created in the new organization
+        :param user_email: Full email of the admin to be created in the new organization
+        :param user_password: Password of the new admin
+        :return: Dict representing the new organization
+        """
+
+        result = await self.create("organizations/create", None, "Creating new organization",
+                                   data={"template_name": "Empty Organization Template",
+                                         "organization_name": org_name,
+                                         "user_fullname": user_fullname,
+                                         "user_email": user_email,
+                                         "user_password": user_password,
+                                         "user_ui_settings": json.dumps({"locale": "en"}),
+                                         "create_key": create_key})
+
+        return result["organization"]
+
+    async def create_workspace(self, organization_url, token, workspace):
+        result = await self.create("workspaces", token, "Creating workspace '{0}'".format(workspace["name"]),
+                                   data={"name": workspace["name"],
+                                         "organization": organization_url,
+                                         "metadata": json.dumps(workspace["metadata"])})
+        return result["url"]
+
+    async def create_schema(self, schema, token):
+        result = await self.create("schemas", token, "Creating schema '{0}'".format(schema["name"]),
+                                   json={"name": schema["name"], "content": schema["content"]})
+        return result["url"]
+
+    async def create_queue(self, queue, new_workspace_url, new_schema_url, token):
+        result = await self.create("queues", token, "Creating queue '{0}'".format(queue["name"]),
+                                   json={"name": queue["name"],
+                                         "workspace": new_workspace_url,
+                                         "metadata": queue["metadata"],
+                                         "schema": new_schema_url})
+        return result["url"]
+
+    async def create_extension(self, new_queues_mapping, extension, token, user_url):
+        payload = dict(extension, queues=[new_queues_mapping[x] for x in extension["queues"]], token_owner=user_url)
+        result = await self.create("hooks", token, "Creating extension '{0}'".format(extension.get("name")),
+                                   json=payload)
+        return result["url"]
+
+    async def upload_document(self, filename, content, queue_id, token):
+
+        """
+        Upload a document to a specific queue in the new organization
+        :param filename: Filename to be uploaded.
+        :param content: Content of the new file - bytes or a file object.
+        :param queue_id: Queue where the file should be uploaded.
+        :param token: Authentication token to the new organization.
+        :return: Dict representing the new annotation
+        """
+
+        return await self.create("queues/{0}/upload/{1}".format(queue_id, filename), token, "Uploading new document",
+                                 data=content)
+
+    async def upload_master_data_to_data_matching(self, token, target_queues, file, matching_code_column, entity,
+                                                  session=None):
+
+        """
+        Upload sample data to data matching database.
+        :param token: Token of the organization where data should be uploaded.
+        :param target_queues: List of where the master data should be uploaded.
+        :param file: Master data to be uploaded - in JSON format.
+        :param matching_code_column: Primary key of the master data, required when uploading.
+        :param entity: The entity name of the data - (Purchase Orders, Suppliers, etc.)
+        :param session: Data Matching session cookie, a new session is opened when None.
+        :return: Dict representing the response
+        """
+
+        if session is None:
+            session = await self.login_to_data_matching_with_token(token)
+
+        content = json.dumps(file)
+
+        # A sent form cannot be sent again, so every attempt gets its own.
+        def build_form():
+            form = aiohttp.FormData()
+            form.add_field("files", content, filename="master_data.json", content_type="application/json")
+            form.add_field("encoding", "utf-8")
+            for target_queue in target_queues:
+                form.add_field("queues", str(target_queue))
+            form.add_field("matching_code_column", matching_code_column)
+            form.add_field("dataset", entity)
+            return form
+
+        status, result = await self.request("POST", "{0}/import".format(self.data_matching_url), data=build_form,
+                                            cookies={"session": session})
+
+        print_status("Uploading data to data matching", status, 200)
+
+        if status != 200:
+            raise RuntimeError("Uploading data to data matching failed with HTTP {0}: {1}".format(status, result))
+
+        return result
+
+    async def copy_organization_setup(self, organization_url, token, master_org_auth_token, workspaces_list,
+                                      queues_list, extensions_list, user_url, schema_deduplication="url"):
+
+        """
+        Create workspaces, schemas, queues and extensions in the new organization. Every object is a task
+        awaiting only the objects it depends on, so everything independent is created at once.
+        Failed objects and the objects depending on them are reported and skipped.
+        :param organization_url: The new organization where the objects will be created.
+        :param token: Auth token to the new organization
+        :param master_org_auth_token: Auth token to the original organization where we copy objects from.
+        :param workspaces_list: List of original workspaces to be copied.
+        :param queues_list: List of original queues to be copied.
+        :param extensions_list: List of original extensions to be copied.
+        :param user_url: User ID which will be assigned as a token owner of the extensions.
+        :param schema_deduplication: "url", "content" or "off", the same as for SchemaCache.
+        :return: Tuple (workspaces mapping, queues mapping, list of extension URLs, dict of failures)
+        """
+
+        workspace_tasks = {workspace["url"]: asyncio.ensure_future(
+            self.create_workspace(organization_url, token, workspace)) for workspace in workspaces_list}
+        # All source schemas are read at once with batched requests.
+        source_schemas = asyncio.ensure_future(
+            self.get_schemas([queue["schema"] for queue in queues_list], master_org_auth_token))
+        new_schemas = {}
+
+        def memoize(store, key, factory):
+            if key not in store:
+                store[key] = asyncio.ensure_future(factory())
+            return store[key]
+
+        async def copy_schema(queue):
+            schema = (await source_schemas)[queue["schema"]]
+            if schema_deduplication == "off":
+                return await self.create_schema(schema, token)
+            key = schema_content_hash(schema) if schema_deduplication == "content" else queue["schema"]
+            return await memoize(new_schemas, key, lambda: self.create_schema(schema, token))
+
+        async def copy_queue(queue):
+            new_workspace_url, new_schema_url = await asyncio.gather(workspace_tasks[queue["workspace"]],
+                                                                     copy_schema(queue))
+            return await self.create_queue(queue, new_workspace_url, new_schema_url, token)
+
+        queue_tasks = {queue["url"]: asyncio.ensure_future(copy_queue(queue)) for queue in queues_list}
+
+        async def copy_extension(extension):
+            new_queue_urls = await asyncio.gather(*[queue_tasks[queue_url] for queue_url in extension["queues"]])
+            return await self.create_extension(dict(zip(extension["queues"], new_queue_urls)), extension, token,
+                                               user_url)
+
+        extension_tasks = {extension["url"]: asyncio.ensure_future(copy_extension(extension))
+                           for extension in extensions_list}
+
+        failures = {}
+        mappings = []
+
+        for kind, tasks in (("workspace", workspace_tasks), ("queue", queue_tasks), ("extension", extension_tasks)):
+
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            mapping = {}
+
+            for source_url, task in tasks.items():
+                if task.exception() is not None:
+                    print("Task {0} - ERROR: {1}".format((kind, source_url), task.exception()))
+                    failures[(kind, source_url)] = task.exception()
+                else:
+                    mapping[source_url] = task.result()
+
+            mappings.append(mapping)
+
+        if failures:
+            print("Copying organization setup - {0} ERROR(S)".format(len(failures)))
+
+        return mappings[0], mappings[1], list(mappings[2].values()), failures
+
+    async def create_annotations(self, new_queues_mapping, original_annotations, token, master_org_auth_token,
+                                 max_pending=1000):
+
+        """
+        Copy documents of the original annotations to the new organization. Every document is fetched, downloaded
+        and uploaded by its own task, at most max_pending documents are being copied at once. Each of them is kept
+        in memory only up to its share of max_spooled_bytes, so memory stays bounded however large max_pending is.
+        :param new_queues_mapping: Mapping of the original queues from master organization to new queues URL.
+        :param original_annotations: Iterable or async iterable of original annotations to be copied, consumed as
+        the copied documents make room.
+        :param token: Auth token to the new organization
+        :param master_org_auth_token: Auth token to the original organization where we copy objects from.
+        :param max_pending: Maximum number of documents being copied at once, bounds the memory use.
+        :return: List of (annotation, exception) tuples for the documents that failed to be copied
+        """
+
+        pending = asyncio.Semaphore(max_pending)
+        spool_threshold = max(1, min(self.spool_threshold, self.max_spooled_bytes // max_pending))
+        failures = []
+
+        async def copy_document(annotation):
+            try:
+                document = await self.get_annotation_document(annotation, master_org_auth_token)
+                with await self.get_original_document(document, master_org_auth_token,
+                                                      spool_threshold=spool_threshold) as original_file:
+                    await self.upload_document(document["original_file_name"], original_file,
+                                               new_queues_mapping[annotation["queue"]].split("/")[-1], token)
+            except Exception as e:
+                print("Copying document - ERROR: {0}".format(e))
+                failures.append((annotation, e))
+            finally:
+                pending.release()
+
+        # Only the running tasks are kept, finished ones are dropped so memory does not grow with the annotations.
+        tasks = set()
+
+        async def start(annotation):
+            await pending.acquire()
+            task = asyncio.ensure_future(copy_document(annotation))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        # The started copies are awaited even when listing the annotations raised, the error is raised afterwards.
+        try:
+            if hasattr(original_annotations, "__aiter__"):
+                async for annotation in original_annotations:
+                    await start(annotation)
+            else:
+                for annotation in original_annotations:
+                    await start(annotation)
+        finally:
+            await asyncio.gather(*tasks)
+
+        if failures:
+            print("Copying documents - {0} ERROR(S)".format(len(failures)))
+
+        return failures
+
+
+async def iterate_file(file_object):
+
+    while True:
+        chunk = file_object.read(TRANSFER_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def read_json(response):
+
+    # Error responses of proxies are not always JSON.
+    try:
+        return await response.json(content_type=None)
+    except ValueError:
+        return await response.text()
+
+
+def print_status(description, status, expected_status):
+
+    if status == expected_status:
+        print("{0} - OK".format(description))
+    else:
+        print("{0} - ERROR".format(description))
+
+
+async def deep_copy_organization(client, master_org_token, create_key, org_name, user_fullname, user_email,
+                                 user_password, annotation_filters=None, schema_deduplication="url",
+                                 max_pending=1000, template_id=TEMPLATE_ID):
+
+    """
+    Deep-copy the template organization into a new organization, the asyncio counterpart of the copy script.
+    :param client: AsyncRossumClient, entered
+    :param master_org_token: Auth token to the template organization.
+    :param create_key: Create key of the organization group.
+    :param org_name: Name of the new organization
+    :param user_fullname: Full name of the admin of the new organization
+    :param user_email: Email of the admin of the new organization
+    :param user_password: Password of the admin of the new organization
+    :param annotation_filters: Query filters of the annotations whose documents are copied.
+    :param schema_deduplication: "url", "content" or "off", the same as for SchemaCache.
+    :param max_pending: Maximum number of documents being copied at once.
+    :param template_id: Metadata ID of the template organization.
+    :return: Tuple (workspaces mapping, queues mapping, list of failures)
+    """
+
+    organizations = await client.get_all_organizations(master_org_token)
+    master_data_org = get_master_data_organization(organizations, template_id)
+
+    if master_data_org is None:
+        raise RuntimeError("Template organization '{0}' not found".format(template_id))
+
+    # The template is read before the organization is created, so a failed read does not leave an empty one behind.
+    workspaces, queues, extensions = await asyncio.gather(
+        client.get_all_workspaces(master_data_org, master_org_token),
+        client.get_all_queues(master_data_org, master_org_token),
+        client.get_all_extensions(master_data_org, master_org_token))
+
+    organization = await client.create_organization(create_key, org_name, user_fullname, user_email, user_password)
+
+    organization_url = "{0}/organizations/{1}".format(client.api_url, organization["id"])
+    new_org_token = await client.login_to_specific_organization(organization_url, master_org_token)
+
+    workspaces_mapping, queues_mapping, _, setup_failures = await client.copy_organization_setup(
+        organization_url, new_org_token, master_org_token, workspaces, queues, extensions, organization["users"][0],
+        schema_deduplication=schema_deduplication)
+
+    annotations = client.iterate_annotations(master_data_org, master_org_token, filters=annotation_filters)
+    document_failures = await client.create_annotations(queues_mapping, annotations, new_org_token, master_org_token,
+                                                        max_pending=max_pending)
+
+    return workspaces_mapping, queues_mapping, list(setup_failures.items()) + document_failures
+
+
+def run_deep_copy(master_org_token, create_key, org_name, user_fullname, user_email, user_password, **options):
+
+    """
+    Run deep_copy_organization in a new event loop.
+    :param options: Keyword arguments of AsyncRossumClient (client_options) and of deep_copy_organization.
+    :return: Result of deep_copy_organization
+    """
+
+    client_options = options.pop("client_options", {})
+
+    async def run():
+        async with AsyncRossumClient(**client_options) as client:
+            return await deep_copy_organization(client, master_org_token, create_key, org_name, user_fullname,
+                                                user_email, user_password, **options)
+
+    return asyncio.run(run())
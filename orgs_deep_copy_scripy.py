@@ -1,8 +1,974 @@
 import requests
+import urllib3
 import json
+import csv
+import hashlib
+import itertools
+import os
+import shutil
+import sqlite3
+import sys
 import argparse
+import base64
+import bisect
+import contextlib
+import queue
+import random
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+API_URL = "https://api.elis.rossum.ai/v1"
+DATA_MATCHING_URL = "https://data-matching.elis.rossum.ai/api/v1"
+
+# Originals bigger than this are spooled to disk instead of memory while being copied.
+SPOOL_THRESHOLD = 8 * 1024 * 1024
+TRANSFER_CHUNK_SIZE = 64 * 1024
+
+# Keys describing one organization created in batch mode.
+ORG_SPEC_KEYS = ("org_name", "username", "email", "password")
+
+# On-disk layout of exported template snapshots, the version changes whenever the layout does.
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MANIFEST = "manifest.json"
+SNAPSHOT_KINDS = ("workspaces", "queues", "schemas", "extensions", "documents")
+SNAPSHOT_ORIGINALS_DIR = "originals"
+
+# Fields of extensions which change without any change to their setup, ignored when detecting changes.
+EXTENSION_VOLATILE_FIELDS = ("id", "url", "modified_at", "modified_by")
+
+# The only attributes of the listed annotations and of their documents the copy needs, the rest is dropped as soon
+# as a page arrives. They are also requested as the "fields" of the list requests, so the API can leave the rest out.
+ANNOTATION_FIELDS = ("url", "document", "queue")
+DOCUMENT_FIELDS = ("url", "s3_name", "original_file_name")
+
+# Metadata ID of the template organization copied by default.
+TEMPLATE_ID = "master_data_organization"
+ORGANIZATION_INDEX_VERSION = 1
+
+# Attributes ignored when comparing organizations: identity, bookkeeping and references to other objects
+# (the references which matter are compared by the names of the referenced objects instead).
+DRIFT_IGNORED_FIELDS = ("id", "url", "organization", "workspace", "schema", "queues", "hooks", "webhooks", "inbox",
+                        "users", "token_owner", "counts", "created_at", "modified_at", "modified_by")
+
+# Maximum page size accepted by the list endpoints of the Rossum API.
+PAGE_SIZE = 100
+
+# Number of objects fetched per request when listing, --page_size. The id-list requests and the sampled pages
+# always use PAGE_SIZE.
+LIST_PAGE_SIZE = PAGE_SIZE
+
+# Responses worth retrying. Throttling responses also make the adaptive limiter back off.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+
+# Methods which can be repeated safely after a failure in the middle of a request.
+# Every PATCH in this script sets absolute values, so repeating it is harmless as well.
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE", "PATCH")
+
+# Path segments replaced by placeholders when requests are grouped by endpoint.
+ENDPOINT_PATTERNS = ((re.compile(r"/original/[^/]+"), "/original/{s3_name}"),
+                     (re.compile(r"/upload/[^/]+"), "/upload/{filename}"),
+                     (re.compile(r"/\d+(?=/|$)"), "/{id}"))
+
+_PIPELINE_DONE = object()
+
+# Upper bounds of the latency histogram buckets in seconds, from 0.1 ms to about 18 minutes in steps of 10 %.
+LATENCY_BUCKETS = tuple(0.0001 * 1.1 ** i for i in range(170))
+
+
+class AdaptiveLimiter(object):
 
-HTTP_COOKIE = None
+    """
+    Concurrency limit adjusted by AIMD (additive increase, multiplicative decrease). Every successful request
+    raises the limit by 1/limit, i.e. roughly by one per round of requests, until throttling responses appear.
+    Then the limit is multiplied by decrease_factor, at most once per cooldown so one burst of throttled
+    requests does not collapse it.
+    """
+
+    def __init__(self, maximum, initial=None, minimum=1, decrease_factor=0.5, cooldown=1.0):
+
+        """
+        :param maximum: Upper bound of the limit.
+        :param initial: Starting limit, min(8, maximum) by default.
+        :param minimum: Lower bound of the limit.
+        :param decrease_factor: Multiplier applied to the limit on throttling.
+        :param cooldown: Minimum number of seconds between two decreases.
+        """
+
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(initial or min(8, maximum))
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, throttled=False):
+
+        with self._condition:
+
+            self._in_flight -= 1
+            now = time.monotonic()
+
+            if throttled:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+            self._condition.notify_all()
+
+
+def get_retry_after(response):
+
+    """
+    Parse the Retry-After header, which holds either a number of seconds or an HTTP date.
+    :param response: requests.Response
+    :return: Number of seconds to wait or None when the header is missing or invalid
+    """
+
+    value = response.headers.get("Retry-After") if response is not None else None
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_connect_error(error):
+
+    """
+    Tell whether the request failed before anything was sent, so repeating it cannot create a duplicate.
+    :param error: Exception raised by requests
+    :return: bool
+    """
+
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+
+    return isinstance(error, requests.exceptions.ConnectionError) and \
+        isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def get_endpoint_template(url):
+
+    """
+    Get the endpoint of the URL with object IDs and file names replaced by placeholders, e.g. /v1/queues/{id}.
+    :param url: Absolute URL
+    :return: str
+    """
+
+    path = urlsplit(url).path
+
+    for pattern, placeholder in ENDPOINT_PATTERNS:
+        path = pattern.sub(placeholder, path)
+
+    return path
+
+
+class LatencyHistogram(object):
+
+    """
+    Count, total and fixed-bucket histogram of durations. It takes the same memory however many durations
+    are added, and its percentiles are accurate to the 10 % width of the buckets.
+    """
+
+    def __init__(self):
+
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, seconds):
+
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def merge(self, other):
+
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def percentile(self, fraction):
+
+        """
+        Nearest-rank percentile, the upper bound of the bucket it falls into.
+        :param fraction: Percentile as a fraction, e.g. 0.99
+        :return: Seconds, None when no duration was added
+        """
+
+        if not self.count:
+            return None
+
+        rank = min(self.count - 1, int(fraction * self.count))
+        seen = 0
+
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen > rank:
+                break
+
+        return min(LATENCY_BUCKETS[index], self.maximum) if index < len(LATENCY_BUCKETS) else self.maximum
+
+
+class Instrumentation(object):
+
+    """
+    Timing of every HTTP request and every phase (span) of the copy. Requests are aggregated per endpoint
+    and spans per name into counters and a LatencyHistogram, which take the same memory however long the run is,
+    so it can stay on all the time. When keep_records is set, every request and span is also kept for the
+    JSON lines and trace exports.
+    Spans opened in worker threads become children of the innermost span opened in the main thread.
+    """
+
+    def __init__(self, keep_records=False):
+
+        """
+        :param keep_records: Keep every request and span, not only the aggregates.
+        """
+
+        self.keep_records = keep_records
+        self.trace_id = os.urandom(16).hex()
+        self.records = []
+        self.endpoints = {}
+        self.spans = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._main_stack = []
+
+    def _stack(self):
+
+        if threading.current_thread() is threading.main_thread():
+            return self._main_stack
+
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+
+        return self._local.stack
+
+    def _parent_id(self):
+
+        stack = self._stack()
+
+        if stack:
+            return stack[-1]
+        if self._main_stack:
+            return self._main_stack[-1]
+
+        return None
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+
+        """
+        Time a phase of the copy, e.g. with INSTRUMENTATION.span("copy documents"): ...
+        :param name: Name of the phase, spans are aggregated by it.
+        :param attributes: Any JSON serializable attributes of the span.
+        :return: None
+        """
+
+        span_id = os.urandom(8).hex()
+        parent_id = self._parent_id()
+        stack = self._stack()
+        stack.append(span_id)
+        start = time.time()
+        started = time.perf_counter()
+        error = None
+
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            stack.pop()
+
+            with self._lock:
+
+                aggregate = self.spans.setdefault(name, {"count": 0, "errors": 0, "latency": LatencyHistogram()})
+                aggregate["count"] += 1
+                aggregate["errors"] += error is not None
+                aggregate["latency"].add(seconds)
+
+                if self.keep_records:
+                    self.records.append({"type": "span", "name": name, "span_id": span_id, "parent_id": parent_id,
+                                         "start": start, "seconds": seconds,
+                                         "error": repr(error) if error is not None else None,
+                                         "attributes": attributes})
+
+    def record_request(self, method, url, status, error, start, seconds, retries, bytes_out=0, bytes_in=0):
+
+        """
+        Record one HTTP request including all of its retries.
+        :param method: HTTP method
+        :param url: Absolute URL
+        :param status: Final HTTP status, None if the request failed without any response.
+        :param error: Exception of the final attempt, None when there is a response.
+        :param start: Unix time when the request was sent.
+        :param seconds: Duration of the request including retries.
+        :param retries: Number of retries.
+        :param bytes_out: Size of the request body.
+        :param bytes_in: Size of the response body.
+        :return: None
+        """
+
+        endpoint = "{0} {1}".format(method, get_endpoint_template(url))
+
+        with self._lock:
+
+            aggregate = self.endpoints.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0, "bytes_out": 0,
+                                                             "bytes_in": 0, "latency": LatencyHistogram()})
+            aggregate["count"] += 1
+            aggregate["errors"] += status is None or status >= 400
+            aggregate["retries"] += retries
+            aggregate["bytes_out"] += bytes_out
+            aggregate["bytes_in"] += bytes_in
+            aggregate["latency"].add(seconds)
+
+            if self.keep_records:
+                self.records.append({"type": "request", "endpoint": endpoint, "method": method, "status": status,
+                                     "error": repr(error) if error is not None else None, "bytes_out": bytes_out,
+                                     "bytes_in": bytes_in, "start": start, "seconds": seconds, "retries": retries,
+                                     "span_id": os.urandom(8).hex(), "parent_id": self._parent_id()})
+
+    def write_jsonl(self, path):
+
+        """
+        Write every recorded request and span as one JSON object per line.
+        :param path: Output file
+        :return: None
+        """
+
+        with self._lock:
+            records = list(self.records)
+
+        with open(path, "w") as output_file:
+            for record in records:
+                output_file.write(json.dumps(record) + "\n")
+
+    def write_trace(self, path, service_name="organization-deepcopy"):
+
+        """
+        Write the recorded spans and requests as an OpenTelemetry trace in the OTLP JSON format,
+        which can be sent to an OTLP/HTTP collector as it is.
+        :param path: Output file
+        :param service_name: Value of the service.name resource attribute.
+        :return: None
+        """
+
+        def attribute(key, value):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return {"key": key, "value": {"stringValue": str(value)}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            return {"key": key, "value": {"doubleValue": value}}
+
+        with self._lock:
+            records = list(self.records)
+
+        spans = []
+
+        for record in records:
+
+            if record["type"] == "span":
+                name = record["name"]
+                kind = 1
+                attributes = dict(record["attributes"])
+                failed = record["error"] is not None
+            else:
+                name = record["endpoint"]
+                kind = 3
+                attributes = {"http.request.method": record["method"],
+                              "url.template": record["endpoint"].split(" ", 1)[1],
+                              "http.request.body.size": record["bytes_out"],
+                              "http.response.body.size": record["bytes_in"],
+                              "http.request.resend_count": record["retries"]}
+                if record["status"] is not None:
+                    attributes["http.response.status_code"] = record["status"]
+                failed = record["status"] is None or record["status"] >= 400
+
+            if record["error"] is not None:
+                attributes["exception.message"] = record["error"]
+
+            span = {"traceId": self.trace_id,
+                    "spanId": record["span_id"],
+                    "name": name,
+                    "kind": kind,
+                    "startTimeUnixNano": str(int(record["start"] * 1e9)),
+                    "endTimeUnixNano": str(int((record["start"] + record["seconds"]) * 1e9)),
+                    "attributes": [attribute(key, value) for key, value in attributes.items()],
+                    "status": {"code": 2 if failed else 1}}
+
+            if record["parent_id"] is not None:
+                span["parentSpanId"] = record["parent_id"]
+
+            spans.append(span)
+
+        write_json_file(path, {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", service_name)]},
+            "scopeSpans": [{"scope": {"name": "orgs_deep_copy_scripy"}, "spans": spans}]}]})
+
+    def print_summary(self):
+
+        """
+        Print a table of the requests per endpoint and of the spans per name.
+        :return: None
+        """
+
+        def percentile(latency, fraction):
+            return (latency.percentile(fraction) or 0.0) * 1000
+
+        with self._lock:
+            endpoints = {key: dict(value) for key, value in self.endpoints.items()}
+            spans = {key: dict(value) for key, value in self.spans.items()}
+
+        print("{0:<44} {1:>7} {2:>6} {3:>7} {4:>11} {5:>11} {6:>9} {7:>9} {8:>9}".format(
+            "Request", "count", "errors", "retries", "bytes out", "bytes in", "total s", "p50 ms", "p99 ms"))
+
+        for endpoint, aggregate in sorted(endpoints.items(), key=lambda item: -item[1]["latency"].total):
+            print("{0:<44} {1:>7} {2:>6} {3:>7} {4:>11} {5:>11} {6:>9.2f} {7:>9.1f} {8:>9.1f}".format(
+                endpoint, aggregate["count"], aggregate["errors"], aggregate["retries"], aggregate["bytes_out"],
+                aggregate["bytes_in"], aggregate["latency"].total, percentile(aggregate["latency"], 0.5),
+                percentile(aggregate["latency"], 0.99)))
+
+        print("{0:<44} {1:>7} {2:>6} {3:>9} {4:>9} {5:>9}".format(
+            "Span", "count", "errors", "total s", "p50 ms", "p99 ms"))
+
+        for name, aggregate in sorted(spans.items(), key=lambda item: -item[1]["latency"].total):
+            print("{0:<44} {1:>7} {2:>6} {3:>9.2f} {4:>9.1f} {5:>9.1f}".format(
+                name, aggregate["count"], aggregate["errors"], aggregate["latency"].total,
+                percentile(aggregate["latency"], 0.5), percentile(aggregate["latency"], 0.99)))
+
+
+INSTRUMENTATION = Instrumentation()
+
+
+class FileBody(object):
+
+    """
+    Request body reading a file object in chunks, with the size of the rest of the file as its length.
+    requests sizes plain file bodies through fileno(), which moves a SpooledTemporaryFile to disk,
+    so files are wrapped in this before they are sent and spooled originals stay in memory.
+    """
+
+    def __init__(self, file_object):
+
+        """
+        :param file_object: Binary file object positioned where the body starts.
+        """
+
+        position = file_object.tell()
+        file_object.seek(0, 2)
+
+        self.file_object = file_object
+        self.length = file_object.tell() - position
+
+        file_object.seek(position)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+
+        while True:
+            chunk = self.file_object.read(TRANSFER_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class HttpClient(object):
+
+    """
+    Shared HTTP client used by all the helpers in this script.
+    Every host (Rossum API, Data Matching) gets one keep-alive connection pool, so thousands of calls
+    do not pay for a new TCP+TLS handshake each. Sessions carrying the default Authorization header
+    are kept per token and all of them share the per-host pools.
+    Failed requests are retried with exponential backoff and jitter, honoring Retry-After. Requests which
+    are not idempotent are retried only when the server surely did not process them (429, connection refused).
+    Requests to every host go through an AdaptiveLimiter so throughput rises until the API starts throttling.
+    """
+
+    def __init__(self, pool_size=32, timeout=(10, 300), max_concurrency=64, max_retries=5, backoff=0.5,
+                 max_backoff=60):
+
+        """
+        :param pool_size: Maximum number of kept-alive connections per host.
+        :param timeout: Default (connect, read) timeout in seconds for every request.
+        :param max_concurrency: Maximum number of requests in flight per host, unlimited when None.
+        :param max_retries: Maximum number of retries of one request.
+        :param backoff: Base of the exponential backoff in seconds.
+        :param max_backoff: Maximum backoff in seconds, unless the API asks for more with Retry-After.
+        """
+
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._limiters = {}
+        self._adapters = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _get_adapter(self, prefix):
+
+        adapter = self._adapters.get(prefix)
+
+        if adapter is None:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            self._adapters[prefix] = adapter
+
+        return adapter
+
+    def session(self, token=None):
+
+        """
+        Get the session for the given token, the Authorization header is set on it by default.
+        Cookies are never persisted so sessions behave the same as the stateless module-level requests calls.
+        :param token: Authentication token, None for unauthenticated calls.
+        :return: requests.Session
+        """
+
+        with self._lock:
+
+            session = self._sessions.get(token)
+
+            if session is None:
+                session = requests.Session()
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+                if token is not None:
+                    session.headers["Authorization"] = "token {0}".format(token)
+
+                self._sessions[token] = session
+
+            return session
+
+    def _mounted_session(self, token, prefix):
+
+        session = self.session(token)
+
+        if prefix not in session.adapters:
+            with self._lock:
+                session.mount(prefix, self._get_adapter(prefix))
+
+        return session
+
+    def _get_limiter(self, prefix):
+
+        with self._lock:
+
+            if self.max_concurrency and prefix not in self._limiters:
+                self._limiters[prefix] = AdaptiveLimiter(self.max_concurrency)
+
+            return self._limiters.get(prefix)
+
+    def _should_retry(self, response, error, idempotent):
+
+        if error is not None:
+            return idempotent or is_connect_error(error)
+
+        if response.status_code == 429:
+            return True
+
+        return idempotent and response.status_code in RETRY_STATUSES
+
+    def _retry_delay(self, attempt, response):
+
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = get_retry_after(response)
+
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return delay
+
+    def request(self, method, url, token=None, idempotent=None, **kwargs):
+
+        """
+        Send a request through the pooled connection of the target host, retrying it when it fails.
+        :param method: HTTP method
+        :param url: Absolute URL
+        :param token: Authentication token used for the default Authorization header.
+        :param idempotent: Whether the request can be repeated safely, decided by the method when None.
+        Pass True for requests like logins which do not create anything.
+        :param kwargs: Any other arguments accepted by requests.Session.request
+        :return: requests.Response
+        """
+
+        token = CREDENTIALS.current_token(token)
+        parts = urlsplit(url)
+        prefix = "{0}://{1}/".format(parts.scheme, parts.netloc)
+        session = self._mounted_session(token, prefix)
+
+        kwargs.setdefault("timeout", self.timeout)
+
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+
+        # File bodies are rewound before a retry, a body which is an iterator cannot be sent twice.
+        body = kwargs.get("data")
+        body_position = body.tell() if hasattr(body, "seek") and hasattr(body, "tell") else None
+        replayable = body_position is not None or not hasattr(body, "__next__")
+
+        if body_position is not None:
+            kwargs["data"] = FileBody(body)
+
+        limiter = self._get_limiter(prefix)
+        attempt = 0
+        refreshed = False
+        start = time.time()
+        started = time.perf_counter()
+
+        while True:
+
+            response = None
+            error = None
+
+            if limiter is not None:
+                limiter.acquire()
+
+            try:
+                response = session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            finally:
+                if limiter is not None:
+                    limiter.release(throttled=response is not None and response.status_code in THROTTLE_STATUSES)
+
+            # An expired membership token is issued again once and the request is repeated with the new one.
+            if response is not None and response.status_code == 401 and replayable and not refreshed:
+
+                new_token = CREDENTIALS.refresh(token)
+
+                if new_token is not None:
+                    print("Refreshing expired token for {0} {1}".format(method, parts.path))
+                    response.close()
+                    refreshed = True
+                    token = new_token
+                    session = self._mounted_session(token, prefix)
+                    if body_position is not None:
+                        body.seek(body_position)
+                    continue
+
+            if attempt >= self.max_retries or not replayable or not self._should_retry(response, error, idempotent):
+                # Only the headers are measured, reading a streamed body here would consume it.
+                INSTRUMENTATION.record_request(
+                    method, url, response.status_code if response is not None else None, error, start,
+                    time.perf_counter() - started, attempt,
+                    bytes_out=int(response.request.headers.get("Content-Length") or 0) if response is not None else 0,
+                    bytes_in=int(response.headers.get("Content-Length") or 0)
+                    if response is not None and method != "HEAD" else 0)
+                if error is not None:
+                    raise error
+                return response
+
+            delay = self._retry_delay(attempt, response)
+            attempt += 1
+
+            print("Retrying {0} {1} in {2:.1f}s ({3}) - attempt {4}".format(
+                method, parts.path, delay, error or response.status_code, attempt))
+
+            if response is not None:
+                response.close()
+
+            time.sleep(delay)
+
+            if body_position is not None:
+                body.seek(body_position)
+
+    def get(self, url, token=None, **kwargs):
+        return self.request("GET", url, token=token, **kwargs)
+
+    def head(self, url, token=None, **kwargs):
+        return self.request("HEAD", url, token=token, **kwargs)
+
+    def post(self, url, token=None, **kwargs):
+        return self.request("POST", url, token=token, **kwargs)
+
+    def patch(self, url, token=None, **kwargs):
+        return self.request("PATCH", url, token=token, **kwargs)
+
+    def delete(self, url, token=None, **kwargs):
+        return self.request("DELETE", url, token=token, **kwargs)
+
+    def close(self):
+
+        """
+        Close all sessions and connection pools.
+        :return: None
+        """
+
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            for adapter in self._adapters.values():
+                adapter.close()
+            self._sessions = {}
+            self._adapters = {}
+
+
+HTTP_CLIENT = HttpClient()
+
+
+def configure_http_client(pool_size, timeout, max_concurrency=64, max_retries=5):
+
+    """
+    Replace the shared HTTP client with a new one using given pool size and timeouts.
+    :param pool_size: Maximum number of kept-alive connections per host.
+    :param timeout: Default (connect, read) timeout in seconds.
+    :param max_concurrency: Maximum number of requests in flight per host, unlimited when None.
+    :param max_retries: Maximum number of retries of one request.
+    :return: HttpClient
+    """
+
+    global HTTP_CLIENT
+
+    HTTP_CLIENT.close()
+    HTTP_CLIENT = HttpClient(pool_size=pool_size, timeout=timeout, max_concurrency=max_concurrency,
+                             max_retries=max_retries)
+
+    return HTTP_CLIENT
+
+
+class CredentialCache(object):
+
+    """
+    Thread-safe cache of the credentials issued during a run: membership tokens per organization URL
+    and Data Matching sessions per token. Concurrent requests for the same credential wait for one login.
+    Credentials older than their max age are issued again, and HttpClient asks for a new membership token
+    whenever the API answers 401 to an issued one, then keeps translating the old token to the new one.
+    With a path the credentials are persisted, encrypted by a key derived from the passphrase, so later runs
+    skip the logins as well. Persistence requires the cryptography package.
+    """
+
+    def __init__(self, path=None, passphrase=None, token_max_age=12 * 3600, session_max_age=3600):
+
+        """
+        :param path: File persisting the credentials, they are kept in memory only when None.
+        :param passphrase: Passphrase the file is encrypted with, required with path.
+        :param token_max_age: Seconds after which a membership token is issued again.
+        :param session_max_age: Seconds after which a Data Matching session is opened again.
+        """
+
+        self.path = path
+        self.token_max_age = token_max_age
+        self.session_max_age = session_max_age
+        self._tokens = {}
+        self._sessions = {}
+        self._replaced = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._key_locks = {}
+        self._fernet = None
+        self._salt = None
+
+        if path is not None:
+            self._load(passphrase)
+
+    def _get_fernet(self, passphrase, salt):
+
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            raise RuntimeError('Persisting credentials requires the cryptography package, '
+                               'install it with "pip install cryptography"')
+
+        key = hashlib.pbkdf2_hmac("sha256", passphrase.encode(), salt, 390000)
+
+        return Fernet(base64.urlsafe_b64encode(key))
+
+    def _load(self, passphrase):
+
+        if not passphrase:
+            raise ValueError("A passphrase is required to persist credentials")
+
+        stored = None
+
+        if os.path.exists(self.path):
+            with open(self.path) as cache_file:
+                stored = json.load(cache_file)
+
+        self._salt = base64.b64decode(stored["salt"]) if stored else os.urandom(16)
+        self._fernet = self._get_fernet(passphrase, self._salt)
+
+        if stored:
+            try:
+                data = json.loads(self._fernet.decrypt(stored["data"].encode()))
+            except Exception:
+                raise ValueError("Cannot decrypt credentials in {0}, wrong passphrase?".format(self.path))
+            self._tokens = {url: tuple(value) for url, value in data["tokens"].items()}
+            self._sessions = {token: tuple(value) for token, value in data["sessions"].items()}
+
+    def _save(self):
+
+        if self._fernet is None:
+            return
+
+        # Logins finishing at once save one after another, each from its own temporary file (created with mode 0600),
+        # so the file is always replaced by one complete snapshot of the credentials.
+        with self._save_lock:
+
+            with self._lock:
+                data = json.dumps({"tokens": self._tokens, "sessions": self._sessions}).encode()
+
+            descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                                          suffix=".part")
+
+            try:
+                with os.fdopen(descriptor, "w") as cache_file:
+                    json.dump({"salt": base64.b64encode(self._salt).decode(),
+                               "data": self._fernet.encrypt(data).decode()}, cache_file)
+                os.replace(temporary_path, self.path)
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+
+    def _key_lock(self, key):
+
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def current_token(self, token):
+
+        """
+        Get the token which replaced the given one after it expired, the token itself when it was not replaced.
+        :param token: Authentication token
+        :return: Authentication token
+        """
+
+        with self._lock:
+            while token in self._replaced:
+                token = self._replaced[token]
+
+        return token
+
+    def membership_token(self, organization_url, token):
+
+        """
+        Get a token to the organization, logging in only when there is no valid one yet.
+        :param organization_url: Organization where to log in
+        :param token: Token from the primary organization.
+        :return: Authentication token
+        """
+
+        with self._key_lock(("token", organization_url)):
+
+            with self._lock:
+                cached = self._tokens.get(organization_url)
+
+            if cached is not None and time.time() - cached[1] < self.token_max_age:
+                return cached[0]
+
+            new_token = login_to_specific_organization(organization_url, self.current_token(token))
+
+            with self._lock:
+                self._tokens[organization_url] = (new_token, time.time(), token)
+                if cached is not None:
+                    self._replaced[cached[0]] = new_token
+
+        self._save()
+
+        return new_token
+
+    def refresh(self, token):
+
+        """
+        Issue again a membership token the API refused.
+        :param token: The refused token
+        :return: The new token, None when the token was not issued by this cache
+        """
+
+        with self._lock:
+            issued = [(url, value) for url, value in self._tokens.items() if value[0] == token]
+            replacement = self._replaced.get(token)
+
+        if replacement is not None:
+            return replacement
+
+        if not issued:
+            return None
+
+        organization_url, (_, issued_at, parent_token) = issued[0]
+
+        with self._key_lock(("token", organization_url)):
+
+            # Another thread may have refreshed it meanwhile.
+            with self._lock:
+                if token in self._replaced:
+                    return self._replaced[token]
+                # Make it look expired so that membership_token issues a new one.
+                self._tokens[organization_url] = (token, 0, parent_token)
+
+        return self.membership_token(organization_url, parent_token)
+
+    def data_matching_session(self, token, refused=None):
+
+        """
+        Get a Data Matching session cookie for the token, logging in only when there is no valid one yet.
+        :param token: Auth token of the Rossum API.
+        :param refused: Session the API refused, a new one is opened unless another thread did so already.
+        :return: Value of the session cookie
+        """
+
+        with self._key_lock(("session", token)):
+
+            with self._lock:
+                cached = self._sessions.get(token)
+
+            if cached is not None and cached[0] != refused and time.time() - cached[1] < self.session_max_age:
+                return cached[0]
+
+            login_to_data_matching_with_token(token)
+
+            with self._lock:
+                session = self._sessions[token][0]
+
+        self._save()
+
+        return session
+
+    def store_data_matching_session(self, token, session):
+
+        with self._lock:
+            self._sessions[token] = (session, time.time())
+
+
+CREDENTIALS = CredentialCache()
 
 
 def login(username, password):
@@ -19,12 +985,13 @@ def login(username, password):
         "password": password
         }
 
-    response = requests.post("https://api.elis.rossum.ai/v1/auth/login", data=payload)
+    response = HTTP_CLIENT.post("{0}/auth/login".format(API_URL), data=payload, idempotent=True)
 
     if response.status_code == 200:
         print("Logging in - OK")
     else:
         print("Logging in - ERROR")
+        response.raise_for_status()
 
     return response.json()["key"]
 
@@ -43,13 +1010,14 @@ def login_to_specific_organization(organization_url, token):
         "organization": organization_url
     }
 
-    headers = {"Authorization": "token {0}".format(token)}
-    response = requests.post("https://api.elis.rossum.ai/v1/auth/membership_token", headers=headers, data=payload)
+    response = HTTP_CLIENT.post("{0}/auth/membership_token".format(API_URL), token=token, data=payload,
+                                idempotent=True)
 
     if response.status_code == 200:
         print("Logging in to secondary organization - OK")
     else:
         print("Logging in to secondary organization - ERROR")
+        response.raise_for_status()
 
     return response.json()["key"]
 
@@ -71,469 +1039,3049 @@ def assign_membership(user_url, organization_url, org_group_id, token):
         "organization": organization_url
     }
 
-    headers = {"Authorization": "token {0}".format(token)}
-    response = requests.post("https://api.elis.rossum.ai/v1/organization_groups/{0}/memberships".format(org_group_id), headers=headers, data=payload)
+    response = HTTP_CLIENT.post("{0}/organization_groups/{1}/memberships".format(API_URL, org_group_id), token=token,
+                                data=payload)
 
     return response
 
 
-def get_all_organizations(token):
+def remove_membership(membership_url, token):
+
+    """
+    Remove the membership of a user in a non-primary organization. Only organization group admin can do that.
+    :param membership_url: URL of the membership.
+    :param token: Auth token from the primary organization.
+    :return: Response
+    """
+
+    return HTTP_CLIENT.delete(membership_url, token=token)
+
+
+def get_object_url(kind, value):
+
+    """
+    Accept both IDs and URLs of the API objects.
+    :param kind: Name of the endpoint, e.g. "users"
+    :param value: ID or URL of the object
+    :return: URL of the object
+    """
+
+    value = value.strip()
+
+    if value.startswith("http"):
+        return value.rstrip("/")
+
+    return "{0}/{1}/{2}".format(API_URL, kind, value)
+
+
+def read_membership_matrix(path):
+
+    """
+    Read the required memberships. A CSV file is a matrix with one row per user and one column per organization,
+    the first column holds the users, the header the organizations and a non-empty cell (other than "0", "no",
+    "false") marks a membership. A JSON file maps every user to the list of its organizations.
+    Users and organizations can be given by their IDs or URLs.
+    :param path: Path of the CSV or JSON file
+    :return: Tuple (set of user URLs, set of organization URLs, set of (user URL, organization URL) tuples)
+    """
+
+    users, organizations, memberships = set(), set(), set()
+
+    if path.lower().endswith(".json"):
+
+        with open(path) as matrix_file:
+            for user, user_organizations in json.load(matrix_file).items():
+                user_url = get_object_url("users", user)
+                users.add(user_url)
+                for organization in user_organizations:
+                    organizations.add(get_object_url("organizations", organization))
+                    memberships.add((user_url, get_object_url("organizations", organization)))
+
+        return users, organizations, memberships
+
+    with open(path, newline="") as matrix_file:
+
+        reader = csv.reader(matrix_file)
+        header = [get_object_url("organizations", organization) for organization in next(reader)[1:]]
+        organizations.update(header)
+
+        for row in reader:
+            if not row or not row[0].strip():
+                continue
+            user_url = get_object_url("users", row[0])
+            users.add(user_url)
+            for organization_url, cell in zip(header, row[1:]):
+                if cell.strip() and cell.strip().lower() not in ("0", "no", "false"):
+                    memberships.add((user_url, organization_url))
+
+    return users, organizations, memberships
+
+
+def sync_memberships(users, organizations, required_memberships, org_group_id, token, workers=16, remove=True):
+
+    """
+    Make the memberships of the given users in the given organizations match the required ones. The existing
+    memberships of the organization group are listed once, and only the missing ones are created and the extra
+    ones removed, concurrently. Memberships of other users or in other organizations are never touched.
+    :param users: Set of URLs of the managed users
+    :param organizations: Set of URLs of the managed organizations
+    :param required_memberships: Set of (user URL, organization URL) tuples
+    :param org_group_id: The ID of the organization group
+    :param token: Auth token from the primary organization of the organization group admin.
+    :param workers: Number of memberships created or removed concurrently.
+    :param remove: Remove the memberships missing from required_memberships.
+    :return: Dict with the numbers of "created", "removed" and "unchanged" memberships and the list of "failures",
+    (action, user URL, organization URL, exception) tuples
+    """
+
+    started = time.perf_counter()
+    existing = {}
+
+    for membership in iterate_paginated("{0}/organization_groups/{1}/memberships".format(API_URL, org_group_id),
+                                        token, description="Fetching memberships"):
+        pair = (membership["user"].rstrip("/"), membership["organization"].rstrip("/"))
+        if pair[0] in users and pair[1] in organizations:
+            existing.setdefault(pair, []).append(membership["url"])
+
+    to_create = sorted(required_memberships - set(existing))
+    to_remove = []
+
+    for pair, membership_urls in sorted(existing.items()):
+        # Duplicate memberships of the same pair are removed as well.
+        to_remove.extend((pair, membership_url) for membership_url in
+                         (membership_urls if pair not in required_memberships else membership_urls[1:]))
+
+    if not remove:
+        to_remove = []
+
+    progress_lock = threading.Lock()
+    result = {"created": 0, "removed": 0, "unchanged": len(required_memberships & set(existing)), "failures": []}
+
+    def create(pair):
+        try:
+            response = assign_membership(pair[0], pair[1], org_group_id, token)
+            response.raise_for_status()
+            with progress_lock:
+                result["created"] += 1
+        except Exception as e:
+            print("Creating membership of {0} in {1} - ERROR: {2}".format(pair[0], pair[1], e))
+            with progress_lock:
+                result["failures"].append(("create", pair[0], pair[1], e))
+
+    def delete(pair, membership_url):
+        try:
+            response = remove_membership(membership_url, token)
+            # Already removed by someone else is fine.
+            if response.status_code != 404:
+                response.raise_for_status()
+            with progress_lock:
+                result["removed"] += 1
+        except Exception as e:
+            print("Removing membership of {0} in {1} - ERROR: {2}".format(pair[0], pair[1], e))
+            with progress_lock:
+                result["failures"].append(("remove", pair[0], pair[1], e))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for pair in to_create:
+            executor.submit(create, pair)
+        for pair, membership_url in to_remove:
+            executor.submit(delete, pair, membership_url)
+
+    seconds = time.perf_counter() - started
+    changes = result["created"] + result["removed"] + len(result["failures"])
+
+    print("Syncing memberships - {0}: {1} created, {2} removed, {3} unchanged, {4} failed in {5:.1f}s "
+          "({6:.0f} changes/s)".format("ERROR" if result["failures"] else "OK", result["created"], result["removed"],
+                                       result["unchanged"], len(result["failures"]), seconds,
+                                       changes / seconds if seconds else 0.0))
+
+    return result
+
+
+def get_page(url, token, params=None, description="Fetching results"):
+
+    """
+    Fetch one page of a list endpoint.
+    :param url: URL of the list endpoint or of the page.
+    :param token: Authentication token.
+    :param params: Query parameters.
+    :param description: Description of the fetched objects printed with the page.
+    :return: Dict with "pagination" and "results"
+    """
+
+    response = HTTP_CLIENT.get(url, token=token, params=params)
+
+    if response.status_code == 200:
+        print("{0} - OK".format(description))
+    else:
+        print("{0} - ERROR".format(description))
+        response.raise_for_status()
+
+    return response.json()
+
+
+def iterate_pages(url, token, params=None, description="Fetching results", page_size=None, prefetch=False):
+
+    """
+    Lazily iterate over all pages of a list endpoint, following "pagination.next" of each page.
+    :param url: URL of the list endpoint.
+    :param token: Authentication token.
+    :param params: Query parameters (filters) of the first request, next pages already carry them in their URL.
+    :param description: Description of the fetched objects printed with each page.
+    :param page_size: Number of results per page, LIST_PAGE_SIZE by default.
+    :param prefetch: Download the next page in a background thread while the current one is being processed.
+    :return: Generator of pages, dicts with "pagination", "results" and the sideloaded objects
+    """
+
+    params = dict(params or {})
+    params["page_size"] = page_size or LIST_PAGE_SIZE
+
+    def fetch_page(page_url, page_params):
+        return get_page(page_url, token, page_params, description)
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    try:
+        page = fetch_page(url, params)
+
+        while True:
+
+            next_url = (page.get("pagination") or {}).get("next")
+            next_page = None
+
+            if executor is not None and next_url:
+                next_page = executor.submit(fetch_page, next_url, None)
+
+            yield page
+
+            if not next_url:
+                return
+
+            page = next_page.result() if next_page is not None else fetch_page(next_url, None)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iterate_paginated(url, token, params=None, description="Fetching results", page_size=None, prefetch=False):
+
+    """
+    Lazily iterate over all results of a list endpoint, see iterate_pages.
+    :return: Generator of results
+    """
+
+    pages = iterate_pages(url, token, params, description, page_size, prefetch)
+
+    try:
+        for page in pages:
+            for result in page["results"]:
+                yield result
+    finally:
+        pages.close()
+
+
+def get_objects_by_url(kind, urls, token, fields=None, description="Fetching results"):
+
+    """
+    Fetch many objects of one kind with id-list requests of the list endpoint, one request per PAGE_SIZE objects
+    instead of one per object.
+    :param kind: Name of the list endpoint, e.g. "documents"
+    :param urls: URLs of the objects
+    :param token: Authentication token.
+    :param fields: Attributes of the objects to be returned, all when None. "url" is always among them.
+    :param description: Description of the fetched objects printed with each request.
+    :return: Dict of URL -> object, objects the API did not return are missing
+    """
+
+    urls = list(dict.fromkeys(url.rstrip("/") for url in urls))
+    objects = {}
+
+    for start in range(0, len(urls), PAGE_SIZE):
+
+        chunk = urls[start:start + PAGE_SIZE]
+        params = {"id": ",".join(url.split("/")[-1] for url in chunk), "page_size": len(chunk)}
+
+        if fields:
+            params["fields"] = ",".join(dict.fromkeys(("url",) + tuple(fields)))
+
+        # Only one page is read, if the API ignored the filter the missing objects are simply not found.
+        for obj in get_page("{0}/{1}".format(API_URL, kind), token, params, description)["results"]:
+            if obj.get("url", "").rstrip("/") in chunk:
+                objects[obj["url"].rstrip("/")] = obj
+
+    return objects
+
+
+def get_all_organizations(token, page_size=None):
+
+    """
+    Getting all organizations in organization group - organization group admin can list all the available organizations.
+    :param token: Authentication token to the primary organization.
+    :param page_size: Number of organizations fetched per request.
+    :return: List of results
+    """
+
+    return list(iterate_paginated("{0}/organizations".format(API_URL), token,
+                                  description="Fetching organizations", page_size=page_size))
+
+
+def get_template_id(organization_dict):
+
+    """
+    Get the template name of the organization, the "id" of its metadata.
+    :param organization_dict: Dict representing the organization
+    :return: str, None for organizations which are not templates
+    """
+
+    return (organization_dict.get("metadata") or {}).get("id")
+
+
+def get_master_data_organization(organizations_list, template_id=TEMPLATE_ID):
+
+    """
+    We will be performing a deep-copy of one template organization.
+    We have marked up this organization with ID "master_data_organization" in the organization metadata
+    :param organizations_list: Iterable of organizations
+    :param template_id: Metadata ID of the template organization.
+    :return: dict representing the selected organization
+    """
+
+    for org in organizations_list:
+        if get_template_id(org) == template_id:
+            return org
+
+    return None
+
+
+class OrganizationIndex(object):
+
+    """
+    Local index of the template organizations by their metadata ID, so that finding a template takes one
+    conditional request instead of listing all organizations of the group. Entries keep the ETag and
+    Last-Modified of the organization, an unchanged organization is answered by 304 without a body.
+    """
+
+    def __init__(self, path):
+
+        """
+        :param path: JSON file of the index, created when it does not exist.
+        """
+
+        self.path = path
+        self.entries = {}
+
+        if os.path.exists(path):
+            with open(path) as index_file:
+                stored = json.load(index_file)
+            if stored.get("version") == ORGANIZATION_INDEX_VERSION and stored.get("api_url") == API_URL:
+                self.entries = stored["organizations"]
+
+    def get(self, template_id):
+        return self.entries.get(template_id)
+
+    def update(self, organization_dict, etag=None, last_modified=None):
+        self.entries[get_template_id(organization_dict)] = {"url": organization_dict["url"],
+                                                            "etag": etag,
+                                                            "last_modified": last_modified,
+                                                            "organization": organization_dict}
+
+    def remove(self, template_id):
+        self.entries.pop(template_id, None)
+
+    def save(self):
+        write_json_file(self.path, {"version": ORGANIZATION_INDEX_VERSION,
+                                    "api_url": API_URL,
+                                    "organizations": self.entries})
+
+
+def refresh_indexed_organization(entry, template_id, token):
+
+    """
+    Check an indexed template organization with a conditional request.
+    :param entry: Entry of the OrganizationIndex
+    :param template_id: Metadata ID the organization should still have.
+    :param token: Authentication token
+    :return: Tuple (dict representing the organization, response), the organization is None when it is no longer
+    the template
+    """
+
+    headers = {}
+
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = HTTP_CLIENT.get(entry["url"], token=token, headers=headers)
+
+    if response.status_code == 304:
+        return entry["organization"], response
+
+    if response.status_code == 200 and get_template_id(response.json()) == template_id:
+        return response.json(), response
+
+    return None, response
+
+
+def find_template_organization(token, template_id=TEMPLATE_ID, index=None):
+
+    """
+    Find the template organization. With an index, the indexed organization is only checked for changes;
+    when it is missing from the index or no longer the template, all organizations are listed once and every
+    template among them is indexed. Without an index the listing stops at the first match.
+    :param token: Authentication token to the primary organization.
+    :param template_id: Metadata ID of the template organization.
+    :param index: OrganizationIndex, no index is used when None.
+    :return: dict representing the template organization, None when there is no such organization
+    """
+
+    if index is not None and index.get(template_id) is not None:
+
+        organization, response = refresh_indexed_organization(index.get(template_id), template_id, token)
+
+        if organization is not None:
+            if response.status_code == 200:
+                index.update(organization, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                index.save()
+            print("Finding template organization '{0}' in the index - OK".format(template_id))
+            return organization
+
+        index.remove(template_id)
+
+    organizations = iterate_paginated("{0}/organizations".format(API_URL), token,
+                                      description="Fetching organizations")
+    template = None
+
+    try:
+        for organization in organizations:
+
+            if index is not None and get_template_id(organization) is not None:
+                index.update(organization)
+
+            if get_template_id(organization) == template_id:
+                template = organization
+                if index is None:
+                    break
+    finally:
+        organizations.close()
+
+    if index is not None:
+        index.save()
+
+    if template is not None:
+        print("Finding template organization '{0}' - OK".format(template_id))
+    else:
+        print("Finding template organization '{0}' - ERROR".format(template_id))
+
+    return template
+
+
+def get_all_workspaces(organization_dict, token, page_size=None):
+
+    """
+    Getting all workspaces of a specific organization.
+    :param organization_dict: Dict representing the selected organization.
+    :param token: Auth token to the selected organization.
+    :param page_size: Number of objects fetched per request.
+    :return: List of workspaces
+    """
+
+    return list(iterate_paginated("{0}/workspaces".format(API_URL), token, params={"organization": organization_dict["id"]},
+                                  description="Fetched workspaces", page_size=page_size))
+
+
+def get_all_queues(organization_dict, token, page_size=None):
+
+    """
+    Getting all queues of a specific organization.
+    :param organization_dict: Dict representing the selected organization.
+    :param token: Auth token to the selected organization.
+    :param page_size: Number of objects fetched per request.
+    :return: List of queues
+    """
+
+    return list(iterate_paginated("{0}/queues".format(API_URL), token, params={"organization": organization_dict["id"]},
+                                  description="Fetching queues", page_size=page_size))
+
+
+def get_schema(schema, token):
+
+    """
+    Getting schema.
+    :param schema: The url of the schema.
+    :param token: Authentication token.
+    :return:
+    """
+
+    response = HTTP_CLIENT.get(schema, token=token)
+
+    if response.status_code == 200:
+        print("Fetching schema - OK")
+    else:
+        print("Fetching schema - ERROR")
+        response.raise_for_status()
+
+    return response.json()
+
+
+def get_schemas(schema_urls, token):
+
+    """
+    Get many schemas with batched id-list requests, schemas missing from them are fetched one by one.
+    :param schema_urls: URLs of the schemas.
+    :param token: Authentication token.
+    :return: Dict of schema URL -> schema
+    """
+
+    schema_urls = list(dict.fromkeys(schema_urls))
+    found = get_objects_by_url("schemas", schema_urls, token, description="Fetching schemas")
+
+    return {url: found.get(url.rstrip("/")) or get_schema(url, token) for url in schema_urls}
+
+
+def get_document(document_url, token):
+
+    """
+    Get a specific document.
+    :param document_url: Url of the document
+    :param token: Authentication token
+    :return:
+    """
+
+    response = HTTP_CLIENT.get(document_url, token=token)
+
+    if response.status_code == 200:
+        print("Fetching document - OK")
+    else:
+        print("Fetching document - ERROR")
+        response.raise_for_status()
+
+    return response.json()
+
+
+def get_original_document(document, token, spool_threshold=None):
+
+    """
+    Download original of the document from Rossum's API.
+    The original is streamed in chunks into a spooled temporary file. It stays in memory only up to spool_threshold
+    bytes and is moved to disk above it, so large scanned originals do not blow up memory. The caller should close it.
+    :param document: Dict representing the document/
+    :param token: Authentication token
+    :param spool_threshold: Size in bytes above which the original is kept on disk, SPOOL_THRESHOLD by default.
+    :return: File object with the content of the original document, positioned at its start
+    """
+
+    if spool_threshold is None:
+        spool_threshold = SPOOL_THRESHOLD
+
+    original_file = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+
+    with HTTP_CLIENT.get("{0}/original/{1}".format(API_URL, document["s3_name"]), token=token,
+                         stream=True) as response:
+
+        if response.status_code == 200:
+            print("Getting original document - OK")
+        else:
+            print("Getting original document - ERROR")
+            original_file.close()
+            response.raise_for_status()
+
+        for chunk in response.iter_content(chunk_size=TRANSFER_CHUNK_SIZE):
+            original_file.write(chunk)
+
+    original_file.seek(0)
+
+    return original_file
+
+
+def get_all_extensions(organization_dict, token, page_size=None):
+
+    """
+    Get all extensions from a specific organization.
+    :param organization_dict: Dict representing the organization
+    :param token: Authentication token
+    :param page_size: Number of objects fetched per request.
+    :return: List of extensions
+    """
+
+    return list(iterate_paginated("{0}/hooks".format(API_URL), token, params={"organization": organization_dict["id"]},
+                                  description="Fetching extensions", page_size=page_size))
+
+
+def get_all_annotations(organization_dict, token, page_size=None, filters=None):
+
+    """
+    Get all annotations from a specific organization
+    :param organization_dict: Dict representing the organization
+    :param token: Authentication token
+    :param page_size: Number of objects fetched per request.
+    :param filters: Additional query filters of the annotations endpoint, e.g. {"status": "confirmed"}
+    :return: List of annotations
+    """
+
+    params = dict(filters or {}, organization=organization_dict["id"])
+
+    return list(iterate_paginated("{0}/annotations".format(API_URL), token, params=params,
+                                  description="Fetching annotations", page_size=page_size))
+
+
+def reduce_annotation(annotation, document=None):
+
+    """
+    Keep only the ANNOTATION_FIELDS of the annotation, and the DOCUMENT_FIELDS of its document when it is known.
+    :param annotation: Dict representing the annotation
+    :param document: Dict representing the document of the annotation, None when not known
+    :return: Dict
+    """
+
+    reduced = {field: annotation.get(field) for field in ANNOTATION_FIELDS}
+
+    if document is not None:
+        reduced.update((field, document.get(field)) for field in DOCUMENT_FIELDS if field != "url")
+
+    return reduced
+
+
+def with_documents(annotations, token, documents=None):
+
+    """
+    Reduce annotations and attach the metadata of their documents, so the documents do not have to be fetched
+    one by one. The documents which were not sideloaded are fetched with batched id-list requests.
+    :param annotations: List of annotations
+    :param token: Authentication token
+    :param documents: List of the sideloaded documents, None when the API did not sideload them.
+    :return: List of annotations reduced by reduce_annotation
+    """
+
+    if documents is not None:
+        documents = {document["url"].rstrip("/"): document for document in documents}
+    else:
+        documents = get_objects_by_url("documents", [annotation["document"] for annotation in annotations], token,
+                                       fields=DOCUMENT_FIELDS, description="Fetching documents")
+
+    return [reduce_annotation(annotation, documents.get((annotation.get("document") or "").rstrip("/")))
+            for annotation in annotations]
+
+
+def get_annotation_document(annotation, token):
+
+    """
+    Get the metadata of the document of an annotation, without a request when it was attached by with_documents.
+    :param annotation: Dict representing the annotation
+    :param token: Authentication token
+    :return: Dict representing the document
+    """
+
+    if annotation.get("s3_name") is not None:
+        return {"url": annotation["document"], "s3_name": annotation["s3_name"],
+                "original_file_name": annotation["original_file_name"]}
+
+    return get_document(annotation["document"], token)
+
+
+def iterate_annotations(organization_dict, token, page_size=None, filters=None):
+
+    """
+    Lazily list the annotations of a specific organization together with their documents, sideloaded by the API,
+    reduced to ANNOTATION_FIELDS and DOCUMENT_FIELDS. Only the page being consumed and the next one, downloaded
+    in the background meanwhile, are held in memory.
+    :param organization_dict: Dict representing the organization
+    :param token: Authentication token
+    :param page_size: Number of objects fetched per request.
+    :param filters: Additional query filters of the annotations endpoint, e.g. {"status": "confirmed"}
+    :return: Generator of annotations
+    """
+
+    params = dict(filters or {}, organization=organization_dict["id"], sideload="documents",
+                  fields=",".join(ANNOTATION_FIELDS))
+
+    pages = iterate_pages("{0}/annotations".format(API_URL), token, params=params,
+                          description="Fetching annotations", page_size=page_size, prefetch=True)
+
+    try:
+        for page in pages:
+            for annotation in with_documents(page["results"], token, page.get("documents")):
+                yield annotation
+    finally:
+        pages.close()
+
+
+def sample_queue_annotations(organization_dict, token, queue_id, filters, max_per_queue, seed=None):
+
+    """
+    Select at most max_per_queue annotations of one queue, listing as few of them as possible.
+    Without a seed the most recently arrived annotations are taken. With a seed a uniform random sample is taken,
+    deterministic for the same seed and data: the total count is read first and only pages containing
+    the drawn positions are fetched.
+    :param organization_dict: Dict representing the organization
+    :param token: Authentication token
+    :param queue_id: ID of the queue
+    :param filters: Query filters of the annotations endpoint.
+    :param max_per_queue: Maximum number of annotations selected.
+    :param seed: Seed of the random sample.
+    :return: List of annotations reduced to ANNOTATION_FIELDS
+    """
+
+    url = "{0}/annotations".format(API_URL)
+    params = dict(filters, organization=organization_dict["id"], queue=queue_id)
+
+    if seed is None:
+        params["ordering"] = "-arrived_at"
+        annotations = iterate_paginated(url, token, params=params, description="Fetching annotations",
+                                        page_size=min(max_per_queue, LIST_PAGE_SIZE))
+        selected = [reduce_annotation(annotation) for annotation in itertools.islice(annotations, max_per_queue)]
+        annotations.close()
+        return selected
+
+    params["ordering"] = "id"
+    total = get_page(url, token, dict(params, page_size=1), "Counting annotations")["pagination"]["total"]
+
+    if total <= max_per_queue:
+        return [reduce_annotation(annotation)
+                for annotation in iterate_paginated(url, token, params=params, description="Fetching annotations")]
+
+    positions = random.Random("{0}:{1}".format(seed, queue_id)).sample(range(total), max_per_queue)
+    positions_by_page = {}
+
+    for position in positions:
+        positions_by_page.setdefault(position // PAGE_SIZE + 1, []).append(position % PAGE_SIZE)
+
+    selected = []
+
+    for page_number, indexes in sorted(positions_by_page.items()):
+        results = get_page(url, token, dict(params, page=page_number, page_size=PAGE_SIZE),
+                           "Fetching annotations")["results"]
+        selected.extend(reduce_annotation(results[index]) for index in sorted(indexes) if index < len(results))
+
+    return selected
+
+
+def select_annotations(organization_dict, token, status=None, queues=None, arrived_after=None, arrived_before=None,
+                       max_per_queue=None, seed=None):
+
+    """
+    Select the annotations whose documents should be copied. All the filters are applied by the API,
+    so only the selected annotations are listed and transferred.
+    :param organization_dict: Dict representing the organization
+    :param token: Authentication token
+    :param status: List of annotation statuses to be copied, e.g. ["to_review", "confirmed"]
+    :param queues: List of IDs of the queues whose annotations are copied, all queues when None.
+    :param arrived_after: Copy only annotations arrived after this date (ISO 8601).
+    :param arrived_before: Copy only annotations arrived before this date (ISO 8601).
+    :param max_per_queue: Maximum number of annotations copied from each queue, unlimited when None.
+    :param seed: Seed of a random sample of max_per_queue annotations, the most recent ones are taken without it.
+    :return: Iterable of annotations reduced to ANNOTATION_FIELDS, listed lazily unless max_per_queue is given
+    """
+
+    filters = {}
+
+    if status:
+        filters["status"] = ",".join(status)
+    if arrived_after:
+        filters["arrived_at_after"] = arrived_after
+    if arrived_before:
+        filters["arrived_at_before"] = arrived_before
+
+    if max_per_queue is None:
+        if queues:
+            filters["queue"] = ",".join(str(queue_id) for queue_id in queues)
+        return iterate_annotations(organization_dict, token, filters=filters)
+
+    if not queues:
+        queues = [queue["id"] for queue in get_all_queues(organization_dict, token)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        samples = executor.map(lambda queue_id: sample_queue_annotations(organization_dict, token, queue_id, filters,
+                                                                         max_per_queue, seed), queues)
+        return with_documents([annotation for sample in samples for annotation in sample], token)
+
+
+def create_schema(schema, token):
+
+    """
+    Create schema from template in selected organization defined by the authentication token.
+    :param schema: Dict representing the original schema
+    :param token: Auth token from the organization where the object should be created.
+    :return:
+    """
+
+    payload = {"name": schema["name"],
+               "content": schema["content"]
+               }
+
+    response = HTTP_CLIENT.post("{0}/schemas".format(API_URL), token=token, json=payload)
+
+    if response.status_code == 201:
+        print("Creating new schema - OK")
+    else:
+        print("Creating new schema - ERROR")
+        response.raise_for_status()
+
+    return response.json()
+
+
+def update_schema(schema_url, schema, token):
+
+    """
+    Update an already copied schema to the current state of the template schema.
+    :param schema_url: URL of the copied schema in the new organization.
+    :param schema: Dict representing the original schema
+    :param token: Auth token from the organization where the schema was created.
+    :return: URL of the updated schema
+    """
+
+    payload = {"name": schema["name"],
+               "content": schema["content"]
+               }
+
+    response = HTTP_CLIENT.patch(schema_url, token=token, json=payload)
+
+    if response.status_code == 200:
+        print("Updating schema - OK")
+    else:
+        print("Updating schema - ERROR")
+        response.raise_for_status()
+
+    return response.json()["url"]
+
+
+def payload_hash(payload):
+
+    """
+    Stable hash of JSON serializable data, used to detect changes of the copied objects.
+    :param payload: JSON serializable data
+    :return: Hex digest
+    """
+
+    content = json.dumps(payload, sort_keys=True)
+
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def schema_content_hash(schema):
+
+    """
+    Hash of the copied part of the schema, equal for schemas that would be created the same way.
+    :param schema: Dict representing the schema
+    :return: Hex digest
+    """
+
+    return payload_hash({"name": schema["name"], "content": schema["content"]})
+
+
+def workspace_source_hash(workspace):
+    return payload_hash({"name": workspace["name"], "metadata": workspace["metadata"]})
+
+
+def queue_source_hash(queue):
+    return payload_hash({key: queue[key] for key in ("name", "metadata", "workspace", "schema")})
+
+
+def extension_source_hash(extension):
+    return payload_hash({key: value for key, value in extension.items() if key not in EXTENSION_VOLATILE_FIELDS})
+
+
+class SchemaCache(object):
+
+    """
+    Schemas already created in one new organization. Each distinct source schema is fetched and created only once
+    and the new schema is reused by every queue referencing it. Safe to share between threads, a concurrent request
+    for a schema which is being created waits for the first one.
+    Modes:
+        "url" - schemas are deduplicated by the source schema URL
+        "content" - additionally, different source schemas with the same name and content share one new schema
+        "off" - every call creates a new schema, as when each queue has its own copy
+    Source schemas are downloaded once, schemas which were already downloaded (e.g. in a template snapshot)
+    can be passed in and are not fetched at all.
+    """
+
+    MODES = ("url", "content", "off")
+
+    def __init__(self, mode="url", schemas=None):
+
+        if mode not in self.MODES:
+            raise ValueError("Unknown schema deduplication mode {0}".format(mode))
+
+        self.mode = mode
+        self.schemas = dict(schemas or {})
+        self._by_url = {}
+        self._by_content = {}
+        self._lock = threading.Lock()
+
+    def _memoize(self, store, key, function):
+
+        with self._lock:
+            future = store.get(key)
+            owner = future is None
+            if owner:
+                future = store[key] = Future()
+
+        if owner:
+            try:
+                future.set_result(function())
+            except Exception as e:
+                future.set_exception(e)
+
+        return future.result()
+
+    def load_schema(self, schema_url, master_org_auth_token):
+
+        """
+        Get the source schema, downloading it only the first time.
+        :param schema_url: URL of the source schema.
+        :param master_org_auth_token: Auth token to the original organization.
+        :return: Dict representing the source schema
+        """
+
+        if schema_url not in self.schemas:
+            self.schemas[schema_url] = get_schema(schema_url, master_org_auth_token)
+
+        return self.schemas[schema_url]
+
+    def get_new_schema_url(self, schema_url, token, master_org_auth_token):
+
+        """
+        Get the URL of the new schema copied from the source schema, creating it if needed.
+        :param schema_url: URL of the source schema.
+        :param token: Auth token to the new organization.
+        :param master_org_auth_token: Auth token to the original organization.
+        :return: URL of the new schema
+        """
+
+        def copy_schema():
+
+            schema = self.load_schema(schema_url, master_org_auth_token)
+
+            if self.mode == "content":
+                return self._memoize(self._by_content, schema_content_hash(schema),
+                                     lambda: create_schema(schema, token)["url"])
+
+            return create_schema(schema, token)["url"]
+
+        if self.mode == "off":
+            return copy_schema()
+
+        return self._memoize(self._by_url, schema_url, copy_schema)
+
+
+def create_organization(create_key, org_name, user_fullname, user_email, user_password):
+
+    """
+    Create a fresh new organization
+    :param create_key: Create key of the given organization group provided by Rossum team
+    :param org_name: Name of the new organization
+    :param user_fullname: Full name of the admin to be created in the new organization
+    :param user_email: Full email of the admin to be created in the new organization
+    :param user_password: Password of the new admin
+    :return: Dict representing the new organization
+    """
+
+    payload = {
+        "template_name": "Empty Organization Template",
+        "organization_name": org_name,
+        "user_fullname": user_fullname,
+        "user_email": user_email,
+        "user_password": user_password,
+        "user_ui_settings": json.dumps({"locale": "en"}),
+        "create_key": create_key
+        }
+
+    response = HTTP_CLIENT.post("{0}/organizations/create".format(API_URL), data=payload)
+
+    if response.status_code == 201:
+        print("Creating new organization - OK")
+    else:
+        print("Creating new organization - ERROR")
+        response.raise_for_status()
+
+    return response.json()["organization"]
+
+
+def get_or_create_organization(create_key, org_name, user_fullname, user_email, user_password, journal=None,
+                               resume=False):
+
+    """
+    Create a fresh new organization, or with resume return the one recorded in the journal by a previous run.
+    :param create_key: Create key of the given organization group provided by Rossum team
+    :param org_name: Name of the new organization
+    :param user_fullname: Full name of the admin to be created in the new organization
+    :param user_email: Full email of the admin to be created in the new organization
+    :param user_password: Password of the new admin
+    :param journal: CopyJournal where the organization is recorded.
+    :param resume: Allow continuing with an organization already recorded in the journal.
+    :return: Dict representing the organization
+    """
+
+    organization = journal.get_organization() if journal is not None else None
+
+    if organization is not None:
+        if not resume:
+            raise ValueError("Organization '{0}' is already recorded in journal '{1}', "
+                             "use --resume or --sync to continue it".format(org_name, journal.path))
+        print("Resuming organization '{0}' - OK".format(org_name))
+        return organization
+
+    organization = create_organization(create_key, org_name, user_fullname, user_email, user_password)
+
+    if journal is not None:
+        journal.record_organization(organization)
+
+    return organization
+
+
+def create_workspace(organization_url, token, workspace):
+
+    """
+    Create a copy of one workspace in the new organization
+    :param organization_url: The new organization where the workspace will be created.
+    :param token: Auth token to the new organization
+    :param workspace: Dict representing the original workspace.
+    :return: URL of the new workspace
+    """
+
+    payload = {"name": workspace["name"],
+               "organization": organization_url,
+               "metadata": json.dumps(workspace["metadata"])}
+
+    response = HTTP_CLIENT.post("{0}/workspaces".format(API_URL), token=token, data=payload)
+
+    if response.status_code == 201:
+        print("Creating workspace '{0}' - OK".format(workspace["name"]))
+    else:
+        print("Creating workspace '{0}' - ERROR".format(workspace["name"]))
+        response.raise_for_status()
+
+    return response.json()["url"]
+
+
+def update_workspace(workspace_url, token, workspace):
+
+    """
+    Update an already copied workspace to the current state of the template workspace.
+    :param workspace_url: URL of the copied workspace in the new organization.
+    :param token: Auth token to the new organization
+    :param workspace: Dict representing the original workspace.
+    :return: URL of the updated workspace
+    """
+
+    payload = {"name": workspace["name"],
+               "metadata": json.dumps(workspace["metadata"])}
+
+    response = HTTP_CLIENT.patch(workspace_url, token=token, data=payload)
+
+    if response.status_code == 200:
+        print("Updating workspace '{0}' - OK".format(workspace["name"]))
+    else:
+        print("Updating workspace '{0}' - ERROR".format(workspace["name"]))
+        response.raise_for_status()
+
+    return response.json()["url"]
+
+
+def create_workspaces(organization_url, token, workspaces_list):
+
+    """
+    Create new workspaces in the new organization
+    :param organization_url: The new organization where workspaces will be created.
+    :param token: Auth token to the new organization
+    :param workspaces_list: List of original workspaces to be copied.
+    :return: Mapping of the original workspaces from master organization to new workspaces URL in the new org.
+    """
+
+    new_workspaces_mapping = {}
+
+    for workspace in workspaces_list:
+        new_workspaces_mapping[workspace["url"]] = create_workspace(organization_url, token, workspace)
+
+    return new_workspaces_mapping
+
+
+def create_queue(queue, new_workspace_url, new_schema_url, token):
+
+    """
+    Create a copy of one queue in the new organization
+    :param queue: Dict representing the original queue.
+    :param new_workspace_url: URL of the workspace in the new org where the queue belongs.
+    :param new_schema_url: URL of the schema in the new org used by the queue.
+    :param token: Auth token to the new organization
+    :return: URL of the new queue
+    """
+
+    payload = {"name": queue["name"],
+               "workspace": new_workspace_url,
+               "metadata": queue["metadata"],
+               "schema": new_schema_url
+               }
+
+    response = HTTP_CLIENT.post("{0}/queues".format(API_URL), token=token, json=payload)
+
+    if response.status_code == 201:
+        print("Creating queue '{0}' - OK".format(queue["name"]))
+    else:
+        print("Creating queue '{0}' - ERROR".format(queue["name"]))
+        response.raise_for_status()
+
+    return response.json()["url"]
+
+
+def update_queue(queue_url, queue, new_workspace_url, new_schema_url, token):
+
+    """
+    Update an already copied queue to the current state of the template queue.
+    :param queue_url: URL of the copied queue in the new organization.
+    :param queue: Dict representing the original queue.
+    :param new_workspace_url: URL of the workspace in the new org where the queue belongs.
+    :param new_schema_url: URL of the schema in the new org used by the queue.
+    :param token: Auth token to the new organization
+    :return: URL of the updated queue
+    """
+
+    payload = {"name": queue["name"],
+               "workspace": new_workspace_url,
+               "metadata": queue["metadata"],
+               "schema": new_schema_url
+               }
+
+    response = HTTP_CLIENT.patch(queue_url, token=token, json=payload)
+
+    if response.status_code == 200:
+        print("Updating queue '{0}' - OK".format(queue["name"]))
+    else:
+        print("Updating queue '{0}' - ERROR".format(queue["name"]))
+        response.raise_for_status()
+
+    return response.json()["url"]
+
+
+def create_queues(new_workspaces_mapping, token, master_org_auth_token, queues_list, schema_deduplication="url"):
+
+    """
+    :param new_workspaces_mapping: Mapping of the original workspaces from master organization
+    to new workspaces in the new org.
+    :param token: Auth token to the new organization
+    :param master_org_auth_token: Auth token to the original organization where we copy objects from.
+    :param queues_list: List of original queues to be copied.
+    :param schema_deduplication: Mode of the SchemaCache, "off" creates a separate schema for each queue.
+    :return: Mapping of the original queues from master organization to new queues URL in the new org.
+    """
+
+    new_queues_mapping = {}
+    schema_cache = SchemaCache(schema_deduplication)
+
+    for queue in queues_list:
+
+        new_schema_url = schema_cache.get_new_schema_url(queue["schema"], token, master_org_auth_token)
+
+        new_queues_mapping[queue["url"]] = create_queue(queue, new_workspaces_mapping[queue["workspace"]],
+                                                        new_schema_url, token)
+
+    return new_queues_mapping
+
+
+def run_pipeline(items, stages, queue_size=8):
+
+    """
+    Run items through a chain of stages where every stage has its own pool of worker threads.
+    Stages are connected by bounded queues, so a fast stage blocks instead of piling its results up in memory.
+    An item that raises in any stage is reported and dropped, the rest of the items continue.
+    An exception raised by the items iterable itself is raised again once all the stages have stopped.
+    :param items: Iterable of input items.
+    :param stages: List of (name, function, workers) tuples. Each function gets the output of the previous stage.
+    :param queue_size: Maximum number of items waiting in front of each stage.
+    :return: List of (stage name, item, exception) tuples for the failed items
+    """
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    failures = []
+    failures_lock = threading.Lock()
+
+    def worker(index):
+
+        name, function, _ = stages[index]
+
+        while True:
+
+            item = queues[index].get()
+
+            if item is _PIPELINE_DONE:
+                return
+
+            try:
+                with INSTRUMENTATION.span(name):
+                    result = function(item)
+            except Exception as e:
+                print("Pipeline stage '{0}' - ERROR: {1}".format(name, e))
+                with failures_lock:
+                    failures.append((name, item, e))
+                continue
+
+            if index + 1 < len(stages):
+                queues[index + 1].put(result)
+
+    threads = []
+
+    for index, (_, _, workers) in enumerate(stages):
+        stage_threads = [threading.Thread(target=worker, args=(index,), daemon=True) for _ in range(workers)]
+        for thread in stage_threads:
+            thread.start()
+        threads.append(stage_threads)
+
+    try:
+        for item in items:
+            queues[0].put(item)
+    finally:
+        # Shut the stages down in order, every stage drains its queue before the next one gets its stop markers.
+        # This runs even when iterating the items raised, so no stage is left working after the call returns.
+        for index, stage_threads in enumerate(threads):
+            for _ in stage_threads:
+                queues[index].put(_PIPELINE_DONE)
+            for thread in stage_threads:
+                thread.join()
+
+    return failures
+
+
+def create_annotations(new_queues_mapping, original_annotations, token, master_org_auth_token,
+                       metadata_workers=4, download_workers=8, upload_workers=8, max_pending=8, journal=None,
+                       blob_cache=None):
+
+    """
+    Copy documents of the original annotations to the new organization. Fetching the document metadata,
+    downloading the originals and uploading them run as separate concurrent stages. At most max_pending
+    items wait in front of each stage, which bounds the number of downloaded originals held in memory.
+    :param new_queues_mapping: Mapping of the original queues from master organization to new queues URL in the new org.
+    :param original_annotations: Iterable of original annotations to be copied, consumed as the pipeline has room.
+    :param token: Auth token to the new organization
+    :param master_org_auth_token: Auth token to the original organization where we copy objects from.
+    :param metadata_workers: Number of threads fetching the document metadata.
+    :param download_workers: Number of threads downloading the originals.
+    :param upload_workers: Number of threads uploading the documents to the new organization.
+    :param max_pending: Maximum number of items waiting between two stages.
+    :param journal: CopyJournal, annotations whose documents were already uploaded are skipped.
+    :param blob_cache: BlobCache the originals are taken from, so identical originals are downloaded once.
+    :return: List of (stage name, item, exception) tuples for the documents that failed to be copied
+    """
+
+    def fetch_metadata(annotation):
+        return annotation, get_annotation_document(annotation, master_org_auth_token)
+
+    def download_original(item):
+        annotation, document = item
+        if blob_cache is not None:
+            return annotation, document, blob_cache.open_original(document, master_org_auth_token)[1]
+        return annotation, document, get_original_document(document, master_org_auth_token)
+
+    def upload(item):
+        annotation, document, original_file = item
+        with original_file:
+            target_queue = new_queues_mapping[annotation["queue"]].split("/")[-1]
+            result = upload_document(document["original_file_name"], original_file, target_queue, token)
+        if journal is not None:
+            journal.record_upload(annotation["url"], uploaded_annotation_url(result))
+        return result
+
+    stages = [("fetch document", fetch_metadata, metadata_workers),
+              ("download original", download_original, download_workers),
+              ("upload document", upload, upload_workers)]
+
+    pending_annotations = (annotation for annotation in original_annotations
+                           if journal is None or not journal.is_uploaded(annotation["url"]))
+
+    failures = run_pipeline(pending_annotations, stages, queue_size=max_pending)
+
+    if failures:
+        print("Copying documents - {0} ERROR(S)".format(len(failures)))
+
+    return failures
+
+
+def create_extension(new_queues_mapping, extension, token, user_url):
+
+    """
+    Create a copy of one extension in the new organization
+    :param new_queues_mapping: The extension should be mapped to the same queues as in the template organization.
+    :param extension: Dict representing the original extension.
+    :param token: Auth token to the new organization.
+    :param user_url: User ID which will be assigned as a token owner for accessing the Rossum's API from extension.
+    :return: URL of the new extension
+    """
+
+    payload = extension.copy()
+    payload["queues"] = [new_queues_mapping[x] for x in extension["queues"]]
+    payload["token_owner"] = user_url
+
+    response = HTTP_CLIENT.post("{0}/hooks".format(API_URL), token=token, json=payload)
+
+    if response.status_code == 201:
+        print("Creating extension '{0}' - OK".format(extension.get("name")))
+    else:
+        print("Creating extension '{0}' - ERROR".format(extension.get("name")))
+        response.raise_for_status()
+
+    return response.json()["url"]
+
+
+def update_extension(extension_url, new_queues_mapping, extension, token, user_url):
+
+    """
+    Update an already copied extension to the current state of the template extension.
+    :param extension_url: URL of the copied extension in the new organization.
+    :param new_queues_mapping: The extension should be mapped to the same queues as in the template organization.
+    :param extension: Dict representing the original extension.
+    :param token: Auth token to the new organization.
+    :param user_url: User ID which will be assigned as a token owner for accessing the Rossum's API from extension.
+    :return: URL of the updated extension
+    """
+
+    payload = {key: value for key, value in extension.items() if key not in ("id", "url", "organization")}
+    payload["queues"] = [new_queues_mapping[x] for x in extension["queues"]]
+    payload["token_owner"] = user_url
+
+    response = HTTP_CLIENT.patch(extension_url, token=token, json=payload)
+
+    if response.status_code == 200:
+        print("Updating extension '{0}' - OK".format(extension.get("name")))
+    else:
+        print("Updating extension '{0}' - ERROR".format(extension.get("name")))
+        response.raise_for_status()
+
+    return response.json()["url"]
+
+
+def create_extensions(new_queues_mapping, original_extensions, token, user_url):
+
+    """
+    Create new extensions from a list of original extensions
+    :param new_queues_mapping: The extension should be mapped to the same queues as in the template organization.
+    :param original_extensions: List of original extensions.
+    :param token: Auth token to the new organization.
+    :param user_url: User ID which will be assigned as a token owner for accessing the Rossum's API from extension.
+    :return: List of URLs of the new extensions
+    """
+
+    new_extensions = []
+
+    for extension in original_extensions:
+        new_extensions.append(create_extension(new_queues_mapping, extension, token, user_url))
+
+    return new_extensions
+
+
+class CopyJournal(object):
+
+    """
+    Durable record of one target organization copy, stored in SQLite. Every created object is recorded with
+    the source -> target URL mapping and the hash of the source it was created from, and every uploaded
+    document with its source annotation. A rerun reads the journal to skip finished work (resume) and to update
+    only the objects whose source changed since the last run (incremental sync).
+    Several journals (e.g. one per organization in batch mode) can share one database file.
+    """
+
+    def __init__(self, path, target):
+
+        """
+        :param path: Path to the SQLite database, created if it does not exist.
+        :param target: Name of the target organization the journal is kept for.
+        """
+
+        self.path = path
+        self.target = target
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS organizations "
+                                     "(target TEXT PRIMARY KEY, organization TEXT NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS mappings "
+                                     "(target TEXT, kind TEXT, source_url TEXT, target_url TEXT NOT NULL, "
+                                     "source_hash TEXT, PRIMARY KEY (target, kind, source_url))")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS uploads "
+                                     "(target TEXT, source_key TEXT, target_url TEXT, PRIMARY KEY (target, source_key))")
+
+    def _execute(self, statement, parameters):
+
+        with self._lock, self._connection:
+            return self._connection.execute(statement, parameters).fetchall()
+
+    @staticmethod
+    def get_targets(path):
+
+        """
+        :param path: Path to the SQLite database of the journals.
+        :return: List of the target organization names with a journal in the database
+        """
+
+        connection = sqlite3.connect(path, timeout=60)
+
+        try:
+            return [row[0] for row in connection.execute("SELECT target FROM organizations ORDER BY target")]
+        finally:
+            connection.close()
+
+    def get_organization(self):
+
+        """
+        :return: Dict representing the target organization if it was already created, None otherwise
+        """
+
+        rows = self._execute("SELECT organization FROM organizations WHERE target = ?", (self.target,))
+
+        return json.loads(rows[0][0]) if rows else None
+
+    def record_organization(self, organization_dict):
+        self._execute("INSERT OR REPLACE INTO organizations VALUES (?, ?)",
+                      (self.target, json.dumps(organization_dict)))
+
+    def get_mapping(self, kind, source_url):
+
+        """
+        :param kind: Kind of the object (workspace, schema, queue, extension)
+        :param source_url: URL of the object in the template organization.
+        :return: Tuple (target URL, source hash) or None if the object was not copied yet
+        """
+
+        rows = self._execute("SELECT target_url, source_hash FROM mappings "
+                             "WHERE target = ? AND kind = ? AND source_url = ?", (self.target, kind, source_url))
+
+        return rows[0] if rows else None
+
+    def get_mapping_records(self, kind):
+
+        """
+        :param kind: Kind of the objects (workspace, schema, queue, extension)
+        :return: Dict of source URL -> (target URL, source hash)
+        """
+
+        rows = self._execute("SELECT source_url, target_url, source_hash FROM mappings WHERE target = ? AND kind = ?",
+                             (self.target, kind))
+
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def get_mappings(self, kind):
+
+        """
+        :param kind: Kind of the objects (workspace, schema, queue, extension)
+        :return: Dict of source URL -> target URL
+        """
+
+        rows = self._execute("SELECT source_url, target_url FROM mappings WHERE target = ? AND kind = ?",
+                             (self.target, kind))
+
+        return dict(rows)
+
+    def record_mapping(self, kind, source_url, target_url, source_hash):
+        self._execute("INSERT OR REPLACE INTO mappings VALUES (?, ?, ?, ?, ?)",
+                      (self.target, kind, source_url, target_url, source_hash))
+
+    def get_uploaded(self):
+
+        """
+        :return: Set of source keys (annotation URLs) of the documents already uploaded
+        """
+
+        rows = self._execute("SELECT source_key FROM uploads WHERE target = ?", (self.target,))
+
+        return set(row[0] for row in rows)
+
+    def is_uploaded(self, source_key):
+        return bool(self._execute("SELECT 1 FROM uploads WHERE target = ? AND source_key = ?",
+                                  (self.target, source_key)))
+
+    def record_upload(self, source_key, target_url):
+        self._execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?)", (self.target, source_key, target_url))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def run_journaled(journal, kind, source_url, source_hash, create, update=None):
+
+    """
+    Create an object unless the journal says it was already copied. An already copied object whose source
+    changed since it was recorded is updated when the update function is given, otherwise it is left as it is.
+    :param journal: CopyJournal or None, in which case the object is always created.
+    :param kind: Kind of the object (workspace, schema, queue, extension)
+    :param source_url: URL of the object in the template organization.
+    :param source_hash: Hash of the source object, see payload_hash
+    :param create: Function creating the object and returning its new URL.
+    :param update: Function taking the URL of the copied object, updating it and returning its URL.
+    :return: URL of the object in the new organization
+    """
+
+    if journal is None:
+        return create()
+
+    known = journal.get_mapping(kind, source_url)
+
+    if known is None:
+        target_url = create()
+    elif known[1] == source_hash or update is None:
+        return known[0]
+    else:
+        target_url = update(known[0])
+
+    journal.record_mapping(kind, source_url, target_url, source_hash)
+
+    return target_url
+
+
+def run_dependency_graph(tasks, max_workers=8):
+
+    """
+    Run every task as soon as all of its dependencies are finished, at most max_workers tasks at once.
+    A task that fails (or depends on an unknown task) is reported and none of the tasks depending on it are run.
+    :param tasks: Dict of task key -> (list of dependency keys, function). The function is called with a dict
+    of dependency key -> dependency result.
+    :param max_workers: Maximum number of tasks running concurrently.
+    :return: Tuple (dict of task key -> result, dict of task key -> exception) for the failed or skipped tasks
+    """
+
+    results = {}
+    failures = {}
+    remaining = {}
+    dependents = {}
+
+    for key, (dependencies, _) in tasks.items():
+        remaining[key] = len(set(dependencies))
+        for dependency in set(dependencies):
+            dependents.setdefault(dependency, []).append(key)
+
+    def fail(key, error):
+        # Everything downstream of a failed task is skipped
+        stack = [(key, error)]
+        while stack:
+            failed_key, failed_error = stack.pop()
+            if failed_key in failures:
+                continue
+            failures[failed_key] = failed_error
+            for dependent in dependents.get(failed_key, []):
+                stack.append((dependent, RuntimeError("dependency {0} failed".format(failed_key))))
+
+    for key, (dependencies, _) in tasks.items():
+        for dependency in dependencies:
+            if dependency not in tasks:
+                fail(key, KeyError("unknown dependency {0}".format(dependency)))
+
+    def run(key):
+        dependencies, function = tasks[key]
+        with INSTRUMENTATION.span("copy {0}".format(key[0] if isinstance(key, tuple) else key)):
+            return function({dependency: results[dependency] for dependency in dependencies})
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        running = {executor.submit(run, key): key
+                   for key, count in remaining.items() if count == 0 and key not in failures}
+
+        while running:
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+
+                key = running.pop(future)
+
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    print("Task {0} - ERROR: {1}".format(key, e))
+                    fail(key, e)
+                    continue
+
+                for dependent in dependents.get(key, []):
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0 and dependent not in failures:
+                        running[executor.submit(run, dependent)] = dependent
+
+    return results, failures
+
+
+def copy_organization_setup(organization_url, token, master_org_auth_token, workspaces_list, queues_list,
+                            extensions_list, user_url, max_workers=8, schema_deduplication="url", schemas=None,
+                            journal=None, sync=False):
+
+    """
+    Create workspaces, schemas, queues and extensions in the new organization as one dependency graph.
+    A queue waits only for its own workspace and schema and an extension only for its own queues,
+    independent objects are created concurrently.
+    :param organization_url: The new organization where the objects will be created.
+    :param token: Auth token to the new organization
+    :param master_org_auth_token: Auth token to the original organization where we copy objects from.
+    :param workspaces_list: List of original workspaces to be copied.
+    :param queues_list: List of original queues to be copied.
+    :param extensions_list: List of original extensions to be copied.
+    :param user_url: User ID which will be assigned as a token owner of the extensions.
+    :param max_workers: Maximum number of objects created concurrently.
+    :param schema_deduplication: Mode of the SchemaCache, "off" creates a separate schema for each queue.
+    :param schemas: Dict of already downloaded source schemas by URL, the rest is fetched with master_org_auth_token.
+    :param journal: CopyJournal, objects recorded in it are not created again.
+    :param sync: Update the recorded objects whose source changed since they were copied.
+    :return: Tuple (workspaces mapping, queues mapping, list of extension URLs, dict of failed tasks)
+    """
+
+    tasks = {}
+    schema_cache = SchemaCache(schema_deduplication, schemas=schemas)
+
+    def copy_workspace(workspace):
+        return run_journaled(journal, "workspace", workspace["url"], workspace_source_hash(workspace),
+                             lambda: create_workspace(organization_url, token, workspace),
+                             (lambda url: update_workspace(url, token, workspace)) if sync else None)
+
+    def copy_schema(schema_key, schema_url):
+        schema = schema_cache.load_schema(schema_url, master_org_auth_token)
+        return run_journaled(journal, "schema", schema_key, schema_content_hash(schema),
+                             lambda: schema_cache.get_new_schema_url(schema_url, token, master_org_auth_token),
+                             (lambda url: update_schema(url, schema, token)) if sync else None)
+
+    def copy_queue(queue, new_workspace_url, new_schema_url):
+        return run_journaled(journal, "queue", queue["url"], queue_source_hash(queue),
+                             lambda: create_queue(queue, new_workspace_url, new_schema_url, token),
+                             (lambda url: update_queue(url, queue, new_workspace_url, new_schema_url, token))
+                             if sync else None)
+
+    def copy_extension(extension, new_queues_mapping):
+        return run_journaled(journal, "extension", extension["url"], extension_source_hash(extension),
+                             lambda: create_extension(new_queues_mapping, extension, token, user_url),
+                             (lambda url: update_extension(url, new_queues_mapping, extension, token, user_url))
+                             if sync else None)
+
+    for workspace in workspaces_list:
+        tasks[("workspace", workspace["url"])] = ([], lambda _, workspace=workspace: copy_workspace(workspace))
+
+    for queue in queues_list:
+
+        schema_key = ("schema", queue["url"] if schema_deduplication == "off" else queue["schema"])
+        workspace_key = ("workspace", queue["workspace"])
+
+        tasks[schema_key] = (
+            [], lambda _, queue=queue, schema_key=schema_key: copy_schema(schema_key[1], queue["schema"]))
+
+        tasks[("queue", queue["url"])] = (
+            [workspace_key, schema_key],
+            lambda done, queue=queue, workspace_key=workspace_key, schema_key=schema_key:
+                copy_queue(queue, done[workspace_key], done[schema_key]))
+
+    for extension in extensions_list:
+        tasks[("extension", extension["url"])] = (
+            [("queue", queue_url) for queue_url in extension["queues"]],
+            lambda done, extension=extension: copy_extension(extension, {key[1]: url for key, url in done.items()}))
+
+    results, failures = run_dependency_graph(tasks, max_workers=max_workers)
+
+    new_workspaces_mapping = {workspace["url"]: results[("workspace", workspace["url"])]
+                              for workspace in workspaces_list if ("workspace", workspace["url"]) in results}
+    new_queues_mapping = {queue["url"]: results[("queue", queue["url"])]
+                          for queue in queues_list if ("queue", queue["url"]) in results}
+    new_extensions = [results[("extension", extension["url"])]
+                      for extension in extensions_list if ("extension", extension["url"]) in results]
+
+    if failures:
+        print("Copying organization setup - {0} ERROR(S)".format(len(failures)))
+
+    return new_workspaces_mapping, new_queues_mapping, new_extensions, failures
+
+
+def store_original_document(document, token, directory):
+
+    """
+    Download original of the document into a content-addressed file of the given directory.
+    The content is streamed to disk in chunks and hashed on the way.
+    :param document: Dict representing the document
+    :param token: Authentication token
+    :param directory: Directory where the original is stored.
+    :return: SHA-256 of the content, which is also the name of the stored file
+    """
+
+    digest = hashlib.sha256()
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".part")
+
+    try:
+        with os.fdopen(descriptor, "wb") as original_file:
+            with HTTP_CLIENT.get("{0}/original/{1}".format(API_URL, document["s3_name"]), token=token,
+                                 stream=True) as response:
+
+                if response.status_code == 200:
+                    print("Getting original document - OK")
+                else:
+                    print("Getting original document - ERROR")
+                    response.raise_for_status()
+
+                for chunk in response.iter_content(chunk_size=TRANSFER_CHUNK_SIZE):
+                    digest.update(chunk)
+                    original_file.write(chunk)
+
+        os.replace(temporary_path, os.path.join(directory, digest.hexdigest()))
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+    return digest.hexdigest()
+
+
+class BlobCache(object):
+
+    """
+    Content-addressed local cache of original documents. Every original is stored once under the SHA-256 of its
+    content and indexed by its s3_name, so it is downloaded only once per cache lifetime however many queues and
+    organizations it is copied to. Concurrent requests for an original which is being downloaded wait for it.
+    When the cache grows over max_bytes, the least recently used originals are evicted.
+    The index is kept in SQLite next to the blobs, a non-persistent cache keeps it in memory for one run only.
+    """
+
+    INDEX = "index.sqlite"
+
+    def __init__(self, directory, max_bytes=None, persistent=True):
+
+        """
+        :param directory: Directory of the blobs, created if it does not exist.
+        :param max_bytes: Maximum total size of the blobs, unlimited when None.
+        :param persistent: Keep the index in the directory so the cache survives the run.
+        """
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.downloads = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._connection = sqlite3.connect(os.path.join(directory, self.INDEX) if persistent else ":memory:",
+                                           timeout=60, check_same_thread=False)
+
+        with self._lock, self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS blobs "
+                                     "(sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS names (s3_name TEXT PRIMARY KEY, sha256 TEXT NOT NULL)")
+
+    def _open_cached(self, s3_name):
+
+        # Opening under the lock guarantees the blob is not evicted before the caller holds it.
+        with self._lock, self._connection:
+
+            rows = self._connection.execute("SELECT sha256 FROM names WHERE s3_name = ?", (s3_name,)).fetchall()
+
+            if not rows:
+                return None
+
+            try:
+                original_file = open(os.path.join(self.directory, rows[0][0]), "rb")
+            except FileNotFoundError:
+                return None
+
+            self._connection.execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (time.time(), rows[0][0]))
+
+            return rows[0][0], original_file
+
+    def _add(self, s3_name, sha256):
+
+        with self._lock, self._connection:
+
+            size = os.path.getsize(os.path.join(self.directory, sha256))
+            self._connection.execute("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)", (sha256, size, time.time()))
+            self._connection.execute("INSERT OR REPLACE INTO names VALUES (?, ?)", (s3_name, sha256))
+
+            if self.max_bytes is None:
+                return
+
+            total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            victims = self._connection.execute("SELECT sha256, size FROM blobs WHERE sha256 != ? ORDER BY last_used",
+                                               (sha256,)).fetchall()
+
+            for victim, victim_size in victims:
+
+                if total <= self.max_bytes:
+                    break
+
+                try:
+                    os.remove(os.path.join(self.directory, victim))
+                except OSError:
+                    continue
+
+                self._connection.execute("DELETE FROM blobs WHERE sha256 = ?", (victim,))
+                self._connection.execute("DELETE FROM names WHERE sha256 = ?", (victim,))
+                total -= victim_size
+
+    def _download(self, document, token):
+
+        s3_name = document["s3_name"]
+
+        with self._lock:
+            future = self._in_flight.get(s3_name)
+            owner = future is None
+            if owner:
+                future = self._in_flight[s3_name] = Future()
+
+        if owner:
+            try:
+                sha256 = store_original_document(document, token, self.directory)
+                self._add(s3_name, sha256)
+                self.downloads += 1
+                future.set_result(sha256)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._in_flight[s3_name]
+        else:
+            self.hits += 1
+
+        return future.result()
+
+    def open_original(self, document, token):
+
+        """
+        Open the original of the document, downloading it only if it is not cached yet.
+        :param document: Dict representing the document
+        :param token: Auth token to the organization of the document.
+        :return: Tuple (SHA-256 of the content, binary file object), the caller should close the file
+        """
+
+        cached = self._open_cached(document["s3_name"])
+
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        # A tiny cache may evict the blob before it is opened, then it is downloaded again.
+        for _ in range(3):
+            self._download(document, token)
+            cached = self._open_cached(document["s3_name"])
+            if cached is not None:
+                return cached
+
+        raise RuntimeError("Original {0} does not fit into the cache".format(document["s3_name"]))
+
+    def close(self):
+
+        print("Original documents cache - {0} downloaded, {1} reused".format(self.downloads, self.hits))
+
+        with self._lock:
+            self._connection.close()
+
+
+def copy_blob(original_file, directory, sha256):
+
+    """
+    Copy an open original into a content-addressed directory unless it is already there.
+    :param original_file: Binary file object
+    :param directory: Target directory
+    :param sha256: SHA-256 of the content, the name of the target file
+    :return: None
+    """
+
+    path = os.path.join(directory, sha256)
+
+    if os.path.exists(path):
+        return
+
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".part")
+
+    with os.fdopen(descriptor, "wb") as target_file:
+        shutil.copyfileobj(original_file, target_file, TRANSFER_CHUNK_SIZE)
+
+    os.replace(temporary_path, path)
+
+
+def take_template_snapshot(organization_dict, token, directory, metadata_workers=4, download_workers=8,
+                           max_pending=8, selection=None, blob_cache=None):
+
+    """
+    Read everything needed for copying the template organization once, so that any number of new organizations
+    can be created from it without touching the template again. Originals are stored in the given directory.
+    :param organization_dict: Dict representing the template organization.
+    :param token: Auth token to the template organization.
+    :param directory: Directory where the originals are stored, named by SHA-256 of their content.
+    :param metadata_workers: Number of threads fetching schemas and document metadata.
+    :param download_workers: Number of threads downloading the originals.
+    :param max_pending: Maximum number of documents waiting between two stages.
+    :param selection: Keyword arguments of select_annotations choosing the documents, all documents when None.
+    :param blob_cache: BlobCache the originals are taken from, each distinct original is downloaded once anyway.
+    :return: Dict with the organization, workspaces, queues, schemas (by URL), extensions and documents
+    :raises RuntimeError: When any of the selected documents could not be stored.
+    """
+
+    cache = blob_cache or BlobCache(directory, persistent=False)
+
+    workspaces = get_all_workspaces(organization_dict, token)
+    queues = get_all_queues(organization_dict, token)
+    extensions = get_all_extensions(organization_dict, token)
+
+    schemas = get_schemas(sorted(set(queue["schema"] for queue in queues)), token)
+
+    documents = []
+
+    def fetch_metadata(annotation):
+        return annotation, get_annotation_document(annotation, token)
+
+    def store_original(item):
+        annotation, document = item
+        sha256, original_file = cache.open_original(document, token)
+        with original_file:
+            if cache.directory != directory:
+                copy_blob(original_file, directory, sha256)
+        documents.append({"annotation": annotation["url"],
+                          "queue": annotation["queue"],
+                          "original_file_name": document["original_file_name"],
+                          "s3_name": document["s3_name"],
+                          "sha256": sha256})
+
+    stages = [("fetch document", fetch_metadata, metadata_workers),
+              ("download original", store_original, download_workers)]
+
+    try:
+        annotations = select_annotations(organization_dict, token, **(selection or {}))
+        failures = run_pipeline(annotations, stages, queue_size=max_pending)
+    finally:
+        if blob_cache is None:
+            cache.close()
+
+    # A snapshot without some of the documents would silently create organizations without them.
+    if failures:
+        print("Taking template snapshot - {0} ERROR(S)".format(len(failures)))
+        raise RuntimeError("Taking template snapshot failed for {0} document(s), the first error: {1}".format(
+            len(failures), failures[0][2]))
+
+    return {"organization": organization_dict,
+            "workspaces": workspaces,
+            "queues": queues,
+            "schemas": schemas,
+            "extensions": extensions,
+            "documents": documents}
+
+
+def write_json_file(path, data):
+
+    """
+    Write JSON to a file atomically, readers never see a half-written file.
+    :param path: Path of the file
+    :param data: JSON serializable data
+    :return: None
+    """
+
+    # Every writer gets its own temporary file, so concurrent writes of the same file never interleave.
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".part")
+
+    try:
+        with os.fdopen(descriptor, "w") as json_file:
+            json.dump(data, json_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def export_template_snapshot(organization_dict, token, directory, metadata_workers=4, download_workers=8,
+                             max_pending=8, selection=None, blob_cache=None):
+
+    """
+    Export the template organization into a versioned snapshot directory, which is enough for creating new
+    organizations without any request to the template (see load_template_snapshot). The directory contains
+    manifest.json, one JSON file per object kind and originals named by SHA-256 of their content.
+    The manifest is written last, so only a finished export can be loaded, and it is not written at all when
+    any of the documents could not be exported.
+    :param organization_dict: Dict representing the template organization.
+    :param token: Auth token to the template organization.
+    :param directory: Snapshot directory, created if it does not exist.
+    :param metadata_workers: Number of threads fetching schemas and document metadata.
+    :param download_workers: Number of threads downloading the originals.
+    :param max_pending: Maximum number of documents waiting between two stages.
+    :param selection: Keyword arguments of select_annotations choosing the documents, all documents when None.
+    :param blob_cache: BlobCache the originals are taken from.
+    :return: Dict representing the snapshot
+    """
+
+    originals_directory = os.path.join(directory, SNAPSHOT_ORIGINALS_DIR)
+    os.makedirs(originals_directory, exist_ok=True)
+
+    snapshot = take_template_snapshot(organization_dict, token, originals_directory,
+                                      metadata_workers=metadata_workers,
+                                      download_workers=download_workers,
+                                      max_pending=max_pending,
+                                      selection=selection,
+                                      blob_cache=blob_cache)
+
+    for kind in SNAPSHOT_KINDS:
+        write_json_file(os.path.join(directory, "{0}.json".format(kind)), snapshot[kind])
+
+    manifest = {"version": SNAPSHOT_VERSION,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "organization": organization_dict,
+                "counts": {kind: len(snapshot[kind]) for kind in SNAPSHOT_KINDS}}
+
+    write_json_file(os.path.join(directory, SNAPSHOT_MANIFEST), manifest)
+
+    print("Exporting template snapshot to '{0}' - OK".format(directory))
+
+    return snapshot
+
+
+def load_template_snapshot(directory):
+
+    """
+    Load a template snapshot written by export_template_snapshot.
+    :param directory: Snapshot directory.
+    :return: Dict representing the snapshot
+    """
+
+    with open(os.path.join(directory, SNAPSHOT_MANIFEST)) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError("Unsupported snapshot version {0} in '{1}'".format(manifest.get("version"), directory))
+
+    snapshot = {"organization": manifest["organization"]}
+
+    for kind in SNAPSHOT_KINDS:
+        with open(os.path.join(directory, "{0}.json".format(kind))) as kind_file:
+            snapshot[kind] = json.load(kind_file)
+
+    originals_directory = os.path.join(directory, SNAPSHOT_ORIGINALS_DIR)
+    missing = [document["sha256"] for document in snapshot["documents"]
+               if not os.path.exists(os.path.join(originals_directory, document["sha256"]))]
+
+    if missing:
+        raise ValueError("Snapshot '{0}' is missing {1} original(s)".format(directory, len(missing)))
+
+    print("Loading template snapshot from '{0}' - OK".format(directory))
+
+    return snapshot
+
+
+def upload_snapshot_documents(new_queues_mapping, documents, directory, token, upload_workers=8, max_pending=8,
+                              journal=None):
+
+    """
+    Upload documents of a template snapshot to the new organization.
+    :param new_queues_mapping: Mapping of the original queues from master organization to new queues URL in the new org.
+    :param documents: List of snapshot documents.
+    :param directory: Directory with the stored originals.
+    :param token: Auth token to the new organization
+    :param upload_workers: Number of threads uploading the documents.
+    :param max_pending: Maximum number of documents waiting for upload.
+    :param journal: CopyJournal, documents which were already uploaded are skipped.
+    :return: List of (stage name, item, exception) tuples for the documents that failed to be uploaded
+    """
+
+    uploaded = journal.get_uploaded() if journal is not None else set()
+
+    def upload(document):
+        target_queue = new_queues_mapping[document["queue"]].split("/")[-1]
+        with open(os.path.join(directory, document["sha256"]), "rb") as original_file:
+            result = upload_document(document["original_file_name"], original_file, target_queue, token)
+        if journal is not None:
+            journal.record_upload(document["annotation"], uploaded_annotation_url(result))
+        return result
+
+    pending_documents = (document for document in documents if document["annotation"] not in uploaded)
+
+    failures = run_pipeline(pending_documents, [("upload document", upload, upload_workers)],
+                            queue_size=max_pending)
+
+    if failures:
+        print("Uploading snapshot documents - {0} ERROR(S)".format(len(failures)))
+
+    return failures
+
+
+def load_org_specs(path):
+
+    """
+    Load the list of organizations to be created in batch mode.
+    Each organization is described by org_name, username, email and password.
+    :param path: Path to a CSV file with a header row or to a JSON file with a list of objects.
+    :return: List of dicts
+    """
+
+    with open(path, newline="") as specs_file:
+        if path.lower().endswith(".csv"):
+            specs = list(csv.DictReader(specs_file))
+        else:
+            specs = json.load(specs_file)
+
+    for spec in specs:
+        missing = [key for key in ORG_SPEC_KEYS if not spec.get(key)]
+        if missing:
+            raise ValueError("Organization spec {0} is missing {1}".format(spec, ", ".join(missing)))
+
+    return specs
+
+
+def create_organization_from_snapshot(snapshot, directory, spec, create_key, master_org_token, max_workers=8,
+                                      upload_workers=8, schema_deduplication="url", journal_path=None, resume=False,
+                                      sync=False):
+
+    """
+    Create one new organization and initialize it to the setup stored in a template snapshot.
+    :param snapshot: Template snapshot, see take_template_snapshot
+    :param directory: Directory with the stored originals.
+    :param spec: Dict with org_name, username, email and password of the new organization.
+    :param create_key: Create key of the given organization group provided by Rossum team
+    :param master_org_token: Token of the organization group admin.
+    :param max_workers: Maximum number of objects created concurrently.
+    :param upload_workers: Number of threads uploading the documents.
+    :param schema_deduplication: Mode of the SchemaCache.
+    :param journal_path: Path to the SQLite database of the CopyJournal, no journal is kept when None.
+    :param resume: Continue a copy recorded in the journal.
+    :param sync: Continue a copy recorded in the journal and update objects changed in the template since.
+    :return: Dict summarizing the new organization
+    """
+
+    journal = CopyJournal(journal_path, spec["org_name"]) if journal_path else None
+
+    try:
+        organization = get_or_create_organization(create_key, spec["org_name"], spec["username"], spec["email"],
+                                                  spec["password"], journal=journal, resume=resume or sync)
+        organization_url = "{0}/organizations/{1}".format(API_URL, organization["id"])
+
+        new_org_token = CREDENTIALS.membership_token(organization_url, master_org_token)
+
+        workspaces_mapping, queues_mapping, _, failures = copy_organization_setup(
+            organization_url,
+            new_org_token,
+            master_org_token,
+            workspaces_list=snapshot["workspaces"],
+            queues_list=snapshot["queues"],
+            extensions_list=snapshot["extensions"],
+            user_url=organization["users"][0],
+            max_workers=max_workers,
+            schema_deduplication=schema_deduplication,
+            schemas=snapshot["schemas"],
+            journal=journal,
+            sync=sync)
+
+        document_failures = upload_snapshot_documents(queues_mapping, snapshot["documents"], directory, new_org_token,
+                                                      upload_workers=upload_workers, journal=journal)
+    finally:
+        if journal is not None:
+            journal.close()
+
+    return {"organization": organization_url,
+            "workspaces": workspaces_mapping,
+            "queues": queues_mapping,
+            "failures": len(failures) + len(document_failures)}
+
+
+def create_organizations_from_snapshot(snapshot, directory, specs, create_key, master_org_token, batch_workers=4,
+                                       **options):
+
+    """
+    Create many organizations from one template snapshot concurrently.
+    A failure of one organization is reported and does not stop the others.
+    :param snapshot: Template snapshot, see take_template_snapshot
+    :param directory: Directory with the stored originals.
+    :param specs: List of organization specs, see load_org_specs
+    :param create_key: Create key of the given organization group provided by Rossum team
+    :param master_org_token: Token of the organization group admin.
+    :param batch_workers: Number of organizations created at once.
+    :param options: Other arguments of create_organization_from_snapshot
+    :return: Dict of organization name -> summary dict or the exception which stopped it
+    """
+
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=batch_workers) as executor:
+
+        futures = {executor.submit(create_organization_from_snapshot, snapshot, directory, spec, create_key,
+                                   master_org_token, **options): spec["org_name"] for spec in specs}
+
+        for future in as_completed(futures):
+
+            org_name = futures[future]
+
+            try:
+                results[org_name] = future.result()
+                print("Creating organization '{0}' from snapshot - OK".format(org_name))
+            except Exception as e:
+                results[org_name] = e
+                print("Creating organization '{0}' from snapshot - ERROR: {1}".format(org_name, e))
+
+    return results
+
+
+def load_template_setup(organization_dict, token):
+
+    """
+    Read the setup of the template together with the source hashes of its objects, as recorded in the journals.
+    :param organization_dict: Dict representing the template organization
+    :param token: Auth token to the template organization.
+    :return: Dict of kind -> dict of source URL -> (source object, source hash); schemas are recorded both by
+    their URL and by the URL of every queue using them, as copies without schema deduplication are.
+    """
+
+    setup = load_organization_setup(organization_dict, token)
+
+    template = {"workspace": {workspace["url"]: (workspace, workspace_source_hash(workspace))
+                              for workspace in setup["workspaces"]},
+                "queue": {queue["url"]: (queue, queue_source_hash(queue)) for queue in setup["queues"]},
+                "extension": {extension["url"]: (extension, extension_source_hash(extension))
+                              for extension in setup["extensions"]},
+                "schema": {url: (schema, schema_content_hash(schema)) for url, schema in setup["schemas"].items()}}
+
+    for queue in setup["queues"]:
+        if queue.get("schema") in template["schema"]:
+            template["schema"][queue["url"]] = template["schema"][queue["schema"]]
+
+    return template
+
+
+def propagate_to_organization(template, journal_path, target, master_org_token, max_workers=4):
+
+    """
+    Update the objects of one organization copied from the template whose template source changed since they were
+    copied or last propagated, as told by the source hashes in its journal. Only changed objects are sent, with PATCH,
+    at most max_workers at once. A failed object keeps its old hash in the journal, so a rerun tries it again.
+    Objects added to the template since the copy are not created, a --sync run of the copy does that.
+    :param template: Template setup returned by load_template_setup
+    :param journal_path: Path to the SQLite database of the journals.
+    :param target: Name of the target organization of the journal.
+    :param master_org_token: Token of the organization group admin.
+    :param max_workers: Number of objects of the organization updated concurrently.
+    :return: Dict with the "organization" URL, the numbers of "updated", "unchanged" and "not_copied" objects
+    and the list of "failures", (kind, source URL, exception) tuples
+    """
+
+    journal = CopyJournal(journal_path, target)
+
+    try:
+        organization = journal.get_organization()
+
+        if organization is None:
+            raise ValueError("The journal has no organization for '{0}'".format(target))
+
+        organization_url = "{0}/organizations/{1}".format(API_URL, organization["id"])
+        token = CREDENTIALS.membership_token(organization_url, master_org_token)
+
+        records = {kind: journal.get_mapping_records(kind) for kind in template}
+        mappings = {kind: {source_url: record[0] for source_url, record in kind_records.items()}
+                    for kind, kind_records in records.items()}
+
+        def update(kind, source, target_url):
+
+            if kind == "workspace":
+                return update_workspace(target_url, token, source)
+
+            if kind == "schema":
+                return update_schema(target_url, source, token)
+
+            if kind == "queue":
+                schema_key = source["url"] if source["url"] in mappings["schema"] else source["schema"]
+                return update_queue(target_url, source, mappings["workspace"][source["workspace"]],
+                                    mappings["schema"][schema_key], token)
+
+            return update_extension(target_url, mappings["queue"], source, token, organization["users"][0])
+
+        changed = []
+        result = {"organization": organization_url, "updated": 0, "unchanged": 0, "not_copied": 0, "failures": []}
+
+        for kind, sources in template.items():
+            for source_url, (source, source_hash) in sources.items():
+                record = records[kind].get(source_url)
+                if record is None:
+                    # Queue URLs among the schema sources only matter for copies without schema deduplication.
+                    if not (kind == "schema" and source_url in template["queue"]):
+                        result["not_copied"] += 1
+                elif record[1] == source_hash:
+                    result["unchanged"] += 1
+                else:
+                    changed.append((kind, source_url, source, source_hash, record[0]))
+
+        def propagate(kind, source_url, source, source_hash, target_url):
+            try:
+                with INSTRUMENTATION.span("propagate {0}".format(kind)):
+                    journal.record_mapping(kind, source_url, update(kind, source, target_url), source_hash)
+                return True
+            except Exception as e:
+                result["failures"].append((kind, source_url, e))
+                return False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            result["updated"] = sum(executor.map(lambda item: propagate(*item), changed))
+    finally:
+        journal.close()
+
+    return result
+
+
+def propagate_template_changes(organization_dict, master_org_token, journal_path, targets=None, org_workers=8,
+                               max_workers=4):
+
+    """
+    Push the changes of the template schemas, workspaces, queues and extensions to all organizations copied from
+    it with a journal. The template is read once, organizations are updated org_workers at once and each of them
+    max_workers objects at once. A failure of one organization is reported and does not stop the others.
+    :param organization_dict: Dict representing the template organization
+    :param master_org_token: Token of the organization group admin.
+    :param journal_path: Path to the SQLite database of the journals.
+    :param targets: List of the target organization names, all targets in the journal when None.
+    :param org_workers: Number of organizations updated concurrently.
+    :param max_workers: Number of objects of one organization updated concurrently.
+    :return: Dict of target name -> result of propagate_to_organization or the exception which stopped it
+    """
+
+    started = time.perf_counter()
+    template = load_template_setup(organization_dict, master_org_token)
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=org_workers) as executor:
+
+        futures = {executor.submit(propagate_to_organization, template, journal_path, target, master_org_token,
+                                   max_workers): target
+                   for target in (targets if targets is not None else CopyJournal.get_targets(journal_path))}
+
+        for future in as_completed(futures):
+
+            target = futures[future]
+
+            try:
+                results[target] = result = future.result()
+            except Exception as e:
+                results[target] = e
+                print("Propagating template changes to '{0}' - ERROR: {1}".format(target, e))
+                continue
+
+            for kind, source_url, error in result["failures"]:
+                print("Propagating {0} {1} to '{2}' - ERROR: {3}".format(kind, source_url, target, error))
+
+            print("Propagating template changes to '{0}' - {1}: {2} updated, {3} unchanged, {4} not copied".format(
+                target, "ERROR" if result["failures"] else "OK", result["updated"], result["unchanged"],
+                result["not_copied"]))
+
+    failed = [target for target, result in results.items() if isinstance(result, Exception) or result["failures"]]
+
+    print("Propagating template changes - {0} organization(s), {1} object(s) updated, {2} failed in {3:.1f}s".format(
+        len(results), sum(result["updated"] for result in results.values() if not isinstance(result, Exception)),
+        len(failed), time.perf_counter() - started))
+
+    return results
+
+
+def upload_master_data_to_data_matching(token, target_queues, file, matching_code_column, entity, session=None):
+
+    """
+    Upload sample data to data matching database.
+    :param token: Token of the organization where data should be uploaded.
+    :param target_queues: List of where the master data should be uploaded.
+    :param file: Master data to be uploaded - in JSON format, or bytes of an already encoded JSON array.
+    :param matching_code_column: Primary key of the master data, required when uploading.
+    :param entity: The entity name of the data - (Purchase Orders, Suppliers, etc.)
+    :param session: Data Matching session cookie, the cached session of the token is used when None.
+    :return: Dict representing the response
+    """
+
+    refreshable = session is None
+
+    if session is None:
+        session = CREDENTIALS.data_matching_session(token)
+
+    content = file if isinstance(file, bytes) else json.dumps(file)
+    files = [('files', ('master_data.json', content, 'application/json'))]
+
+    payload = {
+            "encoding": "utf-8",
+            "queues": target_queues,
+            "matching_code_column": matching_code_column,
+            "dataset": entity
+    }
+
+    response = HTTP_CLIENT.post("{0}/import".format(DATA_MATCHING_URL),
+                                files=files,
+                                data=payload,
+                                cookies={"session": session})
+
+    # The cached session may have expired since it was opened.
+    if response.status_code == 401 and refreshable:
+        response = HTTP_CLIENT.post("{0}/import".format(DATA_MATCHING_URL),
+                                    files=files,
+                                    data=payload,
+                                    cookies={"session": CREDENTIALS.data_matching_session(token, refused=session)})
+
+    if response.status_code == 200:
+        print("Uploading data to data matching - OK")
+    else:
+        print("Uploading data to data matching - ERROR")
+        response.raise_for_status()
+
+    return response.json()
+
+
+def login_to_data_matching_with_token(token):
+
+    """
+    Login to the Data Matching API. User has to be logged in when using other endpoints.
+    The Data Matching currently uses session cookie authentication, the session is stored in CREDENTIALS.
+    Use CREDENTIALS.data_matching_session to reuse a valid session instead of logging in every time.
+    The token goes through HTTP_CLIENT, so an expired membership token is issued again before logging in.
+    :param token: auth token provided by the Rossum API /login endpoint - https://api.elis.rossum.ai/docs/#login
+    :return: dict with the API response
+    """
+
+    response = HTTP_CLIENT.post("{0}/auth/token_login".format(DATA_MATCHING_URL), token=token, idempotent=True)
+
+    if response.status_code == 200:
+        print("Logging in to data matching - OK")
+    else:
+        print("Logging in to data matching - ERROR")
 
-    """
-    Getting all organizations in organization group - organization group admin can list all the available organizations.
-    :param token: Authentication token to the primary organization.
-    :return: List of results
-    """
+    print(response.text)
 
-    # TODO perform pagination for big orgs
+    response.raise_for_status()
 
-    page_size = 100
+    CREDENTIALS.store_data_matching_session(token, response.cookies.get_dict()["session"])
 
-    headers = {"Authorization": "token {0}".format(token)}
-    response = requests.get("https://api.elis.rossum.ai/v1/organizations?page_size={0}".format(page_size),
-                            headers=headers)
+    return response.json()
 
-    if response.status_code == 200:
-        print("Fetching organizations - OK")
-    else:
-        print("Fetching organizations - ERROR")
 
-    return response.json()["results"]
+def iterate_json_array(path):
 
+    """
+    Iterate over the items of a JSON array in a file without loading the whole file.
+    Items must be separated by exactly one comma, a malformed array raises ValueError instead of being read partly.
+    :param path: Path of the file
+    :return: Generator of the items
+    """
 
-def get_master_data_organization(organizations_list):
+    decoder = json.JSONDecoder()
+
+    with open(path, encoding="utf-8") as json_file:
+
+        buffer = ""
+        position = 0
+        eof = False
+        # What comes next: "array" is the opening bracket, "first" the first item or the closing bracket,
+        # "item" an item after a comma, "separator" a comma or the closing bracket and "end" nothing but whitespace.
+        expected = "array"
+
+        while True:
+
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+
+            if position == len(buffer) and not eof:
+                chunk = json_file.read(TRANSFER_CHUNK_SIZE)
+                buffer = buffer[position:] + chunk
+                position = 0
+                eof = not chunk
+                continue
+
+            if expected == "end":
+                if position < len(buffer):
+                    raise ValueError("Unexpected data after the JSON array in {0}".format(path))
+                return
+
+            if position == len(buffer):
+                raise ValueError("Unexpected end of the JSON array in {0}".format(path))
+
+            character = buffer[position]
+
+            if expected == "array":
+                if character != "[":
+                    raise ValueError("{0} does not contain a JSON array".format(path))
+                expected = "first"
+                position += 1
+                continue
+
+            if character == "]" and expected in ("first", "separator"):
+                expected = "end"
+                position += 1
+                continue
+
+            if expected == "separator":
+                if character != ",":
+                    raise ValueError("Invalid JSON array in {0}: expected ',' or ']' but found {1!r}".format(
+                        path, character))
+                expected = "item"
+                position += 1
+                continue
+
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                item, end = None, None
+
+            # An item which is not followed by a delimiter yet may continue in the next chunk, e.g. a number.
+            if end is None or (not eof and (end == len(buffer) or buffer[end] not in ",] \t\r\n")):
+                if eof:
+                    raise ValueError("Invalid JSON array in {0}".format(path))
+                chunk = json_file.read(TRANSFER_CHUNK_SIZE)
+                buffer = buffer[position:] + chunk
+                position = 0
+                eof = not chunk
+                continue
+
+            yield item
+            position = end
+            expected = "separator"
+
+
+def iterate_master_data(path, file_format=None):
 
     """
-    We will be performing a deep-copy of one template organization.
-    We have marked up this organization with ID "master_data_organization" in the organization metadata
-    :param organizations_list: List of organizations
-    :return: dict representing the selected organization
+    Iterate over the records of a master data file without loading it whole into memory.
+    :param path: Path of a JSON (array of records), NDJSON (a record per line) or CSV (with a header) file.
+    :param file_format: "json", "ndjson" or "csv", decided by the file extension when None.
+    :return: Generator of dicts
     """
 
-    for org in organizations_list:
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        file_format = {".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}.get(extension, "json")
 
-        if "metadata" in org:
-            print(org["metadata"])
+    if file_format == "json":
+        yield from iterate_json_array(path)
 
-        if "metadata" in org and "id" in org["metadata"] and org["metadata"]["id"] == "master_data_organization":
-            return org
+    elif file_format == "ndjson":
+        with open(path, encoding="utf-8") as ndjson_file:
+            for line in ndjson_file:
+                if line.strip():
+                    yield json.loads(line)
 
-    return None
+    elif file_format == "csv":
+        with open(path, newline="", encoding="utf-8-sig") as csv_file:
+            yield from csv.DictReader(csv_file)
+
+    else:
+        raise ValueError("Unknown master data format '{0}'".format(file_format))
 
 
-def get_all_workspaces(organization_dict, token):
+def chunk_master_data(records, max_chunk_bytes):
 
     """
-    Getting all workspaces of a specific organization.
-    :param organization_dict: Dict representing the selected organization.
-    :param token: Auth token to the selected organization.
-    :return: List of workspaces
+    Encode records into JSON arrays of at most max_chunk_bytes each (a single bigger record gets its own chunk).
+    :param records: Iterable of records
+    :param max_chunk_bytes: Maximum size of one chunk in bytes.
+    :return: Generator of tuples (encoded JSON array, number of records)
     """
 
-    headers = {"Authorization": "token {0}".format(token)}
+    parts = []
+    size = 2
 
-    response = requests.get("https://api.elis.rossum.ai/v1/workspaces?organization={0}".format(organization_dict["id"]),
-                            headers=headers)
+    for record in records:
 
-    if response.status_code == 200:
-        print("Fetched workspaces - OK")
-    else:
-        print("Fetched workspaces - ERROR")
+        part = json.dumps(record).encode()
 
-    return response.json()["results"]
+        if parts and size + len(part) + 1 > max_chunk_bytes:
+            yield b"[" + b",".join(parts) + b"]", len(parts)
+            parts = []
+            size = 2
 
+        parts.append(part)
+        size += len(part) + 1
 
-def get_all_queues(organization_dict, token):
+    if parts:
+        yield b"[" + b",".join(parts) + b"]", len(parts)
 
-    """
-    Getting all queues of a specific organization.
-    :param organization_dict: Dict representing the selected organization.
-    :param token: Auth token to the selected organization.
-    :return: List of queues
-    """
 
-    headers = {"Authorization": "token {0}".format(token)}
-    response = requests.get("https://api.elis.rossum.ai/v1/queues?organization={0}".format(organization_dict["id"]),
-                            headers=headers)
+def upload_master_data_file(token, target_queues, path, matching_code_column, entity, file_format=None,
+                            max_chunk_bytes=8 * 1024 * 1024, workers=4):
 
-    if response.status_code == 200:
-        print("Fetching queues - OK")
-    else:
-        print("Fetching queues - ERROR")
+    """
+    Upload a master data file of any size to the data matching database. The file is read incrementally and split
+    into chunks of at most max_chunk_bytes which are imported concurrently as separate imports of the same dataset,
+    all within the cached Data Matching session of the token. At most twice as many chunks as workers are held in memory.
+    :param token: Token of the organization where data should be uploaded.
+    :param target_queues: List of where the master data should be uploaded.
+    :param path: Path of a JSON, NDJSON or CSV file with the master data.
+    :param matching_code_column: Primary key of the master data, required when uploading.
+    :param entity: The entity name of the data - (Purchase Orders, Suppliers, etc.)
+    :param file_format: "json", "ndjson" or "csv", decided by the file extension when None.
+    :param max_chunk_bytes: Maximum size of one uploaded chunk in bytes.
+    :param workers: Number of chunks uploaded concurrently.
+    :return: Tuple (number of uploaded records, list of (chunk number, exception) tuples for the failed chunks)
+    """
 
-    return response.json()["results"]
+    slots = threading.BoundedSemaphore(workers * 2)
+    progress_lock = threading.Lock()
+    progress = {"records": 0, "chunks": 0}
+    failures = []
+
+    def upload_chunk(number, content, records_count):
+        try:
+            with INSTRUMENTATION.span("upload master data chunk", records=records_count):
+                result = upload_master_data_to_data_matching(token, target_queues, content, matching_code_column,
+                                                             entity)
+            with progress_lock:
+                progress["records"] += records_count
+                progress["chunks"] += 1
+                print("Uploading master data chunk {0} ({1} records, {2:.1f} MB) - OK, {3} records uploaded".format(
+                    number, records_count, len(content) / 1024 ** 2, progress["records"]))
+            return result
+        except Exception as e:
+            print("Uploading master data chunk {0} - ERROR: {1}".format(number, e))
+            with progress_lock:
+                failures.append((number, e))
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for number, (content, records_count) in enumerate(
+                chunk_master_data(iterate_master_data(path, file_format), max_chunk_bytes), 1):
+            slots.acquire()
+            executor.submit(upload_chunk, number, content, records_count)
+
+    if failures:
+        print("Uploading master data - {0} ERROR(S)".format(len(failures)))
+
+    return progress["records"], failures
 
 
-def get_schema(schema, token):
+def upload_document(filename, content, queue_id, token):
 
     """
-    Getting schema.
-    :param schema: The url of the schema.
-    :param token: Authentication token.
-    :return:
+    Upload a document to a specific queue in the new organization
+    :param filename: Filename to be uploaded.
+    :param content: Content of the new file - bytes or a file object, file objects are streamed in chunks.
+    :param queue_id: Queue where the file should be uploaded.
+    :param token: Authentication token to the new organization.
+    :return: Dict representing the new annotation
     """
 
-    headers = {"Authorization": "token {0}".format(token)}
-    response = requests.get(schema, headers=headers)
+    response = HTTP_CLIENT.post("{0}/queues/{1}/upload/{2}".format(API_URL, queue_id, filename),
+                                token=token,
+                                data=content)
 
-    if response.status_code == 200:
-        print("Fetching schema - OK")
+    if response.status_code == 201:
+        print("Uploading new document - OK")
     else:
-        print("Fetching schema - ERROR")
+        print("Uploading new document - ERROR")
+        response.raise_for_status()
 
     return response.json()
 
 
-def get_document(document_url, token):
+def uploaded_annotation_url(upload_result):
 
     """
-    Get a specific document.
-    :param document_url: Url of the document
-    :param token: Authentication token
-    :return:
+    Get the URL of the annotation created by the upload endpoint.
+    :param upload_result: Dict returned by upload_document
+    :return: URL of the new annotation, None if the response does not contain it
     """
 
-    headers = {"Authorization": "token {0}".format(token)}
-    response = requests.get(document_url, headers=headers)
-
-    if response.status_code == 200:
-        print("Fetching document - OK")
-    else:
-        print("Fetching document - ERROR")
+    results = upload_result.get("results") or [{}]
 
-    return response.json()
+    return results[0].get("annotation")
 
 
-def get_original_document(document, token):
+def get_original_size(document, token):
 
     """
-    Download original of the document from Rossum's API.
-    :param document: Dict representing the document/
+    Get the size of the original of the document from the headers of a HEAD request, without downloading it.
+    :param document: Dict representing the document
     :param token: Authentication token
-    :return: The content of the original document
+    :return: Size in bytes, 0 when the API does not tell it
     """
 
-    headers = {"Authorization": "token {0}".format(token)}
-    response = requests.get("https://api.elis.rossum.ai/v1/original/{0}".format(document["s3_name"]), headers=headers)
+    response = HTTP_CLIENT.head("{0}/original/{1}".format(API_URL, document["s3_name"]), token=token,
+                                allow_redirects=True)
 
-    if response.status_code == 200:
-        print("Getting original document - OK")
-    else:
-        print("Getting original document - ERROR")
+    if response.status_code != 200:
+        print("Getting original document size - ERROR")
+        response.raise_for_status()
 
-    return response
+    return int(response.headers.get("Content-Length") or 0)
 
 
-def get_all_extensions(organization_dict, token):
+def plan_organization_copy(organization_dict, token, selection=None, schema_deduplication="url", metadata_workers=4,
+                           find_requests=0, cached_originals=True):
 
     """
-    Get all extensions from a specific organization.
-    :param organization_dict: Dict representing the organization
-    :param token: Authentication token
-    :return: List of extensions
+    Build the plan of copying the template organization by reading it, without creating anything:
+    the number of objects of every type, the size of the originals and the number of requests of every phase.
+    :param organization_dict: Dict representing the template organization
+    :param token: Authentication token to the template organization.
+    :param selection: Keyword arguments of select_annotations choosing the documents, all documents when None.
+    :param schema_deduplication: Mode of the SchemaCache the copy will use.
+    :param metadata_workers: Number of threads reading the document metadata and the original sizes.
+    :param find_requests: Number of requests sent to find the template organization.
+    :param cached_originals: The copy downloads every distinct original once, otherwise once per document.
+    :return: Dict with the objects, bytes and requests of the copy
     """
 
-    headers = {"Authorization": "token {0}".format(token)}
-    response = requests.get("https://api.elis.rossum.ai/v1/hooks?organization={0}".format(organization_dict["id"]),
-                            headers=headers)
+    workspaces = get_all_workspaces(organization_dict, token)
+    queues = get_all_queues(organization_dict, token)
+    extensions = get_all_extensions(organization_dict, token)
 
-    if response.status_code == 200:
-        print("Fetching extensions - OK")
-    else:
-        print("Fetching extensions - ERROR")
+    # The copy selects the same annotations with the same requests (a sample is the same for the same seed),
+    # so the requests are counted as they are sent instead of being estimated.
+    selection_started = sent_requests()
+    annotations = list(select_annotations(organization_dict, token, **(selection or {})))
+    selection_requests = sent_requests() - selection_started
 
-    return response.json()["results"]
+    schema_urls = sorted({queue["schema"] for queue in queues})
 
+    schemas = list(get_schemas(schema_urls, token).values())
+    # Documents which were not sideloaded with their annotations are fetched by the copy one by one.
+    fetched_documents = sum(1 for annotation in annotations if annotation.get("s3_name") is None)
 
-def get_all_annotations(organization_dict, token):
+    with ThreadPoolExecutor(max_workers=metadata_workers) as executor:
 
-    """
-    Get all annotations from a specific organization
-    :param organization_dict: Dict representing the organization
-    :param token: Authentication token
-    :return: List of annotations
-    """
+        documents = list(executor.map(lambda annotation: get_annotation_document(annotation, token), annotations))
 
-    headers = {"Authorization": "token {0}".format(token)}
-    response = requests.get("https://api.elis.rossum.ai/v1/annotations?organization={0}".format(organization_dict["id"]),
-                            headers=headers)
+        originals = {document["s3_name"]: document for document in documents}
+        original_sizes = dict(zip(originals, executor.map(lambda document: get_original_size(document, token),
+                                                          originals.values())))
 
-    if response.status_code == 200:
-        print("Fetching annotations - OK")
+    if schema_deduplication == "off":
+        new_schemas = len(queues)
+    elif schema_deduplication == "content":
+        new_schemas = len({schema_content_hash(schema) for schema in schemas})
     else:
-        print("Fetching annotations - ERROR")
-
-    return response.json()["results"]
-
-
-def create_schema(schema, token):
+        new_schemas = len(schema_urls)
+
+    def pages(count):
+        return max(1, -(-count // LIST_PAGE_SIZE))
+
+    downloaded = list(originals.values()) if cached_originals else documents
+
+    return {"objects": {"workspaces": len(workspaces),
+                        "schemas": new_schemas,
+                        "queues": len(queues),
+                        "extensions": len(extensions),
+                        "documents": len(documents),
+                        "distinct originals": len(originals)},
+            "download_bytes": sum(original_sizes[document["s3_name"]] for document in downloaded),
+            "upload_bytes": sum(original_sizes[document["s3_name"]] for document in documents),
+            "requests": {"find template": find_requests,
+                         "list template": pages(len(workspaces)) + pages(len(queues)) + pages(len(extensions)) +
+                         -(-len(schema_urls) // PAGE_SIZE),
+                         "create organization": 2,
+                         "copy setup": new_schemas + len(workspaces) + len(queues) + len(extensions),
+                         "copy documents": selection_requests + fetched_documents + len(documents) + len(downloaded)},
+            "document_requests": {"select": selection_requests,
+                                  "fetch": fetched_documents,
+                                  "download": len(downloaded),
+                                  "upload": len(documents)}}
+
+
+def estimate_copy_duration(plan, latency, bandwidth, max_workers=8, metadata_workers=4, download_workers=8,
+                           upload_workers=8):
 
     """
-    Create schema from template in selected organization defined by the authentication token.
-    :param schema: Dict representing the original schema
-    :param token: Auth token from the organization where the object should be created.
-    :return:
+    Estimate how long every phase of the planned copy takes. Requests of a phase are spread over its workers,
+    a phase never takes less than its longest chain of dependent requests, and the bytes of the originals
+    are added at the given bandwidth. Document stages run as a pipeline, so the slowest of them decides.
+    :param plan: Plan built by plan_organization_copy
+    :param latency: Duration of one request in seconds.
+    :param bandwidth: Transfer speed of the originals in bytes per second.
+    :param max_workers: Number of objects of the setup created concurrently.
+    :param metadata_workers: Number of threads fetching document metadata.
+    :param download_workers: Number of threads downloading originals.
+    :param upload_workers: Number of threads uploading documents.
+    :return: Dict of phase -> estimated seconds
     """
 
-    headers = {"Authorization": "token {0}".format(token)}
-
-    payload = {"name": schema["name"],
-               "content": schema["content"]
-               }
+    requests_count = plan["requests"]
+    document_requests = plan["document_requests"]
 
-    response = requests.post("https://api.elis.rossum.ai/v1/schemas", json=payload, headers=headers)
+    # Schema read, schema, queue and extension are created one after another.
+    setup_depth = 4 if plan["objects"]["extensions"] else 3
 
-    if response.status_code == 201:
-        print("Creating new schema - OK")
-    else:
-        print("Creating new schema - ERROR")
+    # The annotations are selected by the main thread while the stages copy the documents selected so far.
+    documents = max(document_requests["select"] * latency,
+                    document_requests["fetch"] * latency / metadata_workers,
+                    document_requests["download"] * latency / download_workers + plan["download_bytes"] / bandwidth,
+                    document_requests["upload"] * latency / upload_workers + plan["upload_bytes"] / bandwidth)
 
-    return response.json()
+    return {"find template": requests_count["find template"] * latency,
+            "list template": requests_count["list template"] * latency,
+            "create organization": requests_count["create organization"] * latency,
+            "copy setup": max(setup_depth * latency, requests_count["copy setup"] * latency / max_workers),
+            "copy documents": documents if plan["objects"]["documents"] else 0.0}
 
 
-def create_organization(create_key, org_name, user_fullname, user_email, user_password):
+def sent_requests():
 
     """
-    Create a fresh new organization
-    :param create_key: Create key of the given organization group provided by Rossum team
-    :param org_name: Name of the new organization
-    :param user_fullname: Full name of the admin to be created in the new organization
-    :param user_email: Full email of the admin to be created in the new organization
-    :param user_password: Password of the new admin
-    :return: Dict representing the new organization
+    Number of requests sent so far, as recorded by INSTRUMENTATION.
+    :return: int
     """
 
-    payload = {
-        "template_name": "Empty Organization Template",
-        "organization_name": org_name,
-        "user_fullname": user_fullname,
-        "user_email": user_email,
-        "user_password": user_password,
-        "user_ui_settings": json.dumps({"locale": "en"}),
-        "create_key": create_key
-        }
+    return sum(aggregate["count"] for aggregate in list(INSTRUMENTATION.endpoints.values()))
 
-    response = requests.post("https://api.elis.rossum.ai/v1/organizations/create", data=payload)
 
-    if response.status_code == 201:
-        print("Creating new organization - OK")
-    else:
-        print("Creating new organization - ERROR")
+def measured_latency():
 
-    return response.json()["organization"]
+    """
+    Median duration of the GET requests sent so far, as recorded by INSTRUMENTATION.
+    :return: Seconds, None if no request was sent
+    """
 
+    latency = LatencyHistogram()
 
-def create_workspaces(organization_url, token, workspaces_list):
+    for endpoint, aggregate in list(INSTRUMENTATION.endpoints.items()):
+        if endpoint.startswith("GET "):
+            latency.merge(aggregate["latency"])
 
-    """
-    Create new workspaces in the new organization
-    :param organization_url: The new organization where workspaces will be created.
-    :param token: Auth token to the new organization
-    :param workspaces_list: List of original workspaces to be copied.
-    :return: Mapping of the original workspaces from master organization to new workspaces URL in the new org.
-    """
+    return latency.percentile(0.5)
 
-    headers = {"Authorization": "token {0}".format(token)}
 
-    new_workspaces_mapping = {}
+def print_plan(plan, estimate, latency, bandwidth):
 
-    for workspace in workspaces_list:
+    """
+    Print the plan of the copy with its estimated duration.
+    :param plan: Plan built by plan_organization_copy
+    :param estimate: Estimate returned by estimate_copy_duration
+    :param latency: Latency the estimate is based on, in seconds.
+    :param bandwidth: Bandwidth the estimate is based on, in bytes per second.
+    :return: None
+    """
 
-        payload = {"name": workspace["name"],
-                   "organization": organization_url,
-                   "metadata": json.dumps(workspace["metadata"])}
+    print("Copy plan")
 
-        response = requests.post("https://api.elis.rossum.ai/v1/workspaces", data=payload, headers=headers)
+    for kind, count in plan["objects"].items():
+        print("  {0:<22} {1:>10}".format(kind, count))
 
-        if response.status_code == 201:
-            print("Creating workspace '{0}' - OK".format(workspace["name"]))
-        else:
-            print("Creating workspace '{0}' - ERROR".format(workspace["name"]))
+    print("  {0:<22} {1:>10.1f} MB".format("originals downloaded", plan["download_bytes"] / 1024 ** 2))
+    print("  {0:<22} {1:>10.1f} MB".format("documents uploaded", plan["upload_bytes"] / 1024 ** 2))
+    print("Estimate at {0:.0f} ms per request and {1:.1f} MB/s".format(latency * 1000, bandwidth / 1024 ** 2))
+    print("  {0:<22} {1:>10} {2:>10}".format("phase", "requests", "seconds"))
 
-        new_workspaces_mapping[workspace["url"]] = response.json()["url"]
+    for phase, requests_count in plan["requests"].items():
+        print("  {0:<22} {1:>10} {2:>10.1f}".format(phase, requests_count, estimate[phase]))
 
-    return new_workspaces_mapping
+    print("  {0:<22} {1:>10} {2:>10.1f}".format("total", sum(plan["requests"].values()), sum(estimate.values())))
 
 
-def create_queues(new_workspaces_mapping, token, master_org_auth_token, queues_list):
+def load_organization_setup(organization_dict, token):
 
     """
-    :param new_workspaces_mapping: Mapping of the original workspaces from master organization
-    to new workspaces in the new org.
-    :param token: Auth token to the new organization
-    :param master_org_auth_token: Auth token to the original organization where we copy objects from.
-    :param queues_list: List of original queues to be copied.
-    :return: Mapping of the original queues from master organization to new queues URL in the new org.
+    Read the setup of an organization: its workspaces, queues, schemas of the queues and extensions.
+    :param organization_dict: Dict representing the organization
+    :param token: Auth token to the organization.
+    :return: Dict with lists of "workspaces", "queues" and "extensions" and "schemas" by URL
     """
 
-    headers = {"Authorization": "token {0}".format(token)}
-
-    new_queues_mapping = {}
+    workspaces = get_all_workspaces(organization_dict, token)
+    queues = get_all_queues(organization_dict, token)
+    extensions = get_all_extensions(organization_dict, token)
+    schemas = get_schemas(sorted({queue["schema"] for queue in queues if queue.get("schema")}), token)
 
-    for queue in queues_list:
+    return {"workspaces": workspaces, "queues": queues, "extensions": extensions, "schemas": schemas}
 
-        schema = get_schema(queue["schema"], master_org_auth_token)
 
-        new_schema = create_schema(schema, token)
+def normalize_organization_setup(setup):
 
-        payload = {"name": queue["name"],
-                   "workspace": new_workspaces_mapping[queue["workspace"]],
-                   "metadata": queue["metadata"],
-                   "schema": new_schema["url"]
-                   }
+    """
+    Turn the setup of an organization into data comparable across organizations. Objects are keyed by their names
+    instead of IDs, attributes in DRIFT_IGNORED_FIELDS are dropped, queues refer to their workspace by name and
+    include the name and content of their schema, and extensions refer to the set of their queues by name.
+    :param setup: Setup returned by load_organization_setup
+    :return: Dict of kind -> dict of name -> normalized object
+    """
 
-        response = requests.post("https://api.elis.rossum.ai/v1/queues", json=payload, headers=headers)
+    def strip(obj):
+        return {key: value for key, value in obj.items() if key not in DRIFT_IGNORED_FIELDS}
 
-        if response.status_code == 201:
-            print("Creating queue '{0}' - OK".format(queue["name"]))
-        else:
-            print("Creating queue '{0}' - ERROR".format(queue["name"]))
+    def add(objects, name, obj):
+        key, number = name, 1
+        while key in objects:
+            number += 1
+            key = "{0} ({1})".format(name, number)
+        objects[key] = obj
+        return key
 
-        new_queues_mapping[queue["url"]] = response.json()["url"]
+    workspaces, queues, extensions = {}, {}, {}
+    workspace_names, queue_names = {}, {}
 
-    return new_queues_mapping
+    for workspace in setup["workspaces"]:
+        workspace_names[workspace["url"]] = add(workspaces, workspace.get("name") or "", strip(workspace))
 
+    for queue in setup["queues"]:
+        normalized = strip(queue)
+        normalized["workspace"] = workspace_names.get(queue.get("workspace"))
+        schema = setup["schemas"].get(queue.get("schema"))
+        normalized["schema"] = {"name": schema["name"], "content": schema["content"]} if schema else None
+        queue_names[queue["url"]] = add(queues, "{0}/{1}".format(normalized["workspace"], queue.get("name")),
+                                        normalized)
 
-def create_annotations(new_queues_mapping, original_annotations, token, master_org_auth_token):
+    for extension in setup["extensions"]:
+        normalized = strip(extension)
+        normalized["queues"] = {queue_names.get(queue_url, queue_url) for queue_url in extension["queues"]}
+        add(extensions, extension.get("name") or "", normalized)
 
-    """
+    return {"workspaces": workspaces, "queues": queues, "extensions": extensions}
 
-    :param new_queues_mapping: Mapping of the original queues from master organization to new queues URL in the new org.
-    :param original_annotations: List of original annotation to be copied.
-    :param token: Auth token to the new organization
-    :param master_org_auth_token: Auth token to the original organization where we copy objects from.
-    :return: None
-    """
 
-    for annotation in original_annotations:
+def hash_tree(value):
 
-        document = get_document(annotation["document"], master_org_auth_token)
+    """
+    Build the tree of structural hashes of JSON data: every dict and list gets a hash of the hashes of its items,
+    so two equal subtrees are recognized by comparing one hash. Items of lists of objects with an "id" (schema
+    content) are keyed by the id, so an inserted field does not shift all the following ones. Items of sets are keyed
+    by themselves.
+    :param value: JSON data, or a set of strings
+    :return: Tuple (hex digest, dict of key -> subtree, None for scalars)
+    """
 
-        original_file = get_original_document(document, master_org_auth_token)
+    if isinstance(value, dict):
+        children = {str(key): hash_tree(item) for key, item in value.items()}
+        digest = hashlib.sha256(json.dumps(["dict", sorted((key, child[0]) for key, child in children.items())])
+                                .encode("utf-8")).hexdigest()
+        return digest, children
 
-        target_queue = new_queues_mapping[annotation["queue"]].split("/")[-1]
+    if isinstance(value, list):
+        ids = [item.get("id") for item in value if isinstance(item, dict)]
+        keyed = len(ids) == len(value) and None not in ids and len(set(map(str, ids))) == len(ids)
+        keys = [str(item_id) for item_id in ids] if keyed else [str(index) for index in range(len(value))]
+        children = dict(zip(keys, map(hash_tree, value)))
+        digest = hashlib.sha256(json.dumps(["list", [(key, children[key][0]) for key in keys]])
+                                .encode("utf-8")).hexdigest()
+        return digest, children
 
-        upload_document(document["original_file_name"], original_file, target_queue, token)
+    if isinstance(value, (set, frozenset)):
+        children = {str(item): hash_tree(item) for item in value}
+        digest = hashlib.sha256(json.dumps(["set", sorted(children)]).encode("utf-8")).hexdigest()
+        return digest, children
 
-    return None
+    return hashlib.sha256(json.dumps(value).encode("utf-8")).hexdigest(), None
 
 
-def create_extensions(new_queues_mapping, original_extensions, token, user_url):
+def diff_hash_trees(template_tree, tree, path="", differences=None):
 
     """
-    Create new extensions from a list of original extensions
-    :param new_queues_mapping: The extension should be mapped to the same queues as in the template organization.
-    :param original_extensions: List of original extensions.
-    :param token: Auth token to the new organization.
-    :param user_url: User ID which will be assigned as a token owner for accessing the Rossum's API from extension.
-    :return: List of extensions
+    Find where a tree of structural hashes differs from the template one, descending only into the subtrees whose
+    hashes differ.
+    :param template_tree: Tree built by hash_tree from the template data
+    :param tree: Tree built by hash_tree from the compared data
+    :param path: Path of the compared trees, items are separated by "/".
+    :param differences: List the differences are appended to.
+    :return: List of dicts with the "path" and the "change": "missing" (only in the template), "extra" (not in the
+    template), "changed" or "reordered"
     """
 
-    headers = {"Authorization": "token {0}".format(token)}
+    if differences is None:
+        differences = []
 
-    new_extensions = []
+    if template_tree[0] == tree[0]:
+        return differences
 
-    for extension in original_extensions:
+    if template_tree[1] is None or tree[1] is None:
+        differences.append({"path": path, "change": "changed"})
+        return differences
 
-        payload = extension.copy()
-        payload["queues"] = [new_queues_mapping[x] for x in extension["queues"]]
-        payload["token_owner"] = user_url
+    found = len(differences)
 
-        response = requests.post("https://api.elis.rossum.ai/v1/hooks", json=payload, headers=headers)
+    for key, child in template_tree[1].items():
+        child_path = "{0}/{1}".format(path, key) if path else key
+        if key in tree[1]:
+            diff_hash_trees(child, tree[1][key], child_path, differences)
+        else:
+            differences.append({"path": child_path, "change": "missing"})
 
-        new_extensions.append(response)
+    for key in tree[1]:
+        if key not in template_tree[1]:
+            differences.append({"path": "{0}/{1}".format(path, key) if path else key, "change": "extra"})
 
-    return new_extensions
+    if len(differences) == found:
+        differences.append({"path": path, "change": "reordered"})
 
+    return differences
 
-def upload_master_data_to_data_matching(token, target_queues, file, matching_code_column, entity):
+
+def get_drift_targets(targets, token, template_dict):
 
     """
-    Upload sample data to data matching database.
-    :param token: Token of the organization where data should be uploaded.
-    :param target_queues: List of where the master data should be uploaded.
-    :param file: Master data to be uploaded - in JSON format.
-    :param matching_code_column: Primary key of the master data, required when uploading.
-    :param entity: The entity name of the data - (Purchase Orders, Suppliers, etc.)
-    :return: Dict representing the response
+    Resolve the organizations compared with the template.
+    :param targets: "all" for all organizations visible to the token, or comma separated IDs or URLs
+    :param token: Auth token from the primary organization of the organization group admin.
+    :param template_dict: Dict representing the template organization, never compared with itself.
+    :return: List of dicts with the "id" and "url" of the organizations
     """
 
-    login_to_data_matching_with_token(token)
+    if targets == "all":
+        organizations = [{"id": organization["id"], "url": organization["url"]}
+                         for organization in iterate_paginated("{0}/organizations".format(API_URL), token,
+                                                               description="Fetching organizations")]
+    else:
+        organizations = [{"id": url.rstrip("/").split("/")[-1], "url": url} for url in
+                         (get_object_url("organizations", target) for target in targets.split(",") if target.strip())]
+
+    return [organization for organization in organizations if organization["url"] != template_dict["url"]]
 
-    files = [('files', ('master_data.json', json.dumps(file), 'application/json'))]
 
-    payload = {
-            "encoding": "utf-8",
-            "queues": target_queues,
-            "matching_code_column": matching_code_column,
-            "dataset": entity
-    }
+def diff_organizations(template_dict, targets, token, workers=8):
 
-    cookies = {"session": HTTP_COOKIE}
+    """
+    Compare the setup of many organizations with the template, workers organizations at once. The template is
+    read and hashed only once and only the drift reports of the compared organizations are kept.
+    :param template_dict: Dict representing the template organization
+    :param targets: List of dicts with the "id" and "url" of the compared organizations
+    :param token: Auth token from the primary organization of the organization group admin.
+    :param workers: Number of organizations compared concurrently.
+    :return: List of drift reports, dicts with the "organization" URL, its "name", the list of "differences"
+    and the "error" which prevented the comparison
+    """
 
-    response = requests.post("https://data-matching.elis.rossum.ai/api/v1/import",
-                             files=files,
-                             data=payload,
-                             cookies=cookies)
+    template_tree = hash_tree(normalize_organization_setup(load_organization_setup(template_dict, token)))
+
+    def compare(target):
+
+        report = {"organization": target["url"], "name": None, "differences": [], "error": None}
+
+        try:
+            with INSTRUMENTATION.span("diff organization", organization=target["url"]):
+                target_token = CREDENTIALS.membership_token(target["url"], token)
+                response = HTTP_CLIENT.get(target["url"], token=target_token)
+                response.raise_for_status()
+                report["name"] = response.json().get("name")
+                tree = hash_tree(normalize_organization_setup(load_organization_setup(target, target_token)))
+                report["differences"] = diff_hash_trees(template_tree, tree)
+        except Exception as e:
+            report["error"] = str(e)
+
+        if report["error"]:
+            print("Comparing organization '{0}' with the template - ERROR: {1}".format(report["name"] or target["url"],
+                                                                                       report["error"]))
+        elif report["differences"]:
+            print("Comparing organization '{0}' with the template - DRIFT, {1} difference(s)".format(
+                report["name"], len(report["differences"])))
+        else:
+            print("Comparing organization '{0}' with the template - OK".format(report["name"]))
 
-    if response.status_code == 200:
-        print("Uploading data to data matching - OK")
-    else:
-        print("Uploading data to data matching - ERROR")
+        return report
 
-    return response.json()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(compare, targets))
 
 
-def login_to_data_matching_with_token(token):
+def print_drift_report(reports, max_differences=20):
 
     """
-    Login to the Data Matching API. User has to be logged in when using other endpoints.
-    The Data Matching currently uses session cookie authentication. Therefore global Cookie is set.
-    :param token: auth token provided by the Rossum API /login endpoint - https://api.elis.rossum.ai/docs/#login
-    :return: dict with the API response
+    Print the drifted organizations with their differences from the template.
+    :param reports: Drift reports returned by diff_organizations
+    :param max_differences: Number of differences printed per organization.
+    :return: None
     """
 
-    headers = {"Authorization": "Token {0}".format(token)}
-    session = requests.Session()
-    response = session.post("https://data-matching.elis.rossum.ai/api/v1/auth/token_login", headers=headers)
+    drifted = [report for report in reports if report["differences"]]
+    failed = [report for report in reports if report["error"]]
 
-    global HTTP_COOKIE
-
-    HTTP_COOKIE = session.cookies.get_dict()["session"]
-
-    if response.status_code == 200:
-        print("Logging in to data matching - OK")
-    else:
-        print("Logging in to data matching - ERROR")
+    print("Drift report - {0} organization(s) compared, {1} drifted, {2} failed".format(len(reports), len(drifted),
+                                                                                       len(failed)))
 
-    print(response.text)
+    for report in drifted:
+        print("  {0} ({1})".format(report["name"], report["organization"]))
+        for difference in report["differences"][:max_differences]:
+            print("    {0:<9} {1}".format(difference["change"], difference["path"]))
+        if len(report["differences"]) > max_differences:
+            print("    ... {0} more".format(len(report["differences"]) - max_differences))
 
-    return response.json()
+    for report in failed:
+        print("  {0} - ERROR: {1}".format(report["organization"], report["error"]))
 
 
-def upload_document(filename, content, queue_id, token):
+def print_failure_summary(failures):
 
     """
-    Upload a document to a specific queue in the new organization
-    :param filename: Filename to be uploaded.
-    :param content: Content of the new file.
-    :param queue_id: Queue where the file should be uploaded.
-    :param token: Authentication token to the new organization.
-    :return: Dict representing the new annotation
+    Print everything that failed during the run, so the failures do not get lost in the progress output.
+    :param failures: List of (description of what failed, error) tuples
     """
 
-    headers = {"Authorization": "token {0}".format(token)}
-
-    response = requests.post("https://api.elis.rossum.ai/v1/queues/{0}/upload/{1}".format(queue_id, filename),
-                             data=content,
-                             headers=headers)
-
-    if response.status_code == 201:
-        print("Uploading new document - OK")
-    else:
-        print("Uploading new document - ERROR")
+    print("Finished with {0} failure(s)".format(len(failures)))
 
-    return response.json()
+    for what, error in failures:
+        print("  {0} - ERROR: {1}".format(what, error))
 
 
 def get_parser():
@@ -551,6 +4099,153 @@ def get_parser():
     arg_parser.add_argument('--create_key', help='Create key for creating new organizations in organization group.',
                             metavar="create_key", type=str)
     arg_parser.add_argument('--token', help='Token gained after logging to the Rossum API', metavar="token", type=str)
+    arg_parser.add_argument('--pool_size', help='Maximum number of kept-alive connections per host.',
+                            metavar="pool_size", type=int, default=32)
+    arg_parser.add_argument('--connect_timeout', help='Connect timeout of every request in seconds.',
+                            metavar="connect_timeout", type=float, default=10)
+    arg_parser.add_argument('--read_timeout', help='Read timeout of every request in seconds.',
+                            metavar="read_timeout", type=float, default=300)
+    arg_parser.add_argument('--metadata_workers', help='Number of threads fetching document metadata.',
+                            metavar="metadata_workers", type=int, default=4)
+    arg_parser.add_argument('--download_workers', help='Number of threads downloading original documents.',
+                            metavar="download_workers", type=int, default=8)
+    arg_parser.add_argument('--upload_workers', help='Number of threads uploading documents.',
+                            metavar="upload_workers", type=int, default=8)
+    arg_parser.add_argument('--max_pending', help='Maximum number of documents waiting between two copy stages.',
+                            metavar="max_pending", type=int, default=8)
+    arg_parser.add_argument('--spool_threshold', help='Size in bytes above which originals downloaded without '
+                                                      'the originals cache (the async engine or --blob_cache_size 0) '
+                                                      'are spooled to disk.',
+                            metavar="spool_threshold", type=int, default=SPOOL_THRESHOLD)
+    arg_parser.add_argument('--page_size', help='Number of objects fetched per request from list endpoints, '
+                                                'at most {0}.'.format(PAGE_SIZE),
+                            metavar="page_size", type=int, default=PAGE_SIZE)
+    arg_parser.add_argument('--max_workers', help='Maximum number of objects (workspaces, schemas, queues, hooks) '
+                                                  'created concurrently.',
+                            metavar="max_workers", type=int, default=8)
+    arg_parser.add_argument('--schema_deduplication', help='How queues sharing a schema are copied: "url" creates '
+                                                           'each source schema once, "content" also merges schemas '
+                                                           'with equal content, "off" creates one schema per queue.',
+                            choices=SchemaCache.MODES, default="url")
+    arg_parser.add_argument('--batch', help='CSV or JSON file with organizations (org_name, username, email, '
+                                            'password) to be created from one snapshot of the template.',
+                            metavar="batch", type=str)
+    arg_parser.add_argument('--batch_workers', help='Number of organizations created at once in batch mode.',
+                            metavar="batch_workers", type=int, default=4)
+    arg_parser.add_argument('--max_requests', help='Maximum number of requests in flight per host. The actual limit '
+                                                   'adapts to API throttling up to this value.',
+                            metavar="max_requests", type=int, default=64)
+    arg_parser.add_argument('--max_retries', help='Maximum number of retries of a failed or throttled request.',
+                            metavar="max_retries", type=int, default=5)
+    arg_parser.add_argument('--snapshot_dir', help='Directory where the batch mode keeps downloaded originals, '
+                                                   'a temporary directory is used and removed by default.',
+                            metavar="snapshot_dir", type=str)
+    arg_parser.add_argument('--export_snapshot', help='Only export the template organization into this directory.',
+                            metavar="export_snapshot", type=str)
+    arg_parser.add_argument('--import_snapshot', help='Create the organization(s) from this exported snapshot '
+                                                      'instead of reading the template organization.',
+                            metavar="import_snapshot", type=str)
+    arg_parser.add_argument('--journal', help='SQLite file recording every copied object and uploaded document, '
+                                              'needed for --resume and --sync.',
+                            metavar="journal", type=str)
+    arg_parser.add_argument('--resume', help='Continue an interrupted copy recorded in the journal, finished work '
+                                             'is skipped.', action="store_true")
+    arg_parser.add_argument('--sync', help='Continue a copy recorded in the journal and update the objects changed '
+                                           'in the template since the last run.', action="store_true")
+    arg_parser.add_argument('--annotation_status', help='Comma separated statuses of annotations to be copied, '
+                                                        'e.g. "to_review,confirmed".',
+                            metavar="annotation_status", type=str)
+    arg_parser.add_argument('--annotation_queues', help='Comma separated IDs of template queues whose annotations '
+                                                        'are copied.',
+                            metavar="annotation_queues", type=str)
+    arg_parser.add_argument('--arrived_after', help='Copy only annotations arrived after this date (ISO 8601).',
+                            metavar="arrived_after", type=str)
+    arg_parser.add_argument('--arrived_before', help='Copy only annotations arrived before this date (ISO 8601).',
+                            metavar="arrived_before", type=str)
+    arg_parser.add_argument('--max_per_queue', help='Maximum number of annotations copied from each queue.',
+                            metavar="max_per_queue", type=int)
+    arg_parser.add_argument('--sample_seed', help='Seed of a random sample of --max_per_queue annotations, '
+                                                  'the most recent ones are copied without it.',
+                            metavar="sample_seed", type=str)
+    arg_parser.add_argument('--blob_cache', help='Directory caching downloaded originals across runs, '
+                                                 'a temporary cache for this run is used by default.',
+                            metavar="blob_cache", type=str)
+    arg_parser.add_argument('--blob_cache_size', help='Maximum size of the originals cache in bytes, the least '
+                                                      'recently used originals are evicted above it. 0 copies the '
+                                                      'originals of a single organization without the cache.',
+                            metavar="blob_cache_size", type=int, default=10 * 1024 ** 3)
+    arg_parser.add_argument('--metrics_summary', help='Print the timing of requests per endpoint and of the copy '
+                                                      'phases at the end.', action="store_true")
+    arg_parser.add_argument('--metrics_file', help='Write every request and phase with its timing to this file '
+                                                   'as JSON lines.', metavar="metrics_file", type=str)
+    arg_parser.add_argument('--trace_file', help='Write the requests and phases to this file as an OpenTelemetry '
+                                                 'trace (OTLP JSON).', metavar="trace_file", type=str)
+    arg_parser.add_argument('--engine', help='"threads" copies with blocking requests in thread pools, "async" '
+                                             'with asyncio and aiohttp, thousands of requests at once. The async '
+                                             'engine copies a single organization only.',
+                            metavar="engine", type=str, choices=("threads", "async"), default="threads")
+    arg_parser.add_argument('--async_limits', help='Maximum number of requests in flight per endpoint class of the '
+                                                   'async engine, e.g. "read=256,write=64,upload=128".',
+                            metavar="async_limits", type=str)
+    arg_parser.add_argument('--async_max_pending', help='Maximum number of documents copied at once by the async '
+                                                        'engine.', metavar="async_max_pending", type=int, default=1000)
+    arg_parser.add_argument('--async_max_memory', help='Maximum total size in bytes of the originals the async engine '
+                                                       'keeps in memory, the rest are spooled to disk.',
+                            metavar="async_max_memory", type=int, default=256 * 1024 * 1024)
+    arg_parser.add_argument('--master_data', help='JSON, NDJSON or CSV file with master data uploaded to data '
+                                                  'matching for all queues of the new organization.',
+                            metavar="master_data", type=str)
+    arg_parser.add_argument('--master_data_entity', help='Dataset name of the master data, e.g. "Suppliers".',
+                            metavar="master_data_entity", type=str)
+    arg_parser.add_argument('--matching_code_column', help='Primary key column of the master data.',
+                            metavar="matching_code_column", type=str)
+    arg_parser.add_argument('--master_data_chunk_size', help='Maximum size of one uploaded master data chunk in '
+                                                             'bytes.',
+                            metavar="master_data_chunk_size", type=int, default=8 * 1024 * 1024)
+    arg_parser.add_argument('--master_data_workers', help='Number of master data chunks uploaded concurrently.',
+                            metavar="master_data_workers", type=int, default=4)
+    arg_parser.add_argument('--credential_cache', help='File keeping the issued tokens and sessions encrypted for '
+                                                       'later runs, the passphrase is read from the '
+                                                       'CREDENTIAL_CACHE_PASSPHRASE environment variable.',
+                            metavar="credential_cache", type=str)
+    arg_parser.add_argument('--plan', help='Only read the template and print how many objects, bytes and requests '
+                                           'the copy takes and how long it should run. Nothing is created.',
+                            action="store_true")
+    arg_parser.add_argument('--plan_latency', help='Request latency in seconds used by --plan, the median latency of '
+                                                   'the requests sent while planning by default.',
+                            metavar="plan_latency", type=float)
+    arg_parser.add_argument('--plan_bandwidth', help='Transfer speed of the originals in bytes per second used by '
+                                                     '--plan.',
+                            metavar="plan_bandwidth", type=float, default=10 * 1024 ** 2)
+    arg_parser.add_argument('--template', help='Metadata ID of the template organization to copy.',
+                            metavar="template", type=str, default=TEMPLATE_ID)
+    arg_parser.add_argument('--org_index', help='JSON file indexing the template organizations, so later runs find '
+                                                'the template with one request instead of listing all organizations.',
+                            metavar="org_index", type=str)
+    arg_parser.add_argument('--memberships', help='Sync memberships of users in organizations with a CSV matrix '
+                                                  '(users in rows, organizations in columns) or a JSON file mapping '
+                                                  'users to their organizations, instead of copying.',
+                            metavar="memberships", type=str)
+    arg_parser.add_argument('--org_group_id', help='ID of the organization group of the synced memberships.',
+                            metavar="org_group_id", type=int)
+    arg_parser.add_argument('--membership_workers', help='Number of memberships created or removed concurrently.',
+                            metavar="membership_workers", type=int, default=16)
+    arg_parser.add_argument('--keep_memberships', help='Only create the missing memberships, remove none.',
+                            action='store_true')
+    arg_parser.add_argument('--diff', help='Compare the setup of organizations with the template and report their drift '
+                                           'instead of copying: "all" or comma separated organization IDs.',
+                            metavar="diff", type=str)
+    arg_parser.add_argument('--diff_workers', help='Number of organizations compared concurrently.',
+                            metavar="diff_workers", type=int, default=8)
+    arg_parser.add_argument('--diff_report', help='Write the full drift report to this JSON file.',
+                            metavar="diff_report", type=str)
+    arg_parser.add_argument('--propagate', help='Update the organizations recorded in --journal with the changes of the '
+                                                'template schemas, queues and extensions since they were copied, '
+                                                'instead of copying.',
+                            action='store_true')
+    arg_parser.add_argument('--propagate_workers', help='Number of organizations updated concurrently by --propagate, '
+                                                        'each updates --max_workers objects at once.',
+                            metavar="propagate_workers", type=int, default=8)
 
     # other arguments here ...
     return arg_parser
@@ -562,43 +4257,357 @@ if __name__ == '__main__':
     parser = get_parser()
     args = parser.parse_args()
 
+    configure_http_client(args.pool_size, (args.connect_timeout, args.read_timeout), args.max_requests,
+                          args.max_retries)
+    SPOOL_THRESHOLD = args.spool_threshold
+    INSTRUMENTATION.keep_records = bool(args.metrics_file or args.trace_file)
+    LIST_PAGE_SIZE = args.page_size
+
     master_org_token = args.token
 
-    organizations = get_all_organizations(master_org_token)
+    if args.credential_cache:
+        if not os.environ.get("CREDENTIAL_CACHE_PASSPHRASE"):
+            parser.error("--credential_cache requires the CREDENTIAL_CACHE_PASSPHRASE environment variable")
+        CREDENTIALS = CredentialCache(args.credential_cache, os.environ["CREDENTIAL_CACHE_PASSPHRASE"])
+
+    CREATE_KEY = args.create_key
+
+    annotation_selection = {
+        "status": args.annotation_status.split(",") if args.annotation_status else None,
+        "queues": args.annotation_queues.split(",") if args.annotation_queues else None,
+        "arrived_after": args.arrived_after,
+        "arrived_before": args.arrived_before,
+        "max_per_queue": args.max_per_queue,
+        "seed": args.sample_seed
+    }
+
+    master_data_org = None
+    run_failures = []
 
-    master_data_org = get_master_data_organization(organizations)
+    originals_cache = BlobCache(args.blob_cache, max_bytes=args.blob_cache_size) if args.blob_cache else None
 
-    workspaces = get_all_workspaces(master_data_org, master_org_token)
-    queues = get_all_queues(master_data_org, master_org_token)
-    extensions = get_all_extensions(master_data_org, master_org_token)
-    annotations = get_all_annotations(master_data_org, master_org_token)
+    if args.master_data and not (args.master_data_entity and args.matching_code_column):
+        parser.error("--master_data requires --master_data_entity and --matching_code_column")
 
-    CREATE_KEY = args.create_key
-    ORG_NAME = args.org_name
-    USERNAME = args.username
-    EMAIL = args.email
-    PASSWORD = args.password
+    if args.master_data and (args.engine == "async" or args.batch or args.import_snapshot or args.export_snapshot):
+        parser.error("--master_data is supported only when copying a single organization with the threads engine")
+
+    if args.plan and (args.engine == "async" or args.batch or args.import_snapshot or args.export_snapshot):
+        parser.error("--plan estimates copying a single organization with the threads engine")
+
+    if args.diff and (args.engine == "async" or args.batch or args.import_snapshot or args.export_snapshot):
+        parser.error("--diff only compares organizations, it cannot be combined with copying")
+
+    if args.propagate and not args.journal:
+        parser.error("--propagate requires the --journal of the copies")
+
+    if args.propagate and (args.engine == "async" or args.batch or args.import_snapshot or args.export_snapshot):
+        parser.error("--propagate only updates copied organizations, it cannot be combined with copying")
+
+    if not 1 <= args.page_size <= PAGE_SIZE:
+        parser.error("--page_size must be between 1 and {0}".format(PAGE_SIZE))
+
+    if args.blob_cache and args.blob_cache_size == 0:
+        parser.error("--blob_cache_size 0 disables the originals cache, it cannot be combined with --blob_cache")
+
+    if args.memberships and args.org_group_id is None:
+        parser.error("--memberships requires --org_group_id")
+
+    if args.engine == "async" and not args.memberships:
 
-    organization = create_organization(CREATE_KEY, ORG_NAME, USERNAME, EMAIL, PASSWORD)
+        unsupported = [option for option in ("import_snapshot", "export_snapshot", "batch", "journal",
+                                             "max_per_queue", "blob_cache") if getattr(args, option)]
 
-    new_org_token = login_to_specific_organization("https://api.elis.rossum.ai/v1/organizations/{0}".format(organization["id"]),
-                                                   master_org_token)
+        if unsupported:
+            parser.error("--{0} is not supported by the async engine".format(unsupported[0]))
 
-    workspaces_mapping = create_workspaces("https://api.elis.rossum.ai/v1/organizations/{0}".format(organization["id"]),
-                                           new_org_token,
-                                           workspaces_list=workspaces)
+        try:
+            import orgs_deep_copy_async
+        except ImportError:
+            parser.error('The async engine requires aiohttp, install it with "pip install aiohttp"')
 
-    print("Workspaces mapping")
-    print(workspaces_mapping)
+    elif not (args.import_snapshot or args.memberships):
 
-    queues_mapping = create_queues(workspaces_mapping, new_org_token, master_org_token, queues_list=queues)
+        with INSTRUMENTATION.span("find template"):
+            master_data_org = find_template_organization(
+                master_org_token, args.template, index=OrganizationIndex(args.org_index) if args.org_index else None)
 
-    print("Queues mapping")
-    print(queues_mapping)
+        if master_data_org is None:
+            raise SystemExit("Template organization '{0}' not found".format(args.template))
 
-    extensions = create_extensions(queues_mapping, extensions, new_org_token, organization["users"][0])
+    if args.memberships:
 
-    annotations = get_all_annotations(master_data_org, master_org_token)
+        membership_users, membership_organizations, required_memberships = read_membership_matrix(args.memberships)
 
-    create_annotations(queues_mapping, annotations, new_org_token, master_org_token)
+        with INSTRUMENTATION.span("sync memberships", memberships=len(required_memberships)):
+            membership_result = sync_memberships(membership_users, membership_organizations, required_memberships,
+                                                 args.org_group_id, master_org_token,
+                                                 workers=args.membership_workers, remove=not args.keep_memberships)
 
+        run_failures.extend(("{0} membership of {1} in {2}".format(action.capitalize(), user_url, organization_url), e)
+                            for action, user_url, organization_url, e in membership_result["failures"])
+
+    elif args.diff:
+
+        with INSTRUMENTATION.span("diff organizations"):
+            drift_reports = diff_organizations(master_data_org, get_drift_targets(args.diff, master_org_token,
+                                                                                  master_data_org),
+                                               master_org_token, workers=args.diff_workers)
+
+        print_drift_report(drift_reports)
+
+        if args.diff_report:
+            write_json_file(args.diff_report, drift_reports)
+
+    elif args.propagate:
+
+        with INSTRUMENTATION.span("propagate template changes"):
+            propagate_results = propagate_template_changes(master_data_org, master_org_token, args.journal,
+                                                           org_workers=args.propagate_workers,
+                                                           max_workers=args.max_workers)
+
+        for target, result in propagate_results.items():
+            if isinstance(result, Exception):
+                run_failures.append(("Propagating template changes to '{0}'".format(target), result))
+            else:
+                run_failures.extend(("Propagating {0} {1} to '{2}'".format(kind, source_url, target), e)
+                                    for kind, source_url, e in result["failures"])
+
+    elif args.plan:
+
+        with INSTRUMENTATION.span("plan"):
+            copy_plan = plan_organization_copy(master_data_org, master_org_token, selection=annotation_selection,
+                                               schema_deduplication=args.schema_deduplication,
+                                               metadata_workers=args.metadata_workers,
+                                               find_requests=sent_requests(),
+                                               cached_originals=args.blob_cache_size != 0)
+
+        plan_latency = args.plan_latency or measured_latency() or 0.1
+
+        print_plan(copy_plan,
+                   estimate_copy_duration(copy_plan, plan_latency, args.plan_bandwidth,
+                                          max_workers=args.max_workers,
+                                          metadata_workers=args.metadata_workers,
+                                          download_workers=args.download_workers,
+                                          upload_workers=args.upload_workers),
+                   plan_latency, args.plan_bandwidth)
+
+    elif args.engine == "async":
+
+        annotation_filters = {}
+
+        if args.annotation_status:
+            annotation_filters["status"] = args.annotation_status
+        if args.annotation_queues:
+            annotation_filters["queue"] = args.annotation_queues
+        if args.arrived_after:
+            annotation_filters["arrived_at_after"] = args.arrived_after
+        if args.arrived_before:
+            annotation_filters["arrived_at_before"] = args.arrived_before
+
+        async_limits = dict(limit.split("=") for limit in args.async_limits.split(",")) if args.async_limits else {}
+
+        with INSTRUMENTATION.span("async copy"):
+            workspaces_mapping, queues_mapping, async_failures = orgs_deep_copy_async.run_deep_copy(
+                master_org_token, CREATE_KEY, args.org_name, args.username, args.email, args.password,
+                annotation_filters=annotation_filters,
+                schema_deduplication=args.schema_deduplication,
+                max_pending=args.async_max_pending,
+                template_id=args.template,
+                client_options={"api_url": API_URL,
+                                "data_matching_url": DATA_MATCHING_URL,
+                                "limits": {key: int(value) for key, value in async_limits.items()},
+                                "timeout": (args.connect_timeout, args.read_timeout),
+                                "max_retries": args.max_retries,
+                                "page_size": LIST_PAGE_SIZE,
+                                "instrumentation": INSTRUMENTATION,
+                                "spool_threshold": SPOOL_THRESHOLD,
+                                "max_spooled_bytes": args.async_max_memory})
+
+        # Objects of the setup fail under their (kind, source URL), documents under their annotation.
+        run_failures.extend(("Copying {0} {1}".format(*failed) if isinstance(failed, tuple)
+                             else "Copying document of {0}".format(failed["url"]), e) for failed, e in async_failures)
+
+        print("Workspaces mapping")
+        print(workspaces_mapping)
+
+        print("Queues mapping")
+        print(queues_mapping)
+
+    elif args.import_snapshot:
+
+        org_specs = load_org_specs(args.batch) if args.batch else [
+            {"org_name": args.org_name, "username": args.username, "email": args.email, "password": args.password}]
+
+        template_snapshot = load_template_snapshot(args.import_snapshot)
+
+        with INSTRUMENTATION.span("create organizations", organizations=len(org_specs)):
+            batch_results = create_organizations_from_snapshot(
+                template_snapshot,
+                os.path.join(args.import_snapshot, SNAPSHOT_ORIGINALS_DIR),
+                org_specs, CREATE_KEY, master_org_token,
+                batch_workers=args.batch_workers,
+                max_workers=args.max_workers,
+                upload_workers=args.upload_workers,
+                schema_deduplication=args.schema_deduplication,
+                journal_path=args.journal,
+                resume=args.resume,
+                sync=args.sync)
+
+        print("Import results")
+        print(batch_results)
+
+        for org_name, result in batch_results.items():
+            if isinstance(result, Exception):
+                run_failures.append(("Creating organization '{0}'".format(org_name), result))
+            elif result["failures"]:
+                run_failures.append(("Creating organization '{0}'".format(org_name),
+                                     "{0} object(s) or document(s) not copied".format(result["failures"])))
+
+    elif args.export_snapshot:
+
+        with INSTRUMENTATION.span("export snapshot"):
+            export_template_snapshot(master_data_org, master_org_token, args.export_snapshot,
+                                     metadata_workers=args.metadata_workers,
+                                     download_workers=args.download_workers,
+                                     max_pending=args.max_pending,
+                                     selection=annotation_selection,
+                                     blob_cache=originals_cache)
+
+    elif args.batch:
+
+        org_specs = load_org_specs(args.batch)
+
+        snapshot_dir = args.snapshot_dir or tempfile.mkdtemp(prefix="template_snapshot_")
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+        try:
+            with INSTRUMENTATION.span("take snapshot"):
+                template_snapshot = take_template_snapshot(master_data_org, master_org_token, snapshot_dir,
+                                                           metadata_workers=args.metadata_workers,
+                                                           download_workers=args.download_workers,
+                                                           max_pending=args.max_pending,
+                                                           selection=annotation_selection,
+                                                           blob_cache=originals_cache)
+
+            with INSTRUMENTATION.span("create organizations", organizations=len(org_specs)):
+                batch_results = create_organizations_from_snapshot(template_snapshot, snapshot_dir, org_specs,
+                                                                   CREATE_KEY, master_org_token,
+                                                                   batch_workers=args.batch_workers,
+                                                                   max_workers=args.max_workers,
+                                                                   upload_workers=args.upload_workers,
+                                                                   schema_deduplication=args.schema_deduplication,
+                                                                   journal_path=args.journal,
+                                                                   resume=args.resume,
+                                                                   sync=args.sync)
+        finally:
+            if args.snapshot_dir is None:
+                shutil.rmtree(snapshot_dir)
+
+        print("Batch results")
+        print(batch_results)
+
+        for org_name, result in batch_results.items():
+            if isinstance(result, Exception):
+                run_failures.append(("Creating organization '{0}'".format(org_name), result))
+            elif result["failures"]:
+                run_failures.append(("Creating organization '{0}'".format(org_name),
+                                     "{0} object(s) or document(s) not copied".format(result["failures"])))
+
+    else:
+
+        with INSTRUMENTATION.span("list template"):
+            workspaces = get_all_workspaces(master_data_org, master_org_token)
+            queues = get_all_queues(master_data_org, master_org_token)
+            extensions = get_all_extensions(master_data_org, master_org_token)
+            schemas = get_schemas(sorted({queue["schema"] for queue in queues}), master_org_token)
+
+        ORG_NAME = args.org_name
+        USERNAME = args.username
+        EMAIL = args.email
+        PASSWORD = args.password
+
+        journal = CopyJournal(args.journal, ORG_NAME) if args.journal else None
+
+        with INSTRUMENTATION.span("create organization"):
+            organization = get_or_create_organization(CREATE_KEY, ORG_NAME, USERNAME, EMAIL, PASSWORD,
+                                                      journal=journal, resume=args.resume or args.sync)
+
+            new_org_token = CREDENTIALS.membership_token(
+                "{0}/organizations/{1}".format(API_URL, organization["id"]), master_org_token)
+
+        with INSTRUMENTATION.span("copy setup"):
+            workspaces_mapping, queues_mapping, extensions, setup_failures = copy_organization_setup(
+                "{0}/organizations/{1}".format(API_URL, organization["id"]),
+                new_org_token,
+                master_org_token,
+                workspaces_list=workspaces,
+                queues_list=queues,
+                extensions_list=extensions,
+                user_url=organization["users"][0],
+                max_workers=args.max_workers,
+                schema_deduplication=args.schema_deduplication,
+                schemas=schemas,
+                journal=journal,
+                sync=args.sync)
+
+        run_failures.extend(("Copying {0} {1}".format(kind, source_url), e)
+                            for (kind, source_url), e in setup_failures.items())
+
+        print("Workspaces mapping")
+        print(workspaces_mapping)
+
+        print("Queues mapping")
+        print(queues_mapping)
+
+        # Without the cache every original is downloaded for each of its documents and spooled by itself.
+        if originals_cache is not None or args.blob_cache_size == 0:
+            run_cache = originals_cache
+        else:
+            run_cache = BlobCache(tempfile.mkdtemp(prefix="originals_cache_"), max_bytes=args.blob_cache_size,
+                                  persistent=False)
+
+        try:
+            with INSTRUMENTATION.span("copy documents"):
+                # The annotations are listed page by page while their documents are being copied.
+                annotations = select_annotations(master_data_org, master_org_token, **annotation_selection)
+                document_failures = create_annotations(queues_mapping, annotations, new_org_token,
+                                                       master_org_token,
+                                                       metadata_workers=args.metadata_workers,
+                                                       download_workers=args.download_workers,
+                                                       upload_workers=args.upload_workers,
+                                                       max_pending=args.max_pending,
+                                                       journal=journal,
+                                                       blob_cache=run_cache)
+        finally:
+            if run_cache is not None and run_cache is not originals_cache:
+                run_cache.close()
+                shutil.rmtree(run_cache.directory)
+
+        run_failures.extend(("Copying document ({0})".format(stage), e) for stage, _, e in document_failures)
+
+        if args.master_data:
+            with INSTRUMENTATION.span("upload master data"):
+                _, master_data_failures = upload_master_data_file(
+                    new_org_token, [queue_url.split("/")[-1] for queue_url in queues_mapping.values()],
+                    args.master_data, args.matching_code_column, args.master_data_entity,
+                    max_chunk_bytes=args.master_data_chunk_size, workers=args.master_data_workers)
+
+            run_failures.extend(("Uploading master data chunk {0}".format(number), e)
+                                for number, e in master_data_failures)
+
+    if originals_cache is not None:
+        originals_cache.close()
+
+    if args.metrics_summary:
+        INSTRUMENTATION.print_summary()
+
+    if args.metrics_file:
+        INSTRUMENTATION.write_jsonl(args.metrics_file)
+
+    if args.trace_file:
+        INSTRUMENTATION.write_trace(args.trace_file)
+
+    if run_failures:
+        print_failure_summary(run_failures)
+        sys.exit(1)
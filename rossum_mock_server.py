@@ -0,0 +1,733 @@
+import argparse
+import hashlib
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+API_PATH = "/v1"
+DATA_MATCHING_PATH = "/data-matching/api/v1"
+
+# Largest page size the mock serves, the same as the Rossum API.
+MAX_PAGE_SIZE = 100
+
+KINDS = ("organizations", "users", "workspaces", "queues", "schemas", "hooks", "documents", "annotations",
+         "memberships")
+
+ANNOTATION_STATUSES = ("to_review", "confirmed", "exported")
+
+
+class MockStore(object):
+
+    """
+    In-memory state of the mock API. Objects of every kind are kept as dicts by their ID, exactly as the API
+    returns them. Originals are not stored, their content is generated from the s3_name on every download,
+    so templates with many thousands of documents take almost no memory.
+    """
+
+    def __init__(self, base_url):
+
+        """
+        :param base_url: URL prefix of the API, used to build the URLs of the objects.
+        """
+
+        self.base_url = base_url
+        self.objects = {kind: {} for kind in KINDS}
+        self.original_sizes = {}
+        self.tokens = {}
+        self.token_issued_at = {}
+        self.sessions = set()
+        self.imports = []
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def add(self, kind, data):
+
+        """
+        Store a new object of the given kind.
+        :param kind: Kind of the object, e.g. "queues"
+        :param data: Dict with the attributes of the object
+        :return: Dict representing the stored object, with id and url
+        """
+
+        with self.lock:
+            object_id = next(self._ids)
+            data["id"] = object_id
+            data["url"] = "{0}/{1}/{2}".format(self.base_url, kind, object_id)
+            self.objects[kind][object_id] = data
+
+        return data
+
+    def get(self, kind, object_id):
+        return self.objects[kind].get(object_id)
+
+    def issue_token(self, organization_url):
+
+        """
+        Issue a new token bound to the organization, objects created with it belong to that organization.
+        :param organization_url: URL of the organization
+        :return: Token
+        """
+
+        token = hashlib.sha1("{0}-{1}".format(organization_url, random.random()).encode()).hexdigest()
+
+        with self.lock:
+            self.tokens[token] = organization_url
+            self.token_issued_at[token] = time.time()
+
+        return token
+
+    def add_original(self, s3_name, size):
+        self.original_sizes[s3_name] = size
+
+    def original_content(self, s3_name):
+
+        """
+        Generate the content of an original, the same bytes for the same s3_name every time.
+        :param s3_name: Name of the original
+        :return: bytes
+        """
+
+        size = self.original_sizes[s3_name]
+        seed = hashlib.sha256(s3_name.encode()).digest()
+
+        return (seed * (size // len(seed) + 1))[:size]
+
+
+def populate_template(store, queues=10, documents=100, workspaces=None, schemas=None, hooks=None,
+                      distinct_originals=None, original_size=32 * 1024, username="admin", password="admin"):
+
+    """
+    Create a synthetic template organization, marked up with the "master_data_organization" metadata id.
+    Queues are spread evenly over workspaces, schemas and hooks, documents evenly over queues.
+    :param store: MockStore
+    :param queues: Number of queues
+    :param documents: Number of documents, each with one annotation.
+    :param workspaces: Number of workspaces, one per ten queues by default.
+    :param schemas: Number of schemas, one per queue by default.
+    :param hooks: Number of hooks, one per ten queues by default.
+    :param distinct_originals: Number of distinct originals the documents share, one per document by default.
+    :param original_size: Size of every original in bytes.
+    :param username: Username of the template admin.
+    :param password: Password of the template admin.
+    :return: Dict representing the template organization
+    """
+
+    workspaces = workspaces or max(1, queues // 10)
+    schemas = schemas or queues
+    hooks = hooks if hooks is not None else max(1, queues // 10)
+    distinct_originals = distinct_originals or documents
+
+    user = store.add("users", {"username": username, "password": password, "organization": None})
+    organization = store.add("organizations", {"name": "Template",
+                                               "metadata": {"id": "master_data_organization"},
+                                               "users": [user["url"]]})
+    user["organization"] = organization["url"]
+
+    workspace_list = [store.add("workspaces", {"name": "Workspace {0}".format(i),
+                                               "organization": organization["url"],
+                                               "metadata": {}})
+                      for i in range(workspaces)]
+
+    schema_list = [store.add("schemas", {"name": "Schema {0}".format(i),
+                                         "organization": organization["url"],
+                                         "content": [{"category": "section",
+                                                      "id": "basic_info",
+                                                      "label": "Basic information",
+                                                      "children": [{"category": "datapoint",
+                                                                    "id": "document_id_{0}".format(i),
+                                                                    "label": "Invoice number",
+                                                                    "type": "string"}]}]})
+                   for i in range(schemas)]
+
+    queue_list = [store.add("queues", {"name": "Queue {0}".format(i),
+                                       "organization": organization["url"],
+                                       "workspace": workspace_list[i % workspaces]["url"],
+                                       "schema": schema_list[i % schemas]["url"],
+                                       "metadata": {}})
+                  for i in range(queues)]
+
+    for i in range(hooks):
+        store.add("hooks", {"name": "Hook {0}".format(i),
+                            "type": "webhook",
+                            "organization": organization["url"],
+                            "queues": [queue["url"] for queue in queue_list[i::hooks]],
+                            "events": ["annotation_content.initialize"],
+                            "config": {"url": "https://example.com/hook/{0}".format(i)},
+                            "active": True,
+                            "metadata": {}})
+
+    arrived_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    for i in range(documents):
+
+        s3_name = "template-original-{0}".format(i % distinct_originals)
+        store.add_original(s3_name, original_size)
+
+        document = store.add("documents", {"s3_name": s3_name,
+                                           "original_file_name": "document_{0}.pdf".format(i),
+                                           "organization": organization["url"]})
+
+        store.add("annotations", {"document": document["url"],
+                                  "queue": queue_list[i % queues]["url"],
+                                  "organization": organization["url"],
+                                  "status": ANNOTATION_STATUSES[i % len(ANNOTATION_STATUSES)],
+                                  "arrived_at": (arrived_at + timedelta(minutes=i)).isoformat()})
+
+    return organization
+
+
+class MockRossumHandler(BaseHTTPRequestHandler):
+
+    """
+    Handler implementing the endpoints of the Rossum API and the Data Matching API used by the copy script.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body are written separately, without this every response waits for the delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data, headers=None):
+
+        body = json.dumps(data).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def send_bytes(self, status, body):
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        # HEAD gets the headers of GET, Content-Length included, without the body.
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def read_body(self):
+
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+
+            chunks = []
+
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+
+            return b"".join(chunks)
+
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def parse_body(self, body):
+
+        content_type = self.headers.get("Content-Type", "")
+
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}")
+
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+        return {}
+
+    def authenticated_organization(self):
+
+        authorization = self.headers.get("Authorization", "")
+
+        if not authorization.lower().startswith("token "):
+            return None
+
+        token = authorization.split(" ", 1)[1]
+        issued_at = self.server.store.token_issued_at.get(token)
+
+        # Tokens issued by populate_template callers directly never expire.
+        if self.server.token_lifetime and issued_at and time.time() - issued_at > self.server.token_lifetime:
+            return None
+
+        return self.server.store.tokens.get(token)
+
+    def handle_request(self, method):
+
+        server = self.server
+        parts = urlsplit(self.path)
+        body = self.read_body() if method in ("POST", "PATCH", "PUT") else b""
+        started = time.time()
+
+        if server.latency or server.latency_jitter:
+            time.sleep(server.latency + random.uniform(0, server.latency_jitter))
+
+        endpoint = "{0} {1}".format(method, re.sub(r"/\d+(?=/|$)", "/{id}", parts.path))
+
+        if server.throttle_rate and random.random() < server.throttle_rate:
+            server.record(endpoint, 429, started)
+            return self.send_json(429, {"detail": "Request was throttled."},
+                                  headers={"Retry-After": str(server.retry_after)})
+
+        if server.error_rate and random.random() < server.error_rate:
+            server.record(endpoint, 500, started)
+            return self.send_json(500, {"detail": "Internal server error."})
+
+        try:
+            if parts.path.startswith(DATA_MATCHING_PATH):
+                status = self.handle_data_matching(method, parts.path[len(DATA_MATCHING_PATH):].strip("/"), body)
+            elif parts.path.startswith(API_PATH):
+                status = self.handle_api(method, parts.path[len(API_PATH):].strip("/"), parts.query, body)
+            else:
+                status = self.send_json(404, {"detail": "Not found."})
+        except (KeyError, ValueError) as e:
+            status = self.send_json(400, {"detail": "Bad request: {0}".format(e)})
+
+        server.record(endpoint, status, started)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_HEAD(self):
+        self.handle_request("HEAD")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PATCH(self):
+        self.handle_request("PATCH")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+    def handle_data_matching(self, method, path, body):
+
+        store = self.server.store
+
+        if method == "POST" and path == "auth/token_login":
+
+            if self.authenticated_organization() is None:
+                self.send_json(401, {"detail": "Invalid token."})
+                return 401
+
+            session = hashlib.sha1(str(random.random()).encode()).hexdigest()
+
+            with store.lock:
+                store.sessions.add(session)
+
+            self.send_json(200, {"detail": "Logged in."}, headers={"Set-Cookie": "session={0}; Path=/".format(session)})
+            return 200
+
+        if method == "POST" and path == "import":
+
+            cookies = dict(cookie.strip().split("=", 1) for cookie in self.headers.get("Cookie", "").split(";")
+                           if "=" in cookie)
+
+            if cookies.get("session") not in store.sessions:
+                self.send_json(401, {"detail": "Not logged in."})
+                return 401
+
+            message = BytesParser().parsebytes(
+                "Content-Type: {0}\r\n\r\n".format(self.headers.get("Content-Type", "")).encode() + body)
+            form = {}
+
+            for part in message.get_payload():
+                form.setdefault(part.get_param("name", header="content-disposition"), []).append(
+                    part.get_payload(decode=True))
+
+            with store.lock:
+                store.imports.append({"dataset": (form.get("dataset") or [b""])[0].decode(),
+                                      "files": len(form.get("files") or []),
+                                      "bytes": sum(len(f) for f in form.get("files") or [])})
+
+            self.send_json(200, {"detail": "Import started."})
+            return 200
+
+        self.send_json(404, {"detail": "Not found."})
+        return 404
+
+    def handle_api(self, method, path, query, body):
+
+        store = self.server.store
+        segments = path.split("/")
+        data = self.parse_body(body)
+
+        if method == "POST" and path == "auth/login":
+
+            for user in store.objects["users"].values():
+                if user["username"] == data.get("username") and user.get("password") == data.get("password"):
+                    self.send_json(200, {"key": store.issue_token(user["organization"]), "domain": None})
+                    return 200
+
+            self.send_json(401, {"detail": "Unable to log in with provided credentials."})
+            return 401
+
+        organization_url = self.authenticated_organization()
+
+        if method == "POST" and path == "organizations/create":
+
+            user = store.add("users", {"username": data["user_email"], "password": data["user_password"],
+                                       "organization": None})
+            organization = store.add("organizations", {"name": data["organization_name"], "metadata": {},
+                                                       "users": [user["url"]]})
+            user["organization"] = organization["url"]
+
+            self.send_json(201, {"organization": organization, "key": store.issue_token(organization["url"])})
+            return 201
+
+        if organization_url is None:
+            self.send_json(401, {"detail": "Authentication credentials were not provided."})
+            return 401
+
+        if method == "POST" and path == "auth/membership_token":
+            self.send_json(200, {"key": store.issue_token(data["organization"])})
+            return 200
+
+        if method in ("GET", "HEAD") and segments[0] == "original" and len(segments) == 2:
+
+            if segments[1] not in store.original_sizes:
+                self.send_json(404, {"detail": "Not found."})
+                return 404
+
+            self.send_bytes(200, store.original_content(segments[1]))
+            return 200
+
+        if method == "POST" and len(segments) == 4 and segments[0] == "queues" and segments[2] == "upload":
+            return self.upload(int(segments[1]), segments[3], body)
+
+        if segments[0] == "organization_groups" and len(segments) >= 3 and segments[2] == "memberships":
+            return self.handle_memberships(method, segments[1], segments[3:], query, data)
+
+        kind = segments[0]
+
+        if kind not in KINDS:
+            self.send_json(404, {"detail": "Not found."})
+            return 404
+
+        if len(segments) == 1 and method == "GET":
+            return self.list_objects(kind, query)
+
+        if len(segments) == 1 and method == "POST":
+            return self.create_object(kind, data, organization_url)
+
+        if len(segments) == 2 and method in ("GET", "PATCH"):
+
+            obj = store.get(kind, int(segments[1]))
+
+            if obj is None:
+                self.send_json(404, {"detail": "Not found."})
+                return 404
+
+            if method == "PATCH":
+                with store.lock:
+                    obj.update(self.decode_fields(data))
+
+            etag = '"{0}"'.format(hashlib.sha1(json.dumps(obj, sort_keys=True).encode()).hexdigest())
+
+            if method == "GET" and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return 304
+
+            self.send_json(200, obj, headers={"ETag": etag})
+            return 200
+
+        self.send_json(405, {"detail": "Method not allowed."})
+        return 405
+
+    @staticmethod
+    def decode_fields(data):
+
+        # Form payloads carry nested objects as JSON strings.
+        decoded = dict(data)
+
+        for key in ("metadata", "content", "config", "settings"):
+            if isinstance(decoded.get(key), str):
+                decoded[key] = json.loads(decoded[key])
+
+        return decoded
+
+    def create_object(self, kind, data, organization_url):
+
+        store = self.server.store
+        obj = self.decode_fields(data)
+        obj.pop("id", None)
+        obj.pop("url", None)
+
+        if kind == "queues":
+            obj["organization"] = store.get("workspaces", int(obj["workspace"].rstrip("/").split("/")[-1]))["organization"]
+        elif kind != "workspaces" or "organization" not in obj:
+            obj["organization"] = organization_url
+
+        self.send_json(201, store.add(kind, obj))
+        return 201
+
+    def upload(self, queue_id, filename, body):
+
+        store = self.server.store
+        queue = store.get("queues", queue_id)
+
+        if queue is None:
+            self.send_json(404, {"detail": "Not found."})
+            return 404
+
+        s3_name = "upload-{0}".format(hashlib.sha256(body).hexdigest())
+        store.add_original(s3_name, len(body))
+
+        document = store.add("documents", {"s3_name": s3_name, "original_file_name": filename,
+                                           "organization": queue["organization"]})
+        annotation = store.add("annotations", {"document": document["url"], "queue": queue["url"],
+                                               "organization": queue["organization"], "status": "importing",
+                                               "arrived_at": datetime.now(timezone.utc).isoformat()})
+
+        self.send_json(201, {"results": [{"annotation": annotation["url"], "document": document["url"]}]})
+        return 201
+
+    def handle_memberships(self, method, org_group_id, segments, query, data):
+
+        store = self.server.store
+
+        if method == "GET" and not segments:
+            return self.list_objects("memberships", query)
+
+        if method == "POST" and not segments:
+            membership = store.add("memberships", {"user": data["user"], "organization": data["organization"]})
+            membership["url"] = "{0}/organization_groups/{1}/memberships/{2}".format(store.base_url, org_group_id,
+                                                                                     membership["id"])
+            self.send_json(201, membership)
+            return 201
+
+        if method == "DELETE" and len(segments) == 1:
+
+            with store.lock:
+                removed = store.objects["memberships"].pop(int(segments[0]), None)
+
+            if removed is None:
+                self.send_json(404, {"detail": "Not found."})
+                return 404
+
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return 204
+
+        self.send_json(405, {"detail": "Method not allowed."})
+        return 405
+
+    def list_objects(self, kind, query):
+
+        store = self.server.store
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+
+        with store.lock:
+            objects = sorted(store.objects[kind].values(), key=lambda obj: obj["id"])
+
+        def matches_id(value, ids):
+            return value is not None and value.rstrip("/").split("/")[-1] in ids.split(",")
+
+        if "organization" in params and kind != "organizations":
+            objects = [obj for obj in objects if matches_id(obj.get("organization"), params["organization"])]
+
+        for field in ("queue", "user"):
+            if field in params:
+                objects = [obj for obj in objects if matches_id(obj.get(field), params[field])]
+
+        if "id" in params:
+            objects = [obj for obj in objects if str(obj["id"]) in params["id"].split(",")]
+
+        if "status" in params:
+            objects = [obj for obj in objects if obj.get("status") in params["status"].split(",")]
+
+        if "arrived_at_after" in params:
+            objects = [obj for obj in objects if obj.get("arrived_at", "") >= params["arrived_at_after"]]
+
+        if "arrived_at_before" in params:
+            objects = [obj for obj in objects if obj.get("arrived_at", "") < params["arrived_at_before"]]
+
+        if "ordering" in params:
+            field = params["ordering"].lstrip("-")
+            objects.sort(key=lambda obj: (obj.get(field) is not None, obj.get(field)),
+                         reverse=params["ordering"].startswith("-"))
+
+        page_size = min(int(params.get("page_size", 20)), MAX_PAGE_SIZE)
+        page = int(params.get("page", 1))
+        total_pages = max(1, -(-len(objects) // page_size))
+
+        def page_url(number):
+            if number < 1 or number > total_pages:
+                return None
+            return "{0}/{1}?{2}".format(store.base_url, kind, urlencode(dict(params, page=number)))
+
+        results = objects[(page - 1) * page_size:page * page_size]
+        data = {"pagination": {"total": len(objects),
+                               "total_pages": total_pages,
+                               "next": page_url(page + 1),
+                               "previous": page_url(page - 1)}}
+
+        if kind == "annotations" and "documents" in params.get("sideload", "").split(","):
+            with store.lock:
+                data["documents"] = [store.objects["documents"][int(obj["document"].rstrip("/").split("/")[-1])]
+                                     for obj in results if obj.get("document")]
+
+        if "fields" in params:
+            results = [{field: obj[field] for field in params["fields"].split(",") if field in obj} for obj in results]
+
+        data["results"] = results
+
+        self.send_json(200, data)
+        return 200
+
+
+class MockRossumServer(ThreadingHTTPServer):
+
+    """
+    Local stand-in for the Rossum API and the Data Matching API, for measuring the copy without touching
+    the production API. Every request can be delayed and randomly failed with a 500 or throttled with a 429.
+    The number of requests and the statuses per endpoint are counted.
+    """
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, latency_jitter=0.0, error_rate=0.0,
+                 throttle_rate=0.0, retry_after=1, token_lifetime=None):
+
+        """
+        :param host: Interface to listen on.
+        :param port: Port to listen on, a free port is picked when 0.
+        :param latency: Fixed delay of every response in seconds.
+        :param latency_jitter: Maximum random delay added to the latency in seconds.
+        :param error_rate: Probability of answering a request with 500.
+        :param throttle_rate: Probability of answering a request with 429.
+        :param retry_after: Retry-After of the 429 responses in seconds.
+        :param token_lifetime: Seconds after which issued tokens are refused with 401, never when None.
+        """
+
+        ThreadingHTTPServer.__init__(self, (host, port), MockRossumHandler)
+
+        self.latency = latency
+        self.token_lifetime = token_lifetime
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.root_url = "http://{0}:{1}".format(host, self.server_port)
+        self.store = MockStore(self.api_url)
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def api_url(self):
+        return self.root_url + API_PATH
+
+    @property
+    def data_matching_url(self):
+        return self.root_url + DATA_MATCHING_PATH
+
+    def handle_error(self, request, client_address):
+
+        # Clients dropping their kept-alive connections are expected, not worth a traceback.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            ThreadingHTTPServer.handle_error(self, request, client_address)
+
+    def record(self, endpoint, status, started):
+
+        with self._stats_lock:
+            endpoint_stats = self.stats.setdefault(endpoint, {"requests": 0, "statuses": {}, "seconds": 0.0})
+            endpoint_stats["requests"] += 1
+            endpoint_stats["statuses"][status] = endpoint_stats["statuses"].get(status, 0) + 1
+            endpoint_stats["seconds"] += time.time() - started
+
+    def start(self):
+
+        """
+        Serve requests in a background thread.
+        :return: self
+        """
+
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+
+        """
+        Stop serving and close the socket.
+        :return: None
+        """
+
+        self.shutdown()
+        self.server_close()
+
+
+def get_parser():
+
+    arg_parser = argparse.ArgumentParser(description='Serve a local stand-in of the Rossum API with a synthetic '
+                                                     'template organization.')
+    arg_parser.add_argument('--host', help='Interface to listen on.', metavar="host", type=str, default="127.0.0.1")
+    arg_parser.add_argument('--port', help='Port to listen on.', metavar="port", type=int, default=8000)
+    arg_parser.add_argument('--queues', help='Number of queues in the template.', metavar="queues", type=int,
+                            default=10)
+    arg_parser.add_argument('--documents', help='Number of documents in the template.', metavar="documents", type=int,
+                            default=100)
+    arg_parser.add_argument('--distinct_originals', help='Number of distinct originals shared by the documents.',
+                            metavar="distinct_originals", type=int)
+    arg_parser.add_argument('--original_size', help='Size of every original in bytes.', metavar="original_size",
+                            type=int, default=32 * 1024)
+    arg_parser.add_argument('--latency', help='Delay of every response in seconds.', metavar="latency", type=float,
+                            default=0.0)
+    arg_parser.add_argument('--latency_jitter', help='Maximum random delay added to the latency in seconds.',
+                            metavar="latency_jitter", type=float, default=0.0)
+    arg_parser.add_argument('--error_rate', help='Probability of answering a request with 500.', metavar="error_rate",
+                            type=float, default=0.0)
+    arg_parser.add_argument('--throttle_rate', help='Probability of answering a request with 429.',
+                            metavar="throttle_rate", type=float, default=0.0)
+    arg_parser.add_argument('--retry_after', help='Retry-After of the 429 responses in seconds.',
+                            metavar="retry_after", type=int, default=1)
+    arg_parser.add_argument('--token_lifetime', help='Seconds after which issued tokens are refused with 401.',
+                            metavar="token_lifetime", type=float)
+
+    return arg_parser
+
+
+if __name__ == "__main__":
+
+    args = get_parser().parse_args()
+
+    server = MockRossumServer(args.host, args.port, latency=args.latency, latency_jitter=args.latency_jitter,
+                              error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                              retry_after=args.retry_after, token_lifetime=args.token_lifetime)
+
+    populate_template(server.store, queues=args.queues, documents=args.documents,
+                      distinct_originals=args.distinct_originals, original_size=args.original_size)
+
+    print("Rossum API stand-in - {0} (login admin/admin)".format(server.api_url))
+    print("Data Matching API stand-in - {0}".format(server.data_matching_url))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
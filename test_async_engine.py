@@ -0,0 +1,90 @@
+import asyncio
+import importlib.util
+import unittest
+from unittest import mock
+
+from mock_api_testing import MockApiTestCase
+
+if importlib.util.find_spec("aiohttp"):
+    import orgs_deep_copy_async as deep_copy_async
+
+
+@unittest.skipUnless(importlib.util.find_spec("aiohttp"), "the async engine requires aiohttp")
+class AsyncEngineTest(MockApiTestCase):
+
+    def run_client(self, function, **client_options):
+
+        """
+        Run a coroutine function with an AsyncRossumClient of the mock server in a new event loop.
+        :param function: Coroutine function getting the entered client.
+        :param client_options: Other arguments of AsyncRossumClient
+        :return: Result of the function
+        """
+
+        async def run():
+            async with deep_copy_async.AsyncRossumClient(api_url=self.server.api_url,
+                                                         data_matching_url=self.server.data_matching_url,
+                                                         backoff=0, **client_options) as client:
+                return await function(client)
+
+        return asyncio.run(run())
+
+    def deep_copy(self):
+        return self.run_client(lambda client: deep_copy_async.deep_copy_organization(
+            client, self.token, "create-key", "Copy", "Admin", "admin@example.com", "password"))
+
+    def test_deep_copy_copies_everything(self):
+
+        copied = self.objects_count()
+
+        workspaces_mapping, queues_mapping, failures = self.deep_copy()
+
+        self.assertEqual(failures, [])
+        self.assertEqual(len(workspaces_mapping), len(self.store.objects["workspaces"]) // 2)
+        self.assertEqual(len(queues_mapping), 4)
+        self.assertEqual(self.requests_count("POST /v1/organizations/create"), 1)
+        self.assertEqual(sum(stats["requests"] for endpoint, stats in self.server.stats.items()
+                             if endpoint.startswith("POST /v1/queues/{id}/upload/")), 12)
+        self.assertEqual(self.objects_count()["queues"], copied["queues"] + 4)
+
+    def test_failed_template_read_creates_no_organization(self):
+
+        async def fail(*args, **kwargs):
+            await asyncio.sleep(0.2)
+            raise RuntimeError("Fetching queues failed")
+
+        with mock.patch.object(deep_copy_async.AsyncRossumClient, "get_all_queues", fail):
+            with self.assertRaises(RuntimeError):
+                self.deep_copy()
+
+        self.assertEqual(self.requests_count("POST /v1/organizations/create"), 0)
+
+    def upload_master_data(self, throttle_rate=0.0, **client_options):
+
+        async def upload(client):
+            session = await client.login_to_data_matching_with_token(self.token)
+            self.server.throttle_rate = throttle_rate
+            return await client.upload_master_data_to_data_matching(self.token, [1, 2], [{"id": 1, "name": "A"}],
+                                                                    "id", "Suppliers", session=session)
+
+        return self.run_client(upload, **client_options)
+
+    def test_master_data_upload(self):
+
+        self.upload_master_data()
+
+        self.assertEqual([upload["dataset"] for upload in self.store.imports], ["Suppliers"])
+
+    def test_throttled_master_data_upload_is_sent_again(self):
+
+        self.server.retry_after = 0
+
+        with self.assertRaises(RuntimeError):
+            self.upload_master_data(throttle_rate=1.0, max_retries=2)
+
+        self.assertEqual(self.requests_count("POST /data-matching/api/v1/import"), 3)
+        self.assertEqual(self.store.imports, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+
+
+class BlobCacheTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def document(self, s3_name):
+        return {"s3_name": s3_name, "original_file_name": "{0}.pdf".format(s3_name)}
+
+    def downloads_count(self):
+        return sum(stats["requests"] for endpoint, stats in self.server.stats.items()
+                   if endpoint.startswith("GET /v1/original/"))
+
+    def read(self, cache, s3_name):
+
+        sha256, original_file = cache.open_original(self.document(s3_name), self.token)
+
+        with original_file:
+            return sha256, original_file.read()
+
+    def test_original_is_downloaded_once(self):
+
+        cache = deep_copy.BlobCache(self.directory)
+        self.addCleanup(cache.close)
+
+        first = self.read(cache, "template-original-0")
+        second = self.read(cache, "template-original-0")
+
+        self.assertEqual(first, second)
+        self.assertEqual(first[1], self.store.original_content("template-original-0"))
+        self.assertEqual(self.downloads_count(), 1)
+        self.assertEqual((cache.downloads, cache.hits), (1, 1))
+
+    def test_same_content_is_stored_once(self):
+
+        self.store.add_original("copy-of-original-0", 1024)
+        self.store.original_content = lambda s3_name: b"same content"
+
+        cache = deep_copy.BlobCache(self.directory)
+        self.addCleanup(cache.close)
+
+        self.assertEqual(self.read(cache, "template-original-0"), self.read(cache, "copy-of-original-0"))
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name != cache.INDEX]), 1)
+
+    def test_persistent_index_survives_the_run(self):
+
+        cache = deep_copy.BlobCache(self.directory)
+        self.read(cache, "template-original-0")
+        cache.close()
+
+        cache = deep_copy.BlobCache(self.directory)
+        self.addCleanup(cache.close)
+        self.read(cache, "template-original-0")
+
+        self.assertEqual(self.downloads_count(), 1)
+
+    def test_least_recently_used_original_is_evicted(self):
+
+        # Room for two of the 1 kB originals.
+        cache = deep_copy.BlobCache(self.directory, max_bytes=2048)
+        self.addCleanup(cache.close)
+
+        self.read(cache, "template-original-0")
+        self.read(cache, "template-original-1")
+        self.read(cache, "template-original-0")
+        self.read(cache, "template-original-2")
+
+        self.assertEqual(self.downloads_count(), 3)
+
+        # The original 1 was used least recently, so it was evicted and is downloaded again.
+        self.read(cache, "template-original-0")
+        self.read(cache, "template-original-2")
+        self.assertEqual(self.downloads_count(), 3)
+
+        self.read(cache, "template-original-1")
+        self.assertEqual(self.downloads_count(), 4)
+
+    def test_concurrent_requests_share_one_download(self):
+
+        self.server.latency = 0.2
+
+        cache = deep_copy.BlobCache(self.directory)
+        self.addCleanup(cache.close)
+
+        results = []
+        barrier = threading.Barrier(8)
+
+        def read():
+            barrier.wait()
+            results.append(self.read(cache, "template-original-0"))
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(self.downloads_count(), 1)
+
+    def test_failed_download_leaves_no_blob(self):
+
+        cache = deep_copy.BlobCache(self.directory)
+        self.addCleanup(cache.close)
+
+        with self.assertRaises(Exception):
+            self.read(cache, "missing-original")
+
+        self.assertEqual([name for name in os.listdir(self.directory) if name != cache.INDEX], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
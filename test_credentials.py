@@ -0,0 +1,69 @@
+import importlib.util
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+
+
+class TokenRefreshTest(MockApiTestCase):
+
+    server_options = {"token_lifetime": 0.5}
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        self.membership_token = deep_copy.CREDENTIALS.membership_token(self.template["url"], self.token)
+        time.sleep(0.6)
+
+    def test_expired_token_is_refreshed(self):
+
+        page = deep_copy.get_page("{0}/queues".format(self.server.api_url), self.membership_token)
+
+        self.assertEqual(len(page["results"]), 4)
+        self.assertNotEqual(deep_copy.CREDENTIALS.current_token(self.membership_token), self.membership_token)
+        self.assertEqual(self.requests_count("POST /v1/auth/membership_token"), 2)
+
+    def test_data_matching_login_refreshes_expired_token(self):
+
+        deep_copy.upload_master_data_to_data_matching(self.membership_token, [], [{"code": "1"}], "code",
+                                                      "Suppliers")
+
+        self.assertEqual(len(self.store.imports), 1)
+
+
+@unittest.skipUnless(importlib.util.find_spec("cryptography"), "persisting credentials requires cryptography")
+class PersistedCredentialsTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "credentials.bin")
+
+    def test_concurrent_logins_are_all_persisted(self):
+
+        credentials = deep_copy.CredentialCache(self.path, "passphrase")
+        organization_urls = ["{0}/organizations/{1}".format(self.server.api_url, number) for number in range(32)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            tokens = list(executor.map(lambda url: credentials.membership_token(url, self.token), organization_urls))
+
+        reloaded = deep_copy.CredentialCache(self.path, "passphrase")
+
+        self.assertEqual([reloaded.membership_token(url, self.token) for url in organization_urls], tokens)
+        self.assertEqual(self.requests_count("POST /v1/auth/membership_token"), len(organization_urls))
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        self.assertEqual(os.listdir(self.directory), ["credentials.bin"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+import orgs_deep_copy_scripy as deep_copy
+
+
+class DependencyGraphTest(unittest.TestCase):
+
+    def test_failure_skips_dependents_only(self):
+
+        called = []
+
+        def task(key, value):
+            def run(dependencies):
+                called.append(key)
+                return value + sum(dependencies.values())
+            return run
+
+        def fail(dependencies):
+            raise ValueError("creating c failed")
+
+        tasks = {"a": ([], task("a", 1)),
+                 "b": (["a"], task("b", 1)),
+                 "c": ([], fail),
+                 "d": (["c"], task("d", 1)),
+                 "e": (["b", "d"], task("e", 1)),
+                 "f": (["unknown"], task("f", 1))}
+
+        results, failures = deep_copy.run_dependency_graph(tasks, max_workers=4)
+
+        self.assertEqual(results, {"a": 1, "b": 2})
+        self.assertEqual(set(failures), {"c", "d", "e", "f"})
+        self.assertIsInstance(failures["c"], ValueError)
+        self.assertIsInstance(failures["f"], KeyError)
+        self.assertEqual(sorted(called), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+
+
+class DiffHashTreesTest(unittest.TestCase):
+
+    def diff(self, template, data):
+        return deep_copy.diff_hash_trees(deep_copy.hash_tree(template), deep_copy.hash_tree(data))
+
+    def test_equal_data(self):
+
+        template = {"queues": {"A": {"settings": {"x": 1}, "hooks": {"h1", "h2"}}}}
+
+        self.assertEqual(self.diff(template, {"queues": {"A": {"settings": {"x": 1}, "hooks": {"h2", "h1"}}}}), [])
+
+    def test_changed_missing_and_extra(self):
+
+        template = {"queues": {"A": {"settings": {"x": 1, "y": 2}}, "B": {}}}
+        data = {"queues": {"A": {"settings": {"x": 3, "z": 2}}, "C": {}}}
+
+        self.assertEqual(sorted(self.diff(template, data), key=lambda difference: difference["path"]),
+                         [{"path": "queues/A/settings/x", "change": "changed"},
+                          {"path": "queues/A/settings/y", "change": "missing"},
+                          {"path": "queues/A/settings/z", "change": "extra"},
+                          {"path": "queues/B", "change": "missing"},
+                          {"path": "queues/C", "change": "extra"}])
+
+    def test_lists_of_objects_are_keyed_by_id(self):
+
+        template = {"content": [{"id": "a", "label": "A"}, {"id": "b", "label": "B"}]}
+
+        self.assertEqual(self.diff(template, {"content": [{"id": "new", "label": "New"}] + template["content"]}),
+                         [{"path": "content/new", "change": "extra"}])
+        self.assertEqual(self.diff(template, {"content": template["content"][::-1]}),
+                         [{"path": "content", "change": "reordered"}])
+
+
+class DiffOrganizationsTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        organization = deep_copy.create_organization("create-key", "Copy", "Admin", "admin@example.com", "password")
+        self.organization_url = "{0}/organizations/{1}".format(deep_copy.API_URL, organization["id"])
+        token = deep_copy.CREDENTIALS.membership_token(self.organization_url, self.token)
+
+        _, self.queues_mapping, _, _ = deep_copy.copy_organization_setup(
+            self.organization_url, token, self.token,
+            workspaces_list=deep_copy.get_all_workspaces(self.template, self.token),
+            queues_list=deep_copy.get_all_queues(self.template, self.token),
+            extensions_list=deep_copy.get_all_extensions(self.template, self.token),
+            user_url=organization["users"][0])
+
+    def diff(self, targets="all"):
+        return deep_copy.diff_organizations(self.template, deep_copy.get_drift_targets(targets, self.token,
+                                                                                       self.template), self.token)
+
+    def test_copy_does_not_drift(self):
+
+        reports = self.diff()
+
+        self.assertEqual([(report["organization"], report["differences"], report["error"]) for report in reports],
+                         [(self.organization_url, [], None)])
+
+    def test_changed_and_removed_objects_drift(self):
+
+        source_url, target_url = next(iter(self.queues_mapping.items()))
+        source_queue = self.store.get("queues", int(source_url.split("/")[-1]))
+        self.store.get("queues", int(target_url.split("/")[-1]))["settings"] = {"columns": []}
+
+        hook = next(hook for hook in self.store.objects["hooks"].values()
+                    if hook["organization"] == self.organization_url)
+        del self.store.objects["hooks"][hook["id"]]
+
+        workspace = self.store.get("workspaces", int(source_queue["workspace"].split("/")[-1]))
+        queue_path = "queues/{0}/{1}".format(workspace["name"], source_queue["name"])
+
+        differences = self.diff()[0]["differences"]
+
+        self.assertIn({"path": queue_path + "/settings", "change": "extra"}, differences)
+        self.assertIn({"path": "extensions/" + hook["name"], "change": "missing"}, differences)
+
+    def test_unreadable_organization_is_reported(self):
+
+        reports = self.diff("999999")
+
+        self.assertEqual(len(reports), 1)
+        self.assertIsNotNone(reports[0]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
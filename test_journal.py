@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+
+
+class JournalTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.journal_path = os.path.join(self.directory, "journal.sqlite")
+
+    def copy(self, resume=False, sync=False, max_documents=None):
+
+        """
+        Copy the template the same way the script does with --journal, --resume and --sync.
+        :return: Tuple (URL of the new organization, queues mapping)
+        """
+
+        journal = deep_copy.CopyJournal(self.journal_path, "Copy")
+
+        try:
+            organization = deep_copy.get_or_create_organization("create-key", "Copy", "Admin", "admin@example.com",
+                                                                "password", journal=journal, resume=resume or sync)
+            organization_url = "{0}/organizations/{1}".format(deep_copy.API_URL, organization["id"])
+            token = deep_copy.CREDENTIALS.membership_token(organization_url, self.token)
+
+            _, queues_mapping, _, failures = deep_copy.copy_organization_setup(
+                organization_url, token, self.token,
+                workspaces_list=deep_copy.get_all_workspaces(self.template, self.token),
+                queues_list=deep_copy.get_all_queues(self.template, self.token),
+                extensions_list=deep_copy.get_all_extensions(self.template, self.token),
+                user_url=organization["users"][0],
+                journal=journal,
+                sync=sync)
+
+            self.assertEqual(failures, {})
+
+            annotations = list(deep_copy.select_annotations(self.template, self.token))[:max_documents]
+            failures = deep_copy.create_annotations(queues_mapping, annotations, token, self.token, journal=journal)
+
+            self.assertEqual(failures, [])
+        finally:
+            journal.close()
+
+        return organization_url, queues_mapping
+
+    def test_resume_creates_nothing_twice(self):
+
+        self.copy()
+        copied = self.objects_count()
+
+        self.copy(resume=True)
+
+        self.assertEqual(self.objects_count(), copied)
+
+    def test_rerun_without_resume_is_refused(self):
+
+        self.copy()
+
+        with self.assertRaises(ValueError):
+            self.copy()
+
+    def test_resume_uploads_only_missing_documents(self):
+
+        self.copy(max_documents=5)
+        self.copy(resume=True)
+
+        self.assertEqual(self.requests_count("POST /v1/organizations/create"), 1)
+        self.assertEqual(sum(stats["requests"] for endpoint, stats in self.server.stats.items()
+                             if endpoint.startswith("POST /v1/queues/{id}/upload/")), 12)
+
+    def test_sync_updates_only_changed_objects(self):
+
+        _, queues_mapping = self.copy()
+        copied = self.objects_count()
+
+        source_queue = next(iter(self.store.objects["queues"].values()))
+        source_queue["name"] = "Renamed queue"
+
+        self.copy(sync=True)
+
+        target_queue = self.store.get("queues", int(queues_mapping[source_queue["url"]].split("/")[-1]))
+        self.assertEqual(target_queue["name"], "Renamed queue")
+        self.assertEqual(self.objects_count(), copied)
+        self.assertEqual(self.requests_count("PATCH /v1/queues/{id}"), 1)
+
+        self.copy(sync=True)
+
+        self.assertEqual(self.requests_count("PATCH /v1/queues/{id}"), 1)
+        self.assertEqual(self.objects_count(), copied)
+
+
+if __name__ == "__main__":
+    unittest.main()
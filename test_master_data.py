@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+
+
+class JsonArrayTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        # Tiny chunks put chunk boundaries inside items, separators and numbers.
+        patcher = mock.patch.object(deep_copy, "TRANSFER_CHUNK_SIZE", 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read(self, text):
+
+        path = os.path.join(self.directory, "master_data.json")
+
+        with open(path, "w", encoding="utf-8") as json_file:
+            json_file.write(text)
+
+        return list(deep_copy.iterate_json_array(path))
+
+    def test_valid_arrays(self):
+
+        self.assertEqual(self.read("[]"), [])
+        self.assertEqual(self.read(" [ ]\n"), [])
+        self.assertEqual(self.read('[1, -1.5e3 , "a,b", {"c": [1, 2]}, null]'),
+                         [1, -1500.0, "a,b", {"c": [1, 2]}, None])
+        self.assertEqual(self.read("[123456789,987654321]"), [123456789, 987654321])
+
+    def test_malformed_arrays(self):
+
+        for text in ("[1,,2]", "[12 34]", "[1,]", "[,1]", "[1", "[1] 2", '{"a": 1}', "", "[1, x]"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    self.read(text)
+
+
+class MasterDataUploadTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_file_is_uploaded_in_chunks(self):
+
+        path = os.path.join(self.directory, "suppliers.csv")
+
+        with open(path, "w", encoding="utf-8", newline="") as csv_file:
+            csv_file.write("supplier_id,name\n")
+            for i in range(1000):
+                csv_file.write("{0},Supplier {0}\n".format(i))
+
+        records, failures = deep_copy.upload_master_data_file(self.token, [1, 2], path, "supplier_id", "Suppliers",
+                                                              max_chunk_bytes=8 * 1024, workers=4)
+
+        self.assertEqual((records, failures), (1000, []))
+        self.assertGreater(len(self.store.imports), 1)
+        self.assertEqual({upload["dataset"] for upload in self.store.imports}, {"Suppliers"})
+        self.assertTrue(all(upload["bytes"] <= 8 * 1024 for upload in self.store.imports))
+        self.assertEqual(self.requests_count("POST /data-matching/api/v1/auth/token_login"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
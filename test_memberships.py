@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+
+
+class MembershipsTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.users = [self.store.add("users", {"username": "user{0}".format(i), "organization": None})
+                      for i in range(3)]
+        self.organizations = [self.store.add("organizations", {"name": "Organization {0}".format(i), "metadata": {},
+                                                               "users": []})
+                              for i in range(3)]
+
+        # The first user is in the last organization, which the matrix does not want,
+        # and the last user is not in the matrix at all, so their membership is never touched.
+        self.add_membership(0, 2)
+        self.add_membership(2, 0)
+
+    def add_membership(self, user, organization):
+        membership = self.store.add("memberships", {"user": self.users[user]["url"],
+                                                    "organization": self.organizations[organization]["url"]})
+        membership["url"] = "{0}/organization_groups/1/memberships/{1}".format(self.store.base_url, membership["id"])
+
+    def memberships(self):
+        users = {user["url"]: index for index, user in enumerate(self.users)}
+        organizations = {organization["url"]: index for index, organization in enumerate(self.organizations)}
+        return sorted((users[membership["user"]], organizations[membership["organization"]])
+                      for membership in self.store.objects["memberships"].values())
+
+    def sync(self, remove=True):
+
+        path = os.path.join(self.directory, "memberships.csv")
+
+        with open(path, "w", newline="") as matrix_file:
+            matrix_file.write("user,{0}\n".format(",".join(str(organization["id"])
+                                                             for organization in self.organizations)))
+            matrix_file.write("{0},x,x,\n".format(self.users[0]["id"]))
+            matrix_file.write("{0},,x,x\n".format(self.users[1]["id"]))
+
+        users, organizations, required = deep_copy.read_membership_matrix(path)
+
+        return deep_copy.sync_memberships(users, organizations, required, 1, self.token, workers=4, remove=remove)
+
+    def test_memberships_are_synced(self):
+
+        result = self.sync()
+
+        self.assertEqual((result["created"], result["removed"], result["unchanged"], result["failures"]),
+                         (4, 1, 0, []))
+        self.assertEqual(self.memberships(), [(0, 0), (0, 1), (1, 1), (1, 2), (2, 0)])
+
+    def test_second_sync_changes_nothing(self):
+
+        self.sync()
+        result = self.sync()
+
+        self.assertEqual((result["created"], result["removed"], result["unchanged"]), (0, 0, 4))
+        self.assertEqual(self.requests_count("POST /v1/organization_groups/{id}/memberships"), 4)
+        self.assertEqual(self.requests_count("DELETE /v1/organization_groups/{id}/memberships/{id}"), 1)
+
+    def test_memberships_are_kept(self):
+
+        result = self.sync(remove=False)
+
+        self.assertEqual((result["created"], result["removed"]), (4, 0))
+        self.assertEqual(self.memberships(), [(0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import threading
+import time
+import unittest
+
+import orgs_deep_copy_scripy as deep_copy
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_failing_items_stop_all_stages(self):
+
+        processed = []
+
+        def items():
+            yield from range(5)
+            raise RuntimeError("listing failed")
+
+        threads = threading.active_count()
+
+        with self.assertRaises(RuntimeError):
+            deep_copy.run_pipeline(items(), [("slow", lambda item: time.sleep(0.01) or item, 2),
+                                             ("collect", processed.append, 2)])
+
+        self.assertEqual(sorted(processed), [0, 1, 2, 3, 4])
+        self.assertEqual(threading.active_count(), threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+from rossum_mock_server import populate_template
+
+
+class PlanTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        # Other organizations listed before the template make finding it take more than one page.
+        self.template["metadata"] = {}
+        for i in range(150):
+            self.store.add("organizations", {"name": "Organization {0}".format(i), "metadata": {}, "users": []})
+
+        self.template = populate_template(self.store, queues=4, documents=24, distinct_originals=10,
+                                          original_size=1024)
+        self.token = self.store.issue_token(self.template["url"])
+        del self.store.token_issued_at[self.token]
+
+        patcher = mock.patch.object(deep_copy, "INSTRUMENTATION", deep_copy.Instrumentation())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sent_requests(self):
+        return sum(stats["requests"] for stats in self.server.stats.values())
+
+    def plan(self, selection, cached_originals=True):
+
+        template = deep_copy.find_template_organization(self.token)
+
+        return deep_copy.plan_organization_copy(template, self.token, selection=selection,
+                                                find_requests=deep_copy.sent_requests(),
+                                                cached_originals=cached_originals)
+
+    def copy(self, selection, blob_cache=True):
+
+        """
+        Copy the template the same way the script does without any journal.
+        :return: Number of requests the mock server received
+        """
+
+        self.server.stats.clear()
+
+        template = deep_copy.find_template_organization(self.token)
+        workspaces = deep_copy.get_all_workspaces(template, self.token)
+        queues = deep_copy.get_all_queues(template, self.token)
+        extensions = deep_copy.get_all_extensions(template, self.token)
+        schemas = deep_copy.get_schemas(sorted({queue["schema"] for queue in queues}), self.token)
+
+        organization = deep_copy.get_or_create_organization("create-key", "Copy", "Admin", "admin@example.com",
+                                                            "password")
+        organization_url = "{0}/organizations/{1}".format(deep_copy.API_URL, organization["id"])
+        token = deep_copy.CREDENTIALS.membership_token(organization_url, self.token)
+
+        _, queues_mapping, _, failures = deep_copy.copy_organization_setup(
+            organization_url, token, self.token, workspaces_list=workspaces, queues_list=queues,
+            extensions_list=extensions, user_url=organization["users"][0], schemas=schemas)
+
+        self.assertEqual(failures, {})
+
+        cache = deep_copy.BlobCache(tempfile.mkdtemp(), persistent=False) if blob_cache else None
+
+        try:
+            annotations = deep_copy.select_annotations(template, self.token, **selection)
+            self.assertEqual(deep_copy.create_annotations(queues_mapping, annotations, token, self.token,
+                                                          blob_cache=cache), [])
+        finally:
+            if cache is not None:
+                cache.close()
+                shutil.rmtree(cache.directory)
+
+        return self.sent_requests()
+
+    def assert_plan_matches_copy(self, selection, blob_cache=True):
+
+        plan = self.plan(selection, cached_originals=blob_cache)
+
+        self.assertEqual(sum(plan["requests"].values()), self.copy(selection, blob_cache=blob_cache))
+
+    def test_plan_of_whole_template(self):
+        self.assert_plan_matches_copy({})
+
+    def test_plan_without_originals_cache(self):
+        self.assert_plan_matches_copy({}, blob_cache=False)
+
+    def test_plan_of_most_recent_annotations(self):
+        self.assert_plan_matches_copy({"max_per_queue": 2})
+
+    def test_plan_of_random_sample(self):
+        self.assert_plan_matches_copy({"max_per_queue": 2, "seed": "seed"})
+
+    def test_plan_counts_template_lookup(self):
+
+        plan = self.plan({})
+
+        # The template is listed on the second page of organizations.
+        self.assertEqual(plan["requests"]["find template"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+
+
+class PropagateTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.journal_path = os.path.join(self.directory, "journal.sqlite")
+
+        self.queues_mappings = {name: self.copy(name) for name in ("A", "B")}
+
+    def copy(self, name):
+
+        """
+        Copy the setup of the template the same way the script does with --journal.
+        :return: Queues mapping
+        """
+
+        journal = deep_copy.CopyJournal(self.journal_path, name)
+
+        try:
+            organization = deep_copy.get_or_create_organization("create-key", name, "Admin", "admin@example.com",
+                                                                "password", journal=journal)
+            organization_url = "{0}/organizations/{1}".format(deep_copy.API_URL, organization["id"])
+            token = deep_copy.CREDENTIALS.membership_token(organization_url, self.token)
+
+            _, queues_mapping, _, failures = deep_copy.copy_organization_setup(
+                organization_url, token, self.token,
+                workspaces_list=deep_copy.get_all_workspaces(self.template, self.token),
+                queues_list=deep_copy.get_all_queues(self.template, self.token),
+                extensions_list=deep_copy.get_all_extensions(self.template, self.token),
+                user_url=organization["users"][0],
+                journal=journal)
+
+            self.assertEqual(failures, {})
+        finally:
+            journal.close()
+
+        return queues_mapping
+
+    def propagate(self, targets=None):
+        return deep_copy.propagate_template_changes(self.template, self.token, self.journal_path, targets=targets)
+
+    def copied(self, name, kind, source_url):
+        return self.store.get(kind, int(self.queues_mappings[name][source_url].split("/")[-1]))
+
+    def updates_count(self):
+        return sum(stats["requests"] for endpoint, stats in self.server.stats.items()
+                   if endpoint.split(" ")[0] in ("PATCH", "PUT"))
+
+    def test_unchanged_template_updates_nothing(self):
+
+        results = self.propagate()
+
+        self.assertEqual(sorted(results), ["A", "B"])
+        self.assertEqual([(result["updated"], result["not_copied"], result["failures"])
+                          for result in results.values()], [(0, 0, [])] * 2)
+        self.assertEqual(self.updates_count(), 0)
+
+    def test_changed_objects_are_updated_once(self):
+
+        source_queue = next(iter(self.store.objects["queues"].values()))
+        source_queue["name"] = "Renamed queue"
+        source_schema = self.store.get("schemas", int(source_queue["schema"].split("/")[-1]))
+        source_schema["content"][0]["label"] = "Relabeled section"
+
+        results = self.propagate()
+
+        self.assertEqual([(result["updated"], result["failures"]) for result in results.values()], [(2, [])] * 2)
+
+        for name in ("A", "B"):
+            copied_queue = self.copied(name, "queues", source_queue["url"])
+            copied_schema = self.store.get("schemas", int(copied_queue["schema"].split("/")[-1]))
+            self.assertEqual(copied_queue["name"], "Renamed queue")
+            self.assertEqual(copied_schema["content"][0]["label"], "Relabeled section")
+
+        results = self.propagate()
+
+        self.assertEqual([result["updated"] for result in results.values()], [0, 0])
+        self.assertEqual(self.updates_count(), 4)
+
+    def test_failed_organization_does_not_stop_the_others(self):
+
+        results = self.propagate(targets=["A", "Unknown"])
+
+        self.assertIsInstance(results["Unknown"], ValueError)
+        self.assertEqual(results["A"]["failures"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
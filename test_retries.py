@@ -0,0 +1,84 @@
+import time
+import unittest
+
+import requests
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+
+
+class RetryTest(MockApiTestCase):
+
+    client_options = {"backoff": 0, "max_retries": 2}
+
+    def set_rates(self, error_rate=0.0, throttle_rate=0.0, retry_after=0):
+        self.server.error_rate = error_rate
+        self.server.throttle_rate = throttle_rate
+        self.server.retry_after = retry_after
+
+    def test_idempotent_request_is_retried_on_server_error(self):
+
+        self.set_rates(error_rate=1.0)
+
+        response = self.client.get("{0}/queues".format(self.server.api_url), token=self.token)
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.requests_count("GET /v1/queues"), 3)
+
+    def test_post_is_not_retried_on_server_error(self):
+
+        self.set_rates(error_rate=1.0)
+
+        response = self.client.post("{0}/workspaces".format(self.server.api_url), token=self.token,
+                                    data={"name": "Workspace", "organization": self.template["url"]})
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.requests_count("POST /v1/workspaces"), 1)
+
+    def test_post_is_retried_when_throttled(self):
+
+        self.set_rates(throttle_rate=1.0)
+
+        response = self.client.post("{0}/workspaces".format(self.server.api_url), token=self.token,
+                                    data={"name": "Workspace", "organization": self.template["url"]})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.requests_count("POST /v1/workspaces"), 3)
+
+    def test_retry_waits_for_retry_after(self):
+
+        self.set_rates(throttle_rate=1.0, retry_after=1)
+        self.client.max_retries = 1
+
+        started = time.perf_counter()
+        self.client.get("{0}/queues".format(self.server.api_url), token=self.token)
+
+        self.assertGreaterEqual(time.perf_counter() - started, 1.0)
+        self.assertEqual(self.requests_count("GET /v1/queues"), 2)
+
+    def test_create_raises_the_http_error(self):
+
+        self.set_rates(error_rate=1.0)
+
+        with self.assertRaises(requests.HTTPError):
+            deep_copy.create_workspace(self.template["url"], self.token, {"name": "Workspace", "metadata": {}})
+
+        with self.assertRaises(requests.HTTPError):
+            deep_copy.create_extension({}, {"name": "Extension", "queues": []}, self.token, "user")
+
+    def test_retry_after_formats(self):
+
+        response = requests.Response()
+
+        response.headers["Retry-After"] = "3"
+        self.assertEqual(deep_copy.get_retry_after(response), 3.0)
+
+        response.headers["Retry-After"] = "Wed, 21 Oct 2015 07:28:00 GMT"
+        self.assertEqual(deep_copy.get_retry_after(response), 0.0)
+
+        response.headers["Retry-After"] = "soon"
+        self.assertIsNone(deep_copy.get_retry_after(response))
+
+
+if __name__ == "__main__":
+    unittest.main()
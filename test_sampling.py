@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+from rossum_mock_server import populate_template
+
+
+class SamplingTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        # A second template with 250 annotations in each of its two queues, three full pages each.
+        self.large_template = populate_template(self.store, queues=2, documents=500, original_size=16)
+        self.large_token = self.store.issue_token(self.large_template["url"])
+        del self.store.token_issued_at[self.large_token]
+
+    def sample(self, max_per_queue=5, seed="seed"):
+        return sorted(annotation["url"] for annotation in deep_copy.select_annotations(
+            self.large_template, self.large_token, max_per_queue=max_per_queue, seed=seed))
+
+    def annotations_of(self, urls):
+        return [self.store.get("annotations", int(url.split("/")[-1])) for url in urls]
+
+    def test_same_seed_selects_the_same_sample(self):
+
+        sample = self.sample()
+
+        self.assertEqual(len(sample), 10)
+        self.assertEqual(self.sample(), sample)
+        self.assertNotEqual(self.sample(seed="other seed"), sample)
+
+    def test_sample_does_not_depend_on_the_list_page_size(self):
+
+        sample = self.sample()
+
+        with mock.patch.object(deep_copy, "LIST_PAGE_SIZE", 7):
+            self.assertEqual(self.sample(), sample)
+
+    def test_sample_takes_max_per_queue_from_every_queue(self):
+
+        queues = [annotation["queue"] for annotation in self.annotations_of(self.sample(max_per_queue=3))]
+
+        self.assertEqual(sorted(queues.count(queue) for queue in set(queues)), [3, 3])
+
+    def test_without_seed_the_most_recent_are_selected(self):
+
+        selected = self.annotations_of(self.sample(max_per_queue=2, seed=None))
+
+        for annotation in selected:
+            newer = [other for other in self.store.objects["annotations"].values()
+                     if other["queue"] == annotation["queue"] and other["arrived_at"] > annotation["arrived_at"]]
+            self.assertLess(len(newer), 2)
+
+    def test_small_queues_are_listed_whole(self):
+
+        sample = self.sample(max_per_queue=1000)
+
+        self.assertEqual(len(sample), 500)
+        self.assertEqual(len(set(sample)), 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import orgs_deep_copy_scripy as deep_copy
+from mock_api_testing import MockApiTestCase
+
+
+class SnapshotTest(MockApiTestCase):
+
+    def setUp(self):
+
+        MockApiTestCase.setUp(self)
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.snapshot_directory = os.path.join(self.directory, "snapshot")
+
+    def organization_objects(self, organization_url):
+        return {kind: sum(1 for obj in self.store.objects[kind].values() if obj.get("organization") == organization_url)
+                for kind in ("workspaces", "queues", "schemas", "hooks", "documents", "annotations")}
+
+    def reads_count(self):
+        return sum(stats["requests"] for endpoint, stats in self.server.stats.items() if endpoint.startswith("GET "))
+
+    def test_export_and_import_round_trip(self):
+
+        deep_copy.export_template_snapshot(self.template, self.token, self.snapshot_directory)
+        exported_reads = self.reads_count()
+
+        snapshot = deep_copy.load_template_snapshot(self.snapshot_directory)
+        result = deep_copy.create_organization_from_snapshot(
+            snapshot, os.path.join(self.snapshot_directory, deep_copy.SNAPSHOT_ORIGINALS_DIR),
+            {"org_name": "Copy", "username": "Admin", "email": "admin@example.com", "password": "password"},
+            "create-key", self.token)
+
+        self.assertEqual(result["failures"], 0)
+        self.assertEqual(self.organization_objects(result["organization"]),
+                         self.organization_objects(self.template["url"]))
+        # Creating the organization from the snapshot does not read the template again.
+        self.assertEqual(self.reads_count(), exported_reads)
+
+    def test_export_with_missing_documents_is_not_loadable(self):
+
+        # Downloading one of the originals fails with 404.
+        del self.store.original_sizes["template-original-3"]
+
+        with self.assertRaises(RuntimeError):
+            deep_copy.export_template_snapshot(self.template, self.token, self.snapshot_directory)
+
+        self.assertFalse(os.path.exists(os.path.join(self.snapshot_directory, deep_copy.SNAPSHOT_MANIFEST)))
+
+        with self.assertRaises(FileNotFoundError):
+            deep_copy.load_template_snapshot(self.snapshot_directory)
+
+
+if __name__ == "__main__":
+    unittest.main()